@@ -1,42 +1,95 @@
 # app.py
 
-from fastapi import FastAPI, HTTPException, Depends
-from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Depends, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import StreamingResponse
+from contextlib import asynccontextmanager, suppress
+import asyncio
+import hashlib
+import json
+import os
 import httpx
+import time
 import uuid
+import msgpack
 import numpy as np
-from typing import List
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import ValidationError
+from typing import Iterator, List, Optional, Tuple
 from dotenv import load_dotenv
 load_dotenv()
 
-from .model import load_model, embed_text
+from .model import (
+    load_model,
+    embed_batch,
+    embed_query,
+    get_active_model,
+    get_embedding_dimension,
+    get_model_name,
+)
 from .faiss_index import (
     build_index_from_db,
-    search,
+    load_snapshot,
+    add_to_index,
+    search_chunks,
     rebuild_index_for_user_namespace,
     delete_user_index,
+    tombstone_section,
+    tombstone_chunks,
+    index_stats,
+    index_version,
+    user_index_stats,
 )
 from .db import (
     init_db,
     store_chunk,
     get_all_chunks,
-    get_chunk_by_id,
+    count_chunks_by_model,
+    snapshot_fingerprint,
     mark_user_indexed,
+    get_profile_version,
     delete_user_chunks,
     delete_chunks_by_section_id,
+    apply_profile_changes,
+    list_users,
+    get_user_chunks,
+    load_embeddings,
+    import_user_chunks,
+    delete_all_user_chunks,
 )
 from .schemas import (
     EmbedRequest,
     EmbedResponse,
     IndexProfileResponse,
+    ProfileChangeSet,
+    ProfileChangeSetResponse,
+    RetrieveOptions,
     RetrieveRequest,
     RetrieveResponse,
     ChunkItem,
     IndexSectionRequest,
     IndexSectionResponse,
     DeleteSectionResponse,
+    IndexStatsResponse,
+    IndexVersionResponse,
+    IndexNamespace,
+    ReembedRequest,
+    ReembedStatus,
 )
 from .chunking import chunk_text, extract_text_fields
+from .compaction import note_activity, run_compactor
+from .lanes import BULK, INTERACTIVE, bulk_lane, interactive_lane, lane_stats
+from .reembed import cancel_reembedding, current_job, start_reembedding
+from . import wire
+from .metrics import (
+    REQUEST_COUNT,
+    REQUEST_LATENCY,
+    RESIDENT_INDICES,
+    RESIDENT_VECTORS,
+    TOMBSTONED_VECTORS,
+    INDEX_MEMORY_BYTES,
+    METADATA_MEMORY_BYTES,
+)
 
 # This will be managed by the lifespan context and dependency injection
 http_client: httpx.AsyncClient
@@ -50,16 +103,32 @@ async def lifespan(app: FastAPI):
     init_db()
     load_model()
 
-    # Build FAISS indices from existing DB
-    all_chunks = get_all_chunks()
-    build_index_from_db(all_chunks)
+    # Vectors from another model live in a different space; they need a
+    # re-embedding run (POST /admin/reembed) before they are comparable.
+    for model_name, count in count_chunks_by_model():
+        if model_name != get_model_name():
+            print(
+                f"WARNING: {count} chunks were embedded with model '{model_name}', "
+                f"not the active model '{get_model_name()}'"
+            )
+
+    # Load indices from a bulk-index snapshot if it matches the DB,
+    # otherwise build them from the DB
+    snapshot_path = os.getenv("INDEX_SNAPSHOT_PATH")
+    if not (snapshot_path and load_snapshot(snapshot_path, snapshot_fingerprint())):
+        build_index_from_db(get_all_chunks())
 
     # Initialize HTTP client
     http_client = httpx.AsyncClient()
+    compactor = asyncio.create_task(run_compactor())
 
-    print(f"Initialized embedding service with {len(all_chunks)} existing chunks")
+    print(f"Initialized embedding service with {index_stats()[1]} indexed chunks")
     yield
     # Clean up resources
+    compactor.cancel()
+    with suppress(asyncio.CancelledError):
+        await compactor
+    await cancel_reembedding()
     await http_client.aclose()
     print("Embedding service shut down.")
 
@@ -74,55 +143,135 @@ async def get_http_client() -> httpx.AsyncClient:
     return http_client
 
 
+# --- Middleware ---
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """Record request count and latency, labelled by route and index namespace."""
+    start_time = time.perf_counter()
+    note_activity()
+    response = await call_next(request)
+    duration = time.perf_counter() - start_time
+
+    # Use the route template rather than the raw path so user ids do not
+    # explode label cardinality.
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", "unmatched")
+    namespace = request.scope.get("state", {}).get("namespace", "none")
+    REQUEST_COUNT.labels(
+        endpoint=endpoint, namespace=namespace, status=str(response.status_code)
+    ).inc()
+    REQUEST_LATENCY.labels(endpoint=endpoint, namespace=namespace).observe(duration)
+    return response
+
+
 # --- Endpoints ---
 
 
+
+async def _encode_for_storage(texts: List[str]) -> Tuple[np.ndarray, Optional[str]]:
+    """
+    Encode `texts` on the bulk lane and return the vectors with the name of
+    the model that produced them. A re-embedding cutover can swap the active
+    model while the batch waits or encodes; the batch is then encoded again
+    with the new model, so chunks are never stored (or indexed) with vectors
+    from a model other than the active one. Call it right before the
+    synchronous store/index step, with no await in between.
+    """
+    while True:
+        model, model_name = get_active_model()
+        vectors = await BULK.run(embed_batch, texts, model) if texts else np.empty((0, 0), np.float32)
+        if get_model_name() == model_name:
+            return vectors, model_name
+        print(f"Active model changed from '{model_name}' during encoding; re-encoding {len(texts)} chunks")
+
+async def _embed_query_with_model(text: str) -> Tuple[np.ndarray, Optional[str]]:
+    """
+    Embed query text on the interactive lane and return the vector with the
+    name of the model that produced it, encoding again if a re-embedding
+    cutover swapped the model meanwhile.
+    """
+    while True:
+        model_name = get_model_name()
+        vector = await INTERACTIVE.run(embed_query, text)
+        if get_model_name() == model_name:
+            return vector, model_name
+
 @app.post(
-    "/index/profile/{user_id}", response_model=IndexProfileResponse, tags=["Indexing"]
+    "/index/profile/{user_id}",
+    response_model=IndexProfileResponse,
+    tags=["Indexing"],
+    dependencies=[Depends(bulk_lane)],
 )
 async def index_user_profile(
-    user_id: str, client: httpx.AsyncClient = Depends(get_http_client)
+    user_id: str,
+    http_request: Request,
+    force: bool = False,
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     """
     DESTRUCTIVE. Fetches a user's full profile, deletes all previous profile
     embeddings for that user, and creates new ones.
+
+    Skipped when the profile is unchanged since it was last indexed: the
+    fetch is conditional on the stored ETag, and the body is compared by
+    content hash. `force=true` re-indexes regardless.
     """
+    http_request.state.namespace = "profile"
     try:
-        # Delete old profile data first for idempotency
-        delete_user_chunks(user_id, namespace="profile")
-        delete_user_index(user_id, namespace="profile")
+        version = None if force else get_profile_version(user_id)
+        headers = {}
+        if version is not None and version["profile_etag"]:
+            headers["If-None-Match"] = version["profile_etag"]
 
-        response = await client.get(f"http://localhost:5000/profile/{user_id}")
-        response.raise_for_status()  # Raises HTTPError for 4xx/5xx responses
+        response = await client.get(
+            f"http://localhost:5000/profile/{user_id}", headers=headers
+        )
+        if response.status_code == 304:
+            return _profile_unchanged(user_id)
+        response.raise_for_status()  # Raises HTTPError for non-2xx responses
 
         profile_data = response.json()
-        text_fields = extract_text_fields(profile_data)
+        profile_hash = hashlib.sha256(
+            json.dumps(profile_data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        ).hexdigest()
+        if version is not None and version["profile_hash"] == profile_hash:
+            return _profile_unchanged(user_id)
+
+        pending = [
+            (source_type, source_id, chunk)
+            for source_type, source_id, text in extract_text_fields(profile_data)
+            for chunk in chunk_text(text)
+        ]
+        # Encode off the event loop before touching stored data, so the old
+        # profile keeps serving until the new one is ready
+        vectors, model_name = await _encode_for_storage([text for _, _, text in pending])
+
+        # Delete old profile data first for idempotency
+        delete_user_chunks(user_id, namespace="profile")
+        delete_user_index(user_id, namespace="profile")
 
         total_chunks = 0
-        for source_type, source_id, text in text_fields:
-            chunks = chunk_text(text)
-            for chunk_text_content in chunks:
-                chunk_id = str(uuid.uuid4())
-                embedding_vector = embed_text(chunk_text_content)
-                embedding_bytes = embedding_vector.tobytes()
-
-                store_chunk(
-                    chunk_id,
-                    user_id,
-                    "profile",
-                    None,
-                    source_type,
-                    source_id,
-                    chunk_text_content,
-                    embedding_bytes,
-                )
-                total_chunks += 1
+        for (source_type, source_id, chunk_text_content), embedding_vector in zip(pending, vectors):
+            store_chunk(
+                str(uuid.uuid4()),
+                user_id,
+                "profile",
+                None,
+                source_type,
+                source_id,
+                chunk_text_content,
+                embedding_vector.tobytes(),
+                model_name,
+            )
+            total_chunks += 1
 
         # Rebuild the FAISS index for the 'profile' namespace from scratch
         if total_chunks > 0:
             rebuild_index_for_user_namespace(user_id, "profile")
 
-        mark_user_indexed(user_id)
+        mark_user_indexed(user_id, response.headers.get("etag"), profile_hash)
         return IndexProfileResponse(
             status=f"Profile for user {user_id} re-indexed successfully",
             num_chunks=total_chunks,
@@ -141,26 +290,114 @@ async def index_user_profile(
         raise HTTPException(status_code=500, detail=f"Error during indexing: {str(e)}")
 
 
+def _profile_unchanged(user_id: str) -> IndexProfileResponse:
+    stats = user_index_stats(user_id).get("profile")
+    return IndexProfileResponse(
+        status=f"Profile for user {user_id} is unchanged; skipped re-indexing",
+        num_chunks=stats["num_vectors"] - stats["num_tombstoned"] if stats else 0,
+        skipped=True,
+    )
+
+
 @app.post(
-    "/index/{user_id}/section", response_model=IndexSectionResponse, tags=["Indexing"]
+    "/index/profile/{user_id}/changes",
+    response_model=ProfileChangeSetResponse,
+    tags=["Indexing"],
+    dependencies=[Depends(bulk_lane)],
 )
-async def index_resume_section(user_id: str, request: IndexSectionRequest):
+async def apply_profile_change_set(
+    user_id: str, request: ProfileChangeSet, http_request: Request
+):
+    """
+    Applies field-level profile changes pushed by the backend, without
+    fetching the full profile. Entries are keyed by (source_type, source_id)
+    as produced by `extract_text_fields`; only the changed entries are
+    re-chunked and re-embedded. Replaced chunks are tombstoned and new ones
+    appended to the live index.
+    """
+    http_request.state.namespace = "profile"
+    try:
+        # The last change to an entry wins
+        latest = {
+            (change.source_type, change.source_id): change for change in request.changes
+        }
+        pending = [
+            (source_type, source_id, chunk)
+            for (source_type, source_id), change in latest.items()
+            if change.op != "remove"
+            for chunk in chunk_text(change.text)
+        ]
+        vectors, model_name = await _encode_for_storage([text for _, _, text in pending])
+        new_chunks = [
+            (str(uuid.uuid4()), source_type, source_id, text, vector)
+            for (source_type, source_id, text), vector in zip(pending, vectors)
+        ]
+
+        removed_ids, new_ids, created_at = apply_profile_changes(
+            user_id,
+            list(latest),
+            [(chunk_id, *rest, vector.tobytes()) for chunk_id, *rest, vector in new_chunks],
+            model_name,
+        )
+        tombstone_chunks(user_id, "profile", removed_ids)
+        for row_id, (chunk_id, source_type, source_id, text, vector) in zip(new_ids, new_chunks):
+            add_to_index(
+                user_id,
+                "profile",
+                vector,
+                {
+                    "id": row_id,
+                    "chunk_id": chunk_id,
+                    "section_id": None,
+                    "source_type": source_type,
+                    "source_id": source_id,
+                    "text": text,
+                    "created_at": created_at,
+                },
+            )
+
+        return ProfileChangeSetResponse(
+            status=f"Applied {len(latest)} profile changes for user {user_id}",
+            num_chunks_added=len(new_chunks),
+            num_chunks_removed=len(removed_ids),
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error applying profile changes: {str(e)}"
+        )
+
+
+@app.post(
+    "/index/{user_id}/section",
+    response_model=IndexSectionResponse,
+    tags=["Indexing"],
+    dependencies=[Depends(bulk_lane)],
+)
+async def index_resume_section(
+    user_id: str, request: IndexSectionRequest, http_request: Request
+):
     """
     Adds or updates embeddings for a specific resume section.
     This is the primary endpoint for handling user-edited text. It deletes any
     old chunks with the same section_id before creating new ones.
+
+    Old chunks are tombstoned and new ones appended to the live index; the
+    background compactor rebuilds the index once enough rows are dead.
     """
+    http_request.state.namespace = "resume_sections"
     try:
+        chunks = chunk_text(request.text)
+        vectors, model_name = await _encode_for_storage(chunks)
+
         # Delete old chunks for this section to ensure an update, not an addition
         delete_chunks_by_section_id(user_id, request.section_id)
+        tombstone_section(user_id, "resume_sections", request.section_id)
 
-        chunks = chunk_text(request.text)
         new_chunk_ids = []
-        for i, chunk_text_content in enumerate(chunks):
+        for i, (chunk_text_content, embedding_vector) in enumerate(zip(chunks, vectors)):
             chunk_id = str(uuid.uuid4())
-            embedding_vector = embed_text(chunk_text_content)
 
-            store_chunk(
+            row_id, created_at = store_chunk(
                 chunk_id=chunk_id,
                 user_id=user_id,
                 namespace="resume_sections",
@@ -169,12 +406,24 @@ async def index_resume_section(user_id: str, request: IndexSectionRequest):
                 source_id=str(i),
                 text=chunk_text_content,
                 embedding_bytes=embedding_vector.tobytes(),
+                embedding_model=model_name,
+            )
+            add_to_index(
+                user_id,
+                "resume_sections",
+                embedding_vector,
+                {
+                    "id": row_id,
+                    "chunk_id": chunk_id,
+                    "section_id": request.section_id,
+                    "source_type": "user_edited",
+                    "source_id": str(i),
+                    "text": chunk_text_content,
+                    "created_at": created_at,
+                },
             )
             new_chunk_ids.append(chunk_id)
 
-        # After DB changes, rebuild the relevant FAISS index to ensure consistency
-        rebuild_index_for_user_namespace(user_id, "resume_sections")
-
         return IndexSectionResponse(
             status=f"Section {request.section_id} indexed successfully.",
             section_id=request.section_id,
@@ -188,13 +437,17 @@ async def index_resume_section(user_id: str, request: IndexSectionRequest):
     "/index/{user_id}/section/{section_id}",
     response_model=DeleteSectionResponse,
     tags=["Indexing"],
+    dependencies=[Depends(bulk_lane)],
 )
-async def delete_resume_section(user_id: str, section_id: str):
-    """Deletes all embeddings associated with a specific resume section_id."""
+async def delete_resume_section(user_id: str, section_id: str, http_request: Request):
+    """
+    Deletes all embeddings associated with a specific resume section_id.
+    The vectors are tombstoned and stop matching immediately.
+    """
+    http_request.state.namespace = "resume_sections"
     try:
         deleted_count = delete_chunks_by_section_id(user_id, section_id)
-        if deleted_count > 0:
-            rebuild_index_for_user_namespace(user_id, "resume_sections")
+        tombstone_section(user_id, "resume_sections", section_id)
 
         return DeleteSectionResponse(
             status=f"Deleted {deleted_count} chunks for section {section_id}.",
@@ -206,68 +459,386 @@ async def delete_resume_section(user_id: str, section_id: str):
         )
 
 
-@app.post("/retrieve/{user_id}", response_model=RetrieveResponse, tags=["Retrieval"])
-async def retrieve_similar_chunks(user_id: str, request: RetrieveRequest):
+# /retrieve accepts JSON, msgpack (query_embedding as packed float32 `bin`)
+# or a bare packed vector with the search options in the query string.
+RETRIEVE_OPENAPI_EXTRA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            wire.JSON: {"schema": RetrieveRequest.model_json_schema()},
+            wire.MSGPACK: {"schema": RetrieveRequest.model_json_schema()},
+            wire.OCTET_STREAM: {"schema": {"type": "string", "format": "binary"}},
+        },
+    }
+}
+
+
+async def _parse_retrieve_body(
+    http_request: Request,
+) -> Tuple[RetrieveOptions, Optional[np.ndarray], Optional[str]]:
     """
-    Retrieve top-k chunks for a user based on a query. Can be filtered
-    by index namespace and a list of section_ids.
+    Decode a /retrieve body in any supported encoding into its search
+    options plus either a query vector or query text.
     """
+    body = await http_request.body()
+    media_type = wire.media_type_of(http_request.headers.get("content-type"))
     try:
-        query_vec = np.array(request.query_embedding, dtype=np.float32)
-        norm = np.linalg.norm(query_vec)
-        if norm > 0:
-            query_vec /= norm
+        if media_type == wire.JSON:
+            request = RetrieveRequest.model_validate_json(body)
+            if request.query_text is not None:
+                return request, None, request.query_text
+            options = request
+            query_vec = np.array(request.query_embedding, dtype=np.float32)
+        elif media_type == wire.MSGPACK:
+            payload = wire.unpackb(body)
+            if not isinstance(payload, dict):
+                raise ValueError("msgpack body must be a map")
+            raw_vector = payload.pop("query_embedding", None)
+            if raw_vector is None:
+                request = RetrieveRequest.model_validate(payload)
+                return request, None, request.query_text
+            if payload.get("query_text") is not None:
+                raise ValueError("Provide exactly one of 'query_embedding' or 'query_text'")
+            options = RetrieveOptions.model_validate(payload)
+            query_vec = wire.unpack_vector(raw_vector)
+        elif media_type == wire.OCTET_STREAM:
+            payload = {
+                key: http_request.query_params[key]
+                for key in ("top_k", "index_namespace")
+                if key in http_request.query_params
+            }
+            section_ids = http_request.query_params.getlist("filter_by_section_ids")
+            if section_ids:
+                payload["filter_by_section_ids"] = section_ids
+            options = RetrieveOptions.model_validate(payload)
+            query_vec = wire.unpack_vector(body)
+        else:
+            raise HTTPException(
+                status_code=415, detail=f"Unsupported content type: {media_type}"
+            )
 
-        chunk_ids, scores = search(
-            user_id, request.index_namespace, query_vec, request.top_k
-        )
+        expected_dim = get_embedding_dimension()
+        if query_vec.shape[0] != expected_dim:
+            raise ValueError(
+                f"query_embedding must have {expected_dim} dimensions, got {query_vec.shape[0]}"
+            )
+        return options, query_vec, None
+    except ValidationError as e:
+        raise RequestValidationError(e.errors(include_url=False))
+    except (ValueError, msgpack.exceptions.ExtraData) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid retrieve request: {str(e)}")
+
+
+@app.post(
+    "/retrieve/{user_id}",
+    response_model=RetrieveResponse,
+    tags=["Retrieval"],
+    openapi_extra=RETRIEVE_OPENAPI_EXTRA,
+    dependencies=[Depends(interactive_lane)],
+)
+async def retrieve_similar_chunks(user_id: str, http_request: Request):
+    """
+    Retrieve top-k chunks for a user based on a query. Can be filtered
+    by index namespace and a list of section_ids. The query is either a
+    precomputed `query_embedding` or `query_text`, which is embedded here
+    (through the query embedding cache) in the same request.
 
-        results = []
-        for chunk_id, score in zip(chunk_ids, scores):
-            chunk_data = get_chunk_by_id(chunk_id)
-            if not chunk_data:
-                continue
-
-            # Post-filter by section_id if a filter is provided
-            if (
-                request.filter_by_section_ids
-                and chunk_data["section_id"] not in request.filter_by_section_ids
-            ):
-                continue
-
-            results.append(
-                ChunkItem(
-                    chunk_id=chunk_data["chunk_id"],
-                    user_id=chunk_data["user_id"],
-                    index_namespace=chunk_data["index_namespace"],
-                    section_id=chunk_data["section_id"],
-                    source_type=chunk_data["source_type"],
-                    source_id=chunk_data["source_id"],
-                    text=chunk_data["text"],
-                    score=float(score),
-                    created_at=chunk_data["created_at"],
+    Bodies may be JSON, `application/msgpack` or `application/octet-stream`;
+    responses are msgpack or NDJSON (one chunk per line, index version in the
+    `X-Index-Version` header) if the client accepts it, JSON otherwise.
+    """
+    options, query_vec, query_text = await _parse_retrieve_body(http_request)
+    http_request.state.namespace = options.index_namespace
+    try:
+        if query_text is not None:
+            query_vec, model_name = await _embed_query_with_model(query_text)
+            # A re-embedding cutover swaps the model and the indices together
+            # without yielding, and nothing below awaits before the search, so
+            # the active model is the one the searched index was built with.
+            if model_name != get_model_name():
+                raise HTTPException(
+                    status_code=503,
+                    detail="The embedding model changed during the request; retry",
+                    headers={"Retry-After": "1"},
                 )
+        else:
+            norm = np.linalg.norm(query_vec)
+            if norm > 0:
+                query_vec = query_vec / norm
+
+        # Metadata is served from the index's in-memory store; SQLite is not
+        # touched on this path.
+        chunks = search_chunks(
+            user_id,
+            options.index_namespace,
+            query_vec,
+            options.top_k,
+            section_ids=options.filter_by_section_ids or None,
+        )
+
+        # Read in the same event-loop step as the search, so it matches the results
+        version = index_version(user_id, options.index_namespace)
+
+        trusted = os.getenv("TRUSTED_INTERNAL_HOPS", "false").lower() == "true"
+        response_type = wire.negotiate(http_request.headers.get("accept"), wire.MSGPACK, wire.NDJSON)
+        if response_type == wire.NDJSON:
+            return StreamingResponse(
+                _ndjson_chunks(chunks, trusted),
+                media_type=wire.NDJSON,
+                headers={"X-Index-Version": version},
+            )
+        if response_type == wire.MSGPACK:
+            for chunk_data in chunks:
+                chunk_data["created_at"] = chunk_data["created_at"].isoformat()
+            return Response(
+                content=wire.packb({"results": chunks, "index_version": version}),
+                media_type=wire.MSGPACK,
+            )
+
+        if trusted:
+            # The chunks come from our own store; serialize them without
+            # validating them into ChunkItems. Nothing validates them later.
+            response = RetrieveResponse.model_construct(
+                results=[ChunkItem.model_construct(**chunk_data) for chunk_data in chunks],
+                index_version=version,
             )
+            return Response(content=response.model_dump_json(), media_type="application/json")
 
-        return RetrieveResponse(results=results)
+        results = [ChunkItem(**chunk_data) for chunk_data in chunks]
+        return RetrieveResponse(results=results, index_version=version)
 
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error during retrieval: {str(e)}")
 
 
-@app.post("/embed", response_model=EmbedResponse, tags=["Utilities"])
-async def embed_text_endpoint(request: EmbedRequest):
-    """Generate a normalized embedding for arbitrary text."""
+def _ndjson_chunks(chunks: List[dict], trusted: bool) -> Iterator[bytes]:
+    """Serialize search results one chunk per line, validating them unless `trusted`."""
+    build = ChunkItem.model_construct if trusted else ChunkItem
+    for chunk_data in chunks:
+        yield build(**chunk_data).model_dump_json().encode("utf-8") + b"\n"
+
+
+@app.get("/index/{user_id}/stats", response_model=IndexStatsResponse, tags=["Indexing"])
+async def get_index_stats(user_id: str):
+    """Vector count and memory cost of each of a user's resident indices."""
+    return IndexStatsResponse(user_id=user_id, namespaces=user_index_stats(user_id))
+
+
+@app.get(
+    "/index/{user_id}/version",
+    response_model=IndexVersionResponse,
+    tags=["Retrieval"],
+    dependencies=[Depends(interactive_lane)],
+)
+async def get_index_version(user_id: str, index_namespace: IndexNamespace = "profile"):
+    """
+    Current version of a user's namespaced index, as returned with `/retrieve`
+    results. Lets clients validate cached results without repeating the search.
+    """
+    return IndexVersionResponse(
+        user_id=user_id,
+        index_namespace=index_namespace,
+        index_version=index_version(user_id, index_namespace),
+    )
+
+
+@app.post(
+    "/embed",
+    response_model=EmbedResponse,
+    tags=["Utilities"],
+    dependencies=[Depends(interactive_lane)],
+)
+async def embed_text_endpoint(request: EmbedRequest, http_request: Request):
+    """
+    Generate a normalized embedding for arbitrary text. Clients accepting
+    `application/msgpack` or `application/octet-stream` get the vector as
+    packed little-endian float32 instead of a JSON float list.
+    The response names the model that produced the vector, so clients that
+    cache embeddings can tell when the model changes.
+    """
     try:
-        embedding_vector = embed_text(request.text)
-        return EmbedResponse(embedding=embedding_vector.tolist())
+        embedding_vector, model_name = await _embed_query_with_model(request.text)
+        response_type = wire.negotiate(
+            http_request.headers.get("accept"), wire.MSGPACK, wire.OCTET_STREAM
+        )
+        if response_type == wire.MSGPACK:
+            return Response(
+                content=wire.packb(
+                    {
+                        "embedding": wire.pack_vector(embedding_vector),
+                        "dim": int(embedding_vector.shape[0]),
+                        "model": model_name,
+                    }
+                ),
+                media_type=wire.MSGPACK,
+            )
+        if response_type == wire.OCTET_STREAM:
+            return Response(
+                content=wire.pack_vector(embedding_vector),
+                media_type=wire.OCTET_STREAM,
+                headers={
+                    "X-Embedding-Dim": str(embedding_vector.shape[0]),
+                    "X-Embedding-Model": model_name or "",
+                },
+            )
+        return EmbedResponse(embedding=embedding_vector.tolist(), model=model_name)
     except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error generating embedding: {str(e)}"
         )
 
 
+def _reembed_status() -> ReembedStatus:
+    job = current_job()
+    return ReembedStatus(
+        model_name=job.model_name,
+        active_model=get_model_name(),
+        status=job.status,
+        processed=job.processed,
+        total=job.total,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error,
+    )
+
+
+@app.post("/admin/reembed", response_model=ReembedStatus, status_code=202, tags=["Admin"])
+async def start_reembed(request: ReembedRequest):
+    """
+    Re-embed every chunk with a new model in the background and switch to it
+    atomically once done. Search keeps serving the current model meanwhile.
+    """
+    if request.model_name == get_model_name():
+        raise HTTPException(
+            status_code=409, detail=f"Model '{request.model_name}' is already active"
+        )
+    try:
+        start_reembedding(request.model_name, request.batch_size, request.pause_s)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return _reembed_status()
+
+
+@app.get("/admin/reembed", response_model=ReembedStatus, tags=["Admin"])
+async def get_reembed_status():
+    """Progress of the running or most recent re-embedding run."""
+    if current_job() is None:
+        raise HTTPException(status_code=404, detail="No re-embedding run has been started")
+    return _reembed_status()
+
+
+@app.delete("/admin/reembed", response_model=ReembedStatus, tags=["Admin"])
+async def cancel_reembed():
+    """Cancel the running re-embedding run; the current model stays active."""
+    if not await cancel_reembedding():
+        raise HTTPException(status_code=404, detail="No re-embedding run is in progress")
+    return _reembed_status()
+
+
+# --- Shard rebalancing: moving a user's data between instances ---
+
+
+@app.get("/admin/users", tags=["Admin"])
+async def get_users():
+    """Every user with indexed chunks on this instance."""
+    return {"users": list_users()}
+
+
+@app.get("/admin/users/{user_id}/export", tags=["Admin"], dependencies=[Depends(bulk_lane)])
+async def export_user(user_id: str):
+    """
+    All of a user's chunks, vectors and profile version as msgpack, in the
+    form `PUT /admin/users/{user_id}` accepts.
+    """
+    rows = get_user_chunks(user_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail=f"No chunks for user {user_id}")
+    vectors = load_embeddings(rows)
+    version = get_profile_version(user_id)
+    payload = {
+        "user_id": user_id,
+        "profile_etag": version["profile_etag"] if version else None,
+        "profile_hash": version["profile_hash"] if version else None,
+        "chunks": [
+            {
+                "chunk_id": row["chunk_id"],
+                "index_namespace": row["index_namespace"],
+                "section_id": row["section_id"],
+                "source_type": row["source_type"],
+                "source_id": row["source_id"],
+                "text": row["text"],
+                "embedding": wire.pack_vector(vector),
+                "embedding_model": row["embedding_model"],
+                "created_at": row["created_at"],
+            }
+            for row, vector in zip(rows, vectors)
+        ],
+    }
+    return Response(content=wire.packb(payload), media_type=wire.MSGPACK)
+
+
+@app.put("/admin/users/{user_id}", tags=["Admin"], dependencies=[Depends(bulk_lane)])
+async def import_user(user_id: str, http_request: Request):
+    """
+    Replace a user's chunks with an export from another instance (msgpack)
+    and rebuild their indices.
+    """
+    try:
+        payload = wire.unpackb(await http_request.body())
+        chunks = [
+            (
+                chunk["chunk_id"],
+                chunk["index_namespace"],
+                chunk["section_id"],
+                chunk["source_type"],
+                chunk["source_id"],
+                chunk["text"],
+                bytes(chunk["embedding"]),
+                chunk["embedding_model"],
+                chunk["created_at"],
+            )
+            for chunk in payload["chunks"]
+        ]
+    except (ValueError, KeyError, TypeError, msgpack.exceptions.ExtraData) as e:
+        raise HTTPException(status_code=422, detail=f"Invalid user export: {e}")
+    count = import_user_chunks(
+        user_id, chunks, payload.get("profile_etag"), payload.get("profile_hash")
+    )
+    delete_user_index(user_id)
+    for namespace in sorted({chunk[1] for chunk in chunks}):
+        rebuild_index_for_user_namespace(user_id, namespace)
+    return {"user_id": user_id, "num_chunks": count}
+
+
+@app.delete("/admin/users/{user_id}", tags=["Admin"], dependencies=[Depends(bulk_lane)])
+async def delete_user(user_id: str):
+    """Delete all of a user's chunks and indices from this instance."""
+    count = delete_all_user_chunks(user_id)
+    delete_user_index(user_id)
+    return {"user_id": user_id, "num_chunks": count}
+
+
 @app.get("/health", tags=["Utilities"])
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "embedding_service"}
\ No newline at end of file
+    return {"status": "healthy", "service": "embedding_service"}
+
+
+@app.get("/admin/lanes", tags=["Admin"])
+async def get_lane_stats():
+    """Queue depth, in-flight count and limits of each execution lane."""
+    return lane_stats()
+
+
+@app.get("/metrics", tags=["Utilities"])
+async def metrics():
+    """Prometheus metrics, with index gauges refreshed at scrape time."""
+    num_indices, num_vectors, num_tombstoned, vector_bytes, metadata_bytes = index_stats()
+    RESIDENT_INDICES.set(num_indices)
+    RESIDENT_VECTORS.set(num_vectors)
+    TOMBSTONED_VECTORS.set(num_tombstoned)
+    INDEX_MEMORY_BYTES.set(vector_bytes)
+    METADATA_MEMORY_BYTES.set(metadata_bytes)
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,341 @@
+"""
+Synthetic-corpus benchmark for the embedding service's index and retrieval paths.
+
+Generates synthetic users and profiles, pushes them through chunking, SQLite
+writes, index builds, FAISS search and the full `/retrieve` endpoint, and
+reports throughput, p50/p99 latency and peak RSS per stage as JSON so runs
+can be compared across commits.
+
+A deterministic stub encoder stands in for the sentence transformer, so no
+model download is needed and vectors are identical between runs.
+
+Usage (from the AI_Services directory):
+    python -m embedding_service.benchmark --chunks 100000 --users 1000 --output bench.json
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from . import db, faiss_index, model
+from .chunking import chunk_text, extract_text_fields
+
+DEFAULT_DIM = 384
+
+_WORDS = (
+    "designed built led shipped scaled optimized migrated automated reduced improved "
+    "python java go rust kubernetes docker terraform postgres redis kafka spark airflow "
+    "api service pipeline platform dashboard latency throughput cost reliability team "
+    "customers revenue onboarding search ranking recommendations analytics billing "
+    "infrastructure observability security compliance mobile frontend backend data"
+).split()
+
+
+class StubEncoder:
+    """
+    Deterministic stand-in for SentenceTransformer. Each text maps to a fixed
+    pseudo-random vector derived from its SHA-256 digest.
+    """
+
+    def __init__(self, dim: int = DEFAULT_DIM):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def _encode_one(self, text: str) -> np.ndarray:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        return np.random.default_rng(seed).standard_normal(self.dim).astype(np.float32)
+
+    def encode(self, texts, convert_to_numpy: bool = True, **kwargs) -> np.ndarray:
+        if isinstance(texts, str):
+            return self._encode_one(texts)
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        return np.vstack([self._encode_one(t) for t in texts])
+
+
+def _sentence(rng: random.Random) -> str:
+    words = rng.choices(_WORDS, k=rng.randint(8, 20))
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, sentences: int) -> str:
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def generate_profile(rng: random.Random) -> dict:
+    """Generate one synthetic profile shaped like the backend's profile payload."""
+    return {
+        "experience": [
+            {"title": "Engineer", "description": _paragraph(rng, rng.randint(2, 8))}
+            for _ in range(rng.randint(1, 4))
+        ],
+        "projects": [
+            {"name": "Project", "description": _paragraph(rng, rng.randint(2, 6))}
+            for _ in range(rng.randint(0, 3))
+        ],
+        "skills": rng.sample(_WORDS, k=rng.randint(3, 10)),
+        "summary": _paragraph(rng, rng.randint(1, 3)),
+    }
+
+
+def generate_corpus(
+    num_chunks: int, num_users: int, seed: int
+) -> List[Tuple[str, str, str, str]]:
+    """
+    Generate profiles round-robin across users until `num_chunks` chunks exist.
+    Returns (user_id, source_type, source_id, text) tuples.
+    """
+    rng = random.Random(seed)
+    user_ids = [f"bench-user-{i}" for i in range(num_users)]
+    corpus: List[Tuple[str, str, str, str]] = []
+    i = 0
+    while len(corpus) < num_chunks:
+        user_id = user_ids[i % num_users]
+        for source_type, source_id, text in extract_text_fields(generate_profile(rng)):
+            for chunk in chunk_text(text):
+                corpus.append((user_id, source_type, source_id, chunk))
+        i += 1
+    return corpus[:num_chunks]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is reported in kilobytes on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return round(peak / divisor, 2)
+
+
+def _summarize(
+    name: str, latencies: List[float], total_seconds: float, items: int
+) -> Dict[str, float]:
+    result = {
+        "items": items,
+        "total_seconds": round(total_seconds, 6),
+        "throughput_per_s": round(items / total_seconds, 2) if total_seconds > 0 else None,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    if latencies:
+        arr = np.array(latencies) * 1000.0
+        result["p50_ms"] = round(float(np.percentile(arr, 50)), 4)
+        result["p99_ms"] = round(float(np.percentile(arr, 99)), 4)
+    print(f"[bench] {name}: {json.dumps(result)}", file=sys.stderr)
+    return result
+
+
+def _time_calls(fn: Callable[[], None], repeat: int) -> Tuple[List[float], float]:
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - start
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def run_benchmark(
+    num_chunks: int,
+    num_users: int,
+    queries: int = 200,
+    write_sample: int = 500,
+    rebuild_sample: int = 50,
+    top_k: int = 5,
+    dim: int = DEFAULT_DIM,
+    seed: int = 42,
+    workdir: Optional[str] = None,
+) -> dict:
+    """Run every stage against a fresh temporary database and return the report."""
+    rng = random.Random(seed)
+    workdir = workdir or tempfile.mkdtemp(prefix="embedding-bench-")
+    db.DB_PATH = os.path.join(workdir, "bench_embeddings.db")
+    db.init_db()
+    faiss_index.user_indices.clear()
+    model._model = StubEncoder(dim)
+
+    stages: Dict[str, dict] = {}
+
+    # 1. Corpus generation + chunking
+    start = time.perf_counter()
+    corpus = generate_corpus(num_chunks, num_users, seed)
+    stages["generate_and_chunk"] = _summarize(
+        "generate_and_chunk", [], time.perf_counter() - start, len(corpus)
+    )
+
+    # 2. Encoding
+    start = time.perf_counter()
+    embeddings = [model.embed_text(text).tobytes() for _, _, _, text in corpus]
+    stages["encode"] = _summarize("encode", [], time.perf_counter() - start, len(corpus))
+
+    # 3. Per-row writes through store_chunk on a sample
+    sample = min(write_sample, len(corpus))
+    latencies = []
+    start = time.perf_counter()
+    for (user_id, source_type, source_id, text), emb in zip(corpus[:sample], embeddings[:sample]):
+        t0 = time.perf_counter()
+        db.store_chunk(str(uuid.uuid4()), user_id, "profile", None, source_type, source_id, text, emb)
+        latencies.append(time.perf_counter() - t0)
+    stages["store_chunk"] = _summarize(
+        "store_chunk", latencies, time.perf_counter() - start, sample
+    )
+
+    # 4. Bulk write of the remainder in a single transaction
+    now = datetime.utcnow().isoformat()
+    rows = [
+        (str(uuid.uuid4()), user_id, "profile", None, source_type, source_id, text, emb, now)
+        for (user_id, source_type, source_id, text), emb in zip(corpus[sample:], embeddings[sample:])
+    ]
+    conn = db.get_connection()
+    try:
+        start = time.perf_counter()
+        conn.executemany(
+            """
+            INSERT INTO chunks
+            (chunk_id, user_id, index_namespace, section_id, source_type, source_id, text, embedding, created_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """,
+            rows,
+        )
+        conn.commit()
+        stages["bulk_write"] = _summarize(
+            "bulk_write", [], time.perf_counter() - start, len(rows)
+        )
+    finally:
+        conn.close()
+    del rows, embeddings
+
+    # 5. Full startup build
+    start = time.perf_counter()
+    faiss_index.build_index_from_db(db.get_all_chunks())
+    stages["build_index_from_db"] = _summarize(
+        "build_index_from_db", [], time.perf_counter() - start, len(corpus)
+    )
+
+    user_ids = sorted(faiss_index.user_indices.keys())
+
+    # 6. Single user/namespace rebuilds
+    picks = [rng.choice(user_ids) for _ in range(min(rebuild_sample, len(user_ids)))]
+    picks_iter = iter(picks)
+    latencies, total = _time_calls(
+        lambda: faiss_index.rebuild_index_for_user_namespace(next(picks_iter), "profile"),
+        len(picks),
+    )
+    stages["rebuild_index_for_user_namespace"] = _summarize(
+        "rebuild_index_for_user_namespace", latencies, total, len(picks)
+    )
+
+    # 7. Raw FAISS search
+    query_vectors = []
+    for i in range(queries):
+        q = model.embed_text(f"benchmark query {i} {_sentence(rng)}")
+        query_vectors.append((rng.choice(user_ids), q))
+    query_iter = iter(query_vectors)
+    latencies, total = _time_calls(lambda: _search_next(query_iter, top_k), len(query_vectors))
+    stages["search"] = _summarize("search", latencies, total, len(query_vectors))
+
+    # 8. Full /retrieve with hydration and serialization
+    from fastapi.testclient import TestClient
+    from .app import app
+
+    client = TestClient(app)  # no context manager: skip lifespan (it resets the DB)
+    payloads = [(user_id, {"query_embedding": q.tolist(), "top_k": top_k}) for user_id, q in query_vectors]
+    payload_iter = iter(payloads)
+
+    def _retrieve():
+        user_id, payload = next(payload_iter)
+        response = client.post(f"/retrieve/{user_id}", json=payload)
+        response.raise_for_status()
+
+    latencies, total = _time_calls(_retrieve, len(payloads))
+    stages["retrieve_endpoint"] = _summarize("retrieve_endpoint", latencies, total, len(payloads))
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.utcnow().isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "params": {
+                "chunks": num_chunks,
+                "users": num_users,
+                "queries": queries,
+                "write_sample": write_sample,
+                "rebuild_sample": rebuild_sample,
+                "top_k": top_k,
+                "dim": dim,
+                "seed": seed,
+            },
+        },
+        "stages": stages,
+    }
+
+
+def _search_next(query_iter, top_k: int) -> None:
+    user_id, query = next(query_iter)
+    faiss_index.search(user_id, "profile", query, top_k)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument("--chunks", type=int, default=10_000, help="Total chunks to generate")
+    parser.add_argument("--users", type=int, default=100, help="Number of synthetic users")
+    parser.add_argument("--queries", type=int, default=200, help="Search/retrieve queries to time")
+    parser.add_argument("--write-sample", type=int, default=500, help="Chunks written via store_chunk")
+    parser.add_argument("--rebuild-sample", type=int, default=50, help="Single-index rebuilds to time")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", help="Directory for the benchmark database (default: temp dir)")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    # The service modules print progress to stdout; keep stdout for the report.
+    with contextlib.redirect_stdout(sys.stderr):
+        report = run_benchmark(
+            num_chunks=args.chunks,
+            num_users=args.users,
+            queries=args.queries,
+            write_sample=args.write_sample,
+            rebuild_sample=args.rebuild_sample,
+            top_k=args.top_k,
+            dim=args.dim,
+            seed=args.seed,
+            workdir=args.workdir,
+        )
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,238 @@
+"""
+Offline bulk indexer for backfilling profiles without going through HTTP.
+
+Reads a JSONL dump with one profile per line, either
+`{"user_id": "...", "profile": {...}}` or a profile object carrying its own
+`user_id`. Worker processes each load the model once, then parse, chunk and
+encode whole slices of profiles in large batches. The main process writes
+each slice in a single transaction with the same replace semantics as
+`/index/profile/{user_id}`, records a checkpoint, and reports throughput.
+At the end it can write an index snapshot that the service loads at
+startup (`INDEX_SNAPSHOT_PATH`) instead of rebuilding from SQLite. The
+snapshot is streamed: each user's index is built from the database, written
+and dropped before the next, so peak memory is one index, not the corpus.
+
+Usage (from the AI_Services directory):
+    python -m embedding_service.bulk_index profiles.jsonl --db embeddings.db \\
+        --workers 8 --checkpoint backfill.ckpt --snapshot indices.snapshot
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from . import db, faiss_index
+from .chunking import chunk_text, extract_text_fields
+from .model import DEFAULT_MODEL_NAME, embed_batch, load_model
+
+# (chunk_id, user_id, source_type, source_id, text, embedding_bytes)
+ChunkRow = Tuple[str, str, str, str, str, bytes]
+
+
+@dataclass
+class SliceResult:
+    """Output of one worker task: everything needed to write a slice of the input."""
+
+    next_line: int
+    user_ids: List[str]
+    chunks: List[ChunkRow]
+    errors: int
+
+
+def _init_worker(model_name: str, threads_per_worker: int) -> None:
+    """Process-pool initializer: load the model once per worker."""
+    try:
+        import torch
+
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    load_model(model_name)
+
+
+def _parse_line(line: str) -> Tuple[str, dict]:
+    record = json.loads(line)
+    profile = record.get("profile", record)
+    user_id = record.get("user_id") or profile.get("user_id")
+    if not user_id:
+        raise ValueError("record has no user_id")
+    return str(user_id), profile
+
+
+def process_slice(lines: List[Tuple[int, str]]) -> SliceResult:
+    """Parse, chunk and encode one slice of (line number, raw line) pairs."""
+    # A user appearing twice keeps only their last profile, as with repeated
+    # /index/profile calls.
+    per_user: Dict[str, List[Tuple[str, str, str, str]]] = {}
+    errors = 0
+    for line_no, line in lines:
+        if not line.strip():
+            continue
+        try:
+            user_id, profile = _parse_line(line)
+        except (ValueError, AttributeError) as e:
+            print(f"[bulk_index] skipping line {line_no + 1}: {e}", file=sys.stderr)
+            errors += 1
+            continue
+        per_user[user_id] = [
+            (user_id, source_type, source_id, chunk)
+            for source_type, source_id, text in extract_text_fields(profile)
+            for chunk in chunk_text(text)
+        ]
+
+    pending = [item for items in per_user.values() for item in items]
+    chunks: List[ChunkRow] = []
+    if pending:
+        vectors = embed_batch([text for _, _, _, text in pending])
+        chunks = [
+            (str(uuid.uuid4()), user_id, source_type, source_id, text, vector.tobytes())
+            for (user_id, source_type, source_id, text), vector in zip(pending, vectors)
+        ]
+    return SliceResult(lines[-1][0] + 1, list(per_user), chunks, errors)
+
+
+def _read_slices(path: str, start_line: int, slice_size: int) -> Iterator[List[Tuple[int, str]]]:
+    batch: List[Tuple[int, str]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if line_no < start_line:
+                continue
+            batch.append((line_no, line))
+            if len(batch) == slice_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _load_checkpoint(path: Optional[str], input_path: str) -> dict:
+    state = {"input": os.path.abspath(input_path), "next_line": 0, "profiles": 0, "chunks": 0, "errors": 0}
+    if path and os.path.exists(path):
+        with open(path) as f:
+            saved = json.load(f)
+        if saved.get("input") != state["input"]:
+            raise SystemExit(f"Checkpoint {path} belongs to {saved.get('input')}, not {state['input']}")
+        state.update(saved)
+        print(f"[bulk_index] resuming from line {state['next_line'] + 1}", file=sys.stderr)
+    return state
+
+
+def _save_checkpoint(path: Optional[str], state: dict) -> None:
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def run_bulk_index(
+    input_path: str,
+    workers: int = 0,
+    slice_size: int = 256,
+    checkpoint_path: Optional[str] = None,
+    snapshot_path: Optional[str] = None,
+    model_name: str = DEFAULT_MODEL_NAME,
+) -> dict:
+    """
+    Index every profile in `input_path` into the configured database. With
+    `workers` = 0 everything runs in this process. Returns the final state.
+    """
+    db.init_db(reset=False)
+    state = _load_checkpoint(checkpoint_path, input_path)
+    slices = _read_slices(input_path, state["next_line"], slice_size)
+
+    executor: Optional[ProcessPoolExecutor] = None
+    if workers > 0:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(model_name, threads))
+    else:
+        load_model(model_name)
+
+    start = time.perf_counter()
+    profiles_at_start, chunks_at_start = state["profiles"], state["chunks"]
+    in_flight: Deque[Future] = deque()
+    try:
+        while True:
+            # Keep a bounded window of slices in flight and write them in input
+            # order, so the checkpoint always marks a fully written prefix.
+            while executor is not None and len(in_flight) < 2 * workers:
+                batch = next(slices, None)
+                if batch is None:
+                    break
+                in_flight.append(executor.submit(process_slice, batch))
+            if executor is not None:
+                if not in_flight:
+                    break
+                result = in_flight.popleft().result()
+            else:
+                batch = next(slices, None)
+                if batch is None:
+                    break
+                result = process_slice(batch)
+
+            db.replace_profiles_bulk(result.user_ids, result.chunks, model_name)
+            state["next_line"] = result.next_line
+            state["profiles"] += len(result.user_ids)
+            state["chunks"] += len(result.chunks)
+            state["errors"] += result.errors
+            _save_checkpoint(checkpoint_path, state)
+
+            elapsed = time.perf_counter() - start
+            print(
+                f"[bulk_index] line {state['next_line']}: {state['profiles']} profiles, "
+                f"{state['chunks']} chunks, {state['errors']} errors | "
+                f"{(state['profiles'] - profiles_at_start) / elapsed:.1f} profiles/s, "
+                f"{(state['chunks'] - chunks_at_start) / elapsed:.1f} chunks/s",
+                file=sys.stderr,
+            )
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    if snapshot_path:
+        # Build and write one index at a time; the corpus never sits in memory
+        faiss_index.save_snapshot(
+            snapshot_path,
+            db.snapshot_fingerprint(),
+            faiss_index.iter_indices(db.iter_all_chunks()),
+        )
+    return state
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0].strip())
+    parser.add_argument("input", help="JSONL file with one profile per line")
+    parser.add_argument("--db", default=db.DB_PATH, help="SQLite database to write to")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes for chunking and encoding (0 = in-process)")
+    parser.add_argument("--slice-size", type=int, default=256, help="Profiles per worker task and transaction")
+    parser.add_argument("--checkpoint", help="Checkpoint file for resuming an interrupted run")
+    parser.add_argument("--snapshot", help="Write an index snapshot here when done")
+    parser.add_argument("--model", default=DEFAULT_MODEL_NAME, help="sentence-transformers model to encode with")
+    args = parser.parse_args(argv)
+
+    db.DB_PATH = args.db
+    # Service modules print progress to stdout; keep stdout for the summary.
+    with contextlib.redirect_stdout(sys.stderr):
+        state = run_bulk_index(
+            args.input,
+            workers=args.workers,
+            slice_size=args.slice_size,
+            checkpoint_path=args.checkpoint,
+            snapshot_path=args.snapshot,
+            model_name=args.model,
+        )
+    print(json.dumps(state))
+
+
+if __name__ == "__main__":
+    main()
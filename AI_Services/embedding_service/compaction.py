@@ -0,0 +1,75 @@
+"""
+Background compaction of tombstoned index rows and SQLite space.
+
+Deletes only tombstone rows (in SQLite and in the resident FAISS index), so a
+section edit costs an UPDATE and a set insert instead of a full rebuild. This
+module pays that debt off later:
+
+- any index whose tombstone ratio reaches `TOMBSTONE_RATIO_THRESHOLD` is
+  rebuilt from its live rows;
+- once the service has been idle for `VACUUM_QUIET_PERIOD_S`, tombstoned rows
+  are purged from SQLite and up to `VACUUM_PAGES` free pages are returned to
+  the OS with an incremental vacuum.
+
+Each pass runs on the event loop between requests. Handlers touch the indices
+synchronously, so a pass never interleaves with an index mutation.
+"""
+
+import asyncio
+import os
+import time
+
+from .db import incremental_vacuum, purge_deleted_chunks
+from .faiss_index import fragmented_indices, rebuild_index_for_user_namespace
+from .metrics import INDEX_COMPACTIONS, VACUUM_PAGES_FREED
+
+COMPACTION_INTERVAL_S = float(os.getenv("COMPACTION_INTERVAL_S", "30"))
+TOMBSTONE_RATIO_THRESHOLD = float(os.getenv("TOMBSTONE_RATIO_THRESHOLD", "0.2"))
+VACUUM_QUIET_PERIOD_S = float(os.getenv("VACUUM_QUIET_PERIOD_S", "60"))
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "1000"))
+
+_last_activity = time.monotonic()
+
+
+def note_activity() -> None:
+    """Record that a request was served; vacuum waits for a quiet period."""
+    global _last_activity
+    _last_activity = time.monotonic()
+
+
+def compact_indices(threshold: float = TOMBSTONE_RATIO_THRESHOLD) -> int:
+    """Rebuild every index at or above the tombstone ratio. Returns how many were rebuilt."""
+    rebuilt = 0
+    for user_id, namespace in fragmented_indices(threshold):
+        rebuild_index_for_user_namespace(user_id, namespace)
+        INDEX_COMPACTIONS.inc()
+        rebuilt += 1
+    if rebuilt:
+        print(f"Compacted {rebuilt} fragmented FAISS indices.")
+    return rebuilt
+
+
+def vacuum_if_quiet(quiet_period_s: float = VACUUM_QUIET_PERIOD_S) -> int:
+    """
+    Purge tombstoned rows and run an incremental vacuum if no request has
+    been served for `quiet_period_s`. Returns the number of pages freed.
+    """
+    if time.monotonic() - _last_activity < quiet_period_s:
+        return 0
+    purged = purge_deleted_chunks()
+    freed = incremental_vacuum(VACUUM_PAGES)
+    VACUUM_PAGES_FREED.inc(freed)
+    if purged or freed:
+        print(f"Purged {purged} deleted chunks, freed {freed} database pages.")
+    return freed
+
+
+async def run_compactor(interval_s: float = COMPACTION_INTERVAL_S) -> None:
+    """Run compaction passes every `interval_s` until cancelled."""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            compact_indices()
+            vacuum_if_quiet()
+        except Exception as e:
+            print(f"Error during compaction: {e}")
@@ -1,48 +1,160 @@
+import os
 import sqlite3
-from typing import List, Optional, Tuple
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
 from datetime import datetime
 
+import numpy as np
+
+from .metrics import DB_LATENCY, observe
+from .vector_store import VectorFile
+
 DB_PATH = "embeddings.db"
 
+# Where chunk vectors live: 'sqlite' (the `embedding` BLOB column) or 'mmap'
+# (an append-only memory-mapped file next to the database, see vector_store.py,
+# with an empty `embedding` column)
+VECTOR_STORAGE = os.getenv("VECTOR_STORAGE", "sqlite")
+
 def get_connection() -> sqlite3.Connection:
     """Get database connection with row factory for easier data access"""
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
-def init_db() -> None:
-    """Initialize database tables if they don't exist."""
+def vector_file() -> VectorFile:
+    """The vector file used with VECTOR_STORAGE=mmap (VECTOR_FILE_PATH, or next to the DB)."""
+    return VectorFile(os.getenv("VECTOR_FILE_PATH") or f"{DB_PATH}.vectors")
+
+def _insert_chunk_rows(cursor: sqlite3.Cursor, sql: str, rows: Sequence[tuple],
+                       embedding_pos: int) -> List[int]:
+    """
+    Insert chunk rows whose embedding bytes sit at `embedding_pos`, routing the
+    vectors to the vector file in mmap mode. Returns the new integer ids.
+    """
+    use_file = VECTOR_STORAGE == "mmap"
+    ids = []
+    for row in rows:
+        if use_file:
+            row = row[:embedding_pos] + (b"",) + row[embedding_pos + 1:]
+        cursor.execute(sql, row)
+        ids.append(cursor.lastrowid)
+    if use_file and ids:
+        # Written before the caller commits, so a committed row always has its vector
+        vector_file().write(ids, [row[embedding_pos] for row in rows])
+    return ids
+
+def load_embeddings(rows: Sequence[sqlite3.Row]) -> np.ndarray:
+    """
+    Vectors of chunk `rows` as a (len(rows), dim) float32 matrix. A row's own
+    `embedding` bytes are used when present, otherwise the vector file's.
+    """
+    in_file = [i for i, row in enumerate(rows) if not row["embedding"]]
+    if not in_file:
+        return np.vstack([np.frombuffer(row["embedding"], dtype=np.float32) for row in rows])
+    from_file = vector_file().read([rows[i]["id"] for i in in_file])
+    if len(in_file) == len(rows):
+        return from_file
+    matrix = np.empty((len(rows), from_file.shape[1]), dtype=np.float32)
+    matrix[in_file] = from_file
+    inline = [i for i, row in enumerate(rows) if row["embedding"]]
+    matrix[inline] = [np.frombuffer(rows[i]["embedding"], dtype=np.float32) for i in inline]
+    return matrix
+
+def _ensure_column(cursor: sqlite3.Cursor, table: str, column: str, definition: str) -> None:
+    """Add a column to an existing table if it is missing (for databases kept across restarts)."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    if column not in {row["name"] for row in cursor.fetchall()}:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+_CHUNK_COLUMNS = (
+    "chunk_id, user_id, index_namespace, section_id, source_type, source_id, text, embedding, "
+    "embedding_model, created_at, deleted, shadow_embedding, shadow_model"
+)
+
+def _migrate_to_integer_ids(cursor: sqlite3.Cursor) -> None:
+    """
+    Rebuild a chunks table keyed by its text chunk_id into one keyed by an
+    integer id, keeping each row's rowid as its new id.
+    """
+    cursor.execute("PRAGMA table_info(chunks)")
+    if "id" in {row["name"] for row in cursor.fetchall()}:
+        return
+    print("Migrating chunks table to integer ids")
+    cursor.execute("ALTER TABLE chunks RENAME TO chunks_text_keyed")
+    _create_chunks_table(cursor)
+    cursor.execute(
+        f"INSERT INTO chunks (id, {_CHUNK_COLUMNS}) SELECT rowid, {_CHUNK_COLUMNS} FROM chunks_text_keyed"
+    )
+    cursor.execute("DROP TABLE chunks_text_keyed")
+
+def _create_chunks_table(cursor: sqlite3.Cursor) -> None:
+    # `id` is the FAISS-facing key: AUTOINCREMENT so ids are never reused,
+    # which keeps them ascending within every index. `chunk_id` is the
+    # public UUID.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS chunks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            chunk_id TEXT NOT NULL UNIQUE,
+            user_id TEXT NOT NULL,
+            index_namespace TEXT NOT NULL, -- 'profile' or 'resume_sections'
+            section_id TEXT, -- User-defined ID for resume sections
+            source_type TEXT NOT NULL,
+            source_id TEXT NOT NULL,
+            text TEXT NOT NULL,
+            embedding BLOB NOT NULL,
+            embedding_model TEXT, -- model that produced `embedding`
+            created_at TEXT NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0, -- tombstone, purged by the compactor
+            shadow_embedding BLOB, -- written by a re-embedding run, promoted at cutover
+            shadow_model TEXT,
+            FOREIGN KEY (user_id) REFERENCES users (user_id)
+        )
+    """)
+
+def init_db(reset: Optional[bool] = None) -> None:
+    """
+    Initialize database tables if they don't exist. Existing tables are dropped
+    first unless `reset` is False (default: the RESET_DB_ON_STARTUP env var, true).
+    """
+    if reset is None:
+        reset = os.getenv("RESET_DB_ON_STARTUP", "true").lower() == "true"
     conn = get_connection()
     try:
         cursor = conn.cursor()
+
+        # Let freed pages be returned to the OS a batch at a time (see
+        # `incremental_vacuum`). Switching an existing file needs one full VACUUM.
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cursor.execute("VACUUM")
         
-        cursor.execute("DROP TABLE IF EXISTS chunks") # For easier dev, remove in prod
-        cursor.execute("DROP TABLE IF EXISTS users") # For easier dev, remove in prod
+        if reset:
+            cursor.execute("DROP TABLE IF EXISTS chunks") # For easier dev, remove in prod
+            cursor.execute("DROP TABLE IF EXISTS users") # For easier dev, remove in prod
+            vector_file().remove()
         
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 user_id TEXT PRIMARY KEY,
-                last_indexed_at TEXT NOT NULL
+                last_indexed_at TEXT NOT NULL,
+                profile_etag TEXT, -- backend ETag of the last indexed profile
+                profile_hash TEXT -- SHA-256 of the last indexed profile JSON
             )
         """)
+        _ensure_column(cursor, "users", "profile_etag", "TEXT")
+        _ensure_column(cursor, "users", "profile_hash", "TEXT")
         
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS chunks (
-                chunk_id TEXT PRIMARY KEY,
-                user_id TEXT NOT NULL,
-                index_namespace TEXT NOT NULL, -- 'profile' or 'resume_sections'
-                section_id TEXT, -- User-defined ID for resume sections
-                source_type TEXT NOT NULL,
-                source_id TEXT NOT NULL,
-                text TEXT NOT NULL,
-                embedding BLOB NOT NULL,
-                created_at TEXT NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (user_id)
-            )
-        """)
+        _create_chunks_table(cursor)
+        _ensure_column(cursor, "chunks", "embedding_model", "TEXT")
+        _ensure_column(cursor, "chunks", "deleted", "INTEGER NOT NULL DEFAULT 0")
+        _ensure_column(cursor, "chunks", "shadow_embedding", "BLOB")
+        _ensure_column(cursor, "chunks", "shadow_model", "TEXT")
+        _migrate_to_integer_ids(cursor)
         
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_user_id_namespace ON chunks (user_id, index_namespace)")
         cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_user_section_id ON chunks (user_id, section_id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_chunks_deleted ON chunks (user_id, index_namespace) WHERE deleted = 1")
         
         conn.commit()
         print("Database initialized successfully")
@@ -54,18 +166,24 @@ def init_db() -> None:
         conn.close()
 
 def store_chunk(chunk_id: str, user_id: str, namespace: str, section_id: Optional[str],
-                source_type: str, source_id: str, text: str, embedding_bytes: bytes) -> None:
-    """Store a chunk with its embedding and metadata in the database."""
+                source_type: str, source_id: str, text: str, embedding_bytes: bytes,
+                embedding_model: Optional[str] = None) -> Tuple[int, str]:
+    """
+    Store a chunk with its embedding and metadata in the database. Returns
+    its integer id and created_at.
+    """
     conn = get_connection()
     try:
         cursor = conn.cursor()
         current_time = datetime.utcnow().isoformat()
-        cursor.execute("""
-            INSERT OR REPLACE INTO chunks 
-            (chunk_id, user_id, index_namespace, section_id, source_type, source_id, text, embedding, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (chunk_id, user_id, namespace, section_id, source_type, source_id, text, embedding_bytes, current_time))
-        conn.commit()
+        with observe(DB_LATENCY, operation="write"):
+            (row_id,) = _insert_chunk_rows(cursor, """
+                INSERT OR REPLACE INTO chunks 
+                (chunk_id, user_id, index_namespace, section_id, source_type, source_id, text, embedding, embedding_model, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, [(chunk_id, user_id, namespace, section_id, source_type, source_id, text, embedding_bytes, embedding_model, current_time)], 7)
+            conn.commit()
+        return row_id, current_time
     except Exception as e:
         print(f"Error storing chunk {chunk_id}: {e}")
         conn.rollback()
@@ -78,21 +196,43 @@ def get_all_chunks() -> List[sqlite3.Row]:
     conn = get_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM chunks ORDER BY user_id, index_namespace")
-        return cursor.fetchall()
+        with observe(DB_LATENCY, operation="read"):
+            cursor.execute("SELECT * FROM chunks WHERE deleted = 0 ORDER BY user_id, index_namespace, id")
+            return cursor.fetchall()
     except Exception as e:
         print(f"Error fetching all chunks: {e}")
         return []
     finally:
         conn.close()
 
+def iter_all_chunks(batch_size: int = 1000) -> Iterator[sqlite3.Row]:
+    """
+    Like `get_all_chunks`, but yields the rows in batches instead of loading
+    them all, ordered by user_id and index_namespace so each index's rows
+    arrive together.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.execute(
+            "SELECT * FROM chunks WHERE deleted = 0 ORDER BY user_id, index_namespace, id"
+        )
+        while True:
+            with observe(DB_LATENCY, operation="read"):
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                return
+            yield from rows
+    finally:
+        conn.close()
+
 def get_chunk_by_id(chunk_id: str) -> Optional[sqlite3.Row]:
     """Retrieve a single chunk by its ID."""
     conn = get_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("SELECT * FROM chunks WHERE chunk_id = ?", (chunk_id,))
-        return cursor.fetchone()
+        with observe(DB_LATENCY, operation="read"):
+            cursor.execute("SELECT * FROM chunks WHERE chunk_id = ? AND deleted = 0", (chunk_id,))
+            return cursor.fetchone()
     except Exception as e:
         print(f"Error fetching chunk {chunk_id}: {e}")
         return None
@@ -104,11 +244,12 @@ def get_user_chunks_by_namespace(user_id: str, namespace: str) -> List[sqlite3.R
     conn = get_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute(
-            "SELECT * FROM chunks WHERE user_id = ? AND index_namespace = ?",
-            (user_id, namespace)
-        )
-        return cursor.fetchall()
+        with observe(DB_LATENCY, operation="read"):
+            cursor.execute(
+                "SELECT * FROM chunks WHERE user_id = ? AND index_namespace = ? AND deleted = 0 ORDER BY id",
+                (user_id, namespace)
+            )
+            return cursor.fetchall()
     except Exception as e:
         print(f"Error fetching chunks for user {user_id} in namespace {namespace}: {e}")
         return []
@@ -116,13 +257,20 @@ def get_user_chunks_by_namespace(user_id: str, namespace: str) -> List[sqlite3.R
         conn.close()
 
 def delete_user_chunks(user_id: str, namespace: str) -> int:
-    """Delete all chunks for a user in a specific namespace. Returns number of rows deleted."""
+    """
+    Tombstone all chunks for a user in a specific namespace. Returns number of
+    rows deleted. Rows are physically removed later by `purge_deleted_chunks`.
+    """
     conn = get_connection()
     try:
         cursor = conn.cursor()
-        cursor.execute("DELETE FROM chunks WHERE user_id = ? AND index_namespace = ?", (user_id, namespace))
-        deleted_rows = cursor.rowcount
-        conn.commit()
+        with observe(DB_LATENCY, operation="write"):
+            cursor.execute(
+                "UPDATE chunks SET deleted = 1 WHERE user_id = ? AND index_namespace = ? AND deleted = 0",
+                (user_id, namespace),
+            )
+            deleted_rows = cursor.rowcount
+            conn.commit()
         return deleted_rows
     except Exception as e:
         print(f"Error deleting chunks for user {user_id} in namespace {namespace}: {e}")
@@ -132,14 +280,21 @@ def delete_user_chunks(user_id: str, namespace: str) -> int:
         conn.close()
 
 def delete_chunks_by_section_id(user_id: str, section_id: str) -> int:
-    """Delete all chunks associated with a specific user and section_id. Returns number of rows deleted."""
+    """
+    Tombstone all chunks associated with a specific user and section_id.
+    Returns number of rows deleted.
+    """
     conn = get_connection()
     try:
         cursor = conn.cursor()
         # This will only target 'resume_sections' namespace implicitly
-        cursor.execute("DELETE FROM chunks WHERE user_id = ? AND section_id = ?", (user_id, section_id))
-        deleted_rows = cursor.rowcount
-        conn.commit()
+        with observe(DB_LATENCY, operation="write"):
+            cursor.execute(
+                "UPDATE chunks SET deleted = 1 WHERE user_id = ? AND section_id = ? AND deleted = 0",
+                (user_id, section_id),
+            )
+            deleted_rows = cursor.rowcount
+            conn.commit()
         return deleted_rows
     except Exception as e:
         print(f"Error deleting chunks for section {section_id}: {e}")
@@ -148,18 +303,432 @@ def delete_chunks_by_section_id(user_id: str, section_id: str) -> int:
     finally:
         conn.close()
 
+def purge_deleted_chunks() -> int:
+    """Physically remove tombstoned chunks. Returns number of rows removed."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        with observe(DB_LATENCY, operation="write"):
+            cursor.execute("DELETE FROM chunks WHERE deleted = 1")
+            purged_rows = cursor.rowcount
+            conn.commit()
+        return purged_rows
+    except Exception as e:
+        print(f"Error purging deleted chunks: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def incremental_vacuum(max_pages: int) -> int:
+    """Return up to `max_pages` free pages to the OS. Returns number of pages freed."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        with observe(DB_LATENCY, operation="write"):
+            free_before = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+            if free_before == 0:
+                return 0
+            # The pragma frees one page per step; executescript steps it to completion.
+            conn.executescript(f"PRAGMA incremental_vacuum({int(max_pages)});")
+            free_after = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+        return free_before - free_after
+    except Exception as e:
+        print(f"Error running incremental vacuum: {e}")
+        return 0
+    finally:
+        conn.close()
+
+def count_chunks_by_model() -> List[Tuple[Optional[str], int]]:
+    """(embedding_model, live chunk count) pairs; NULL means the model was not recorded."""
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="read"):
+            return [
+                (row[0], row[1])
+                for row in conn.execute(
+                    "SELECT embedding_model, COUNT(*) FROM chunks WHERE deleted = 0 GROUP BY embedding_model"
+                )
+            ]
+    finally:
+        conn.close()
+
+def get_chunks_for_reembedding(model_name: str, limit: Optional[int] = None) -> List[sqlite3.Row]:
+    """
+    Live chunks that have neither a live nor a shadow embedding from `model_name`,
+    in insertion order. Returns id, user_id, index_namespace and text.
+    """
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="read"):
+            return conn.execute(
+                """
+                SELECT id, user_id, index_namespace, text FROM chunks
+                WHERE deleted = 0 AND embedding_model IS NOT ? AND shadow_model IS NOT ?
+                ORDER BY id LIMIT ?
+                """,
+                (model_name, model_name, -1 if limit is None else limit),
+            ).fetchall()
+    finally:
+        conn.close()
+
+def store_shadow_embeddings(model_name: str, embeddings: Iterable[Tuple[int, bytes]]) -> None:
+    """Write (id, embedding bytes) pairs from `model_name` to the shadow column."""
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="write"):
+            conn.executemany(
+                "UPDATE chunks SET shadow_embedding = ?, shadow_model = ? WHERE id = ?",
+                [(embedding, model_name, chunk_id) for chunk_id, embedding in embeddings],
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error storing shadow embeddings: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def get_chunks_for_model(model_name: str, user_id: Optional[str] = None,
+                         namespace: Optional[str] = None) -> List[sqlite3.Row]:
+    """
+    Live chunks with their `model_name` vector (live or shadow) as `embedding`,
+    optionally limited to one user/namespace. Used to build shadow indices.
+    """
+    query = """
+        SELECT id, chunk_id, user_id, index_namespace, section_id, source_type, source_id, text, created_at,
+               CASE WHEN embedding_model IS ? THEN embedding ELSE shadow_embedding END AS embedding
+        FROM chunks
+        WHERE deleted = 0 AND (embedding_model IS ? OR shadow_model IS ?)
+    """
+    params: list = [model_name, model_name, model_name]
+    if user_id is not None:
+        query += " AND user_id = ? AND index_namespace = ?"
+        params += [user_id, namespace]
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="read"):
+            return conn.execute(query + " ORDER BY user_id, index_namespace, id", params).fetchall()
+    finally:
+        conn.close()
+
+def _write_vector_file(conn: sqlite3.Connection, model_name: str) -> Optional[VectorFile]:
+    """
+    Write and fsync a temporary vector file holding the `model_name` vector of
+    every live chunk (shadow vectors included), or return None if there are
+    none. The dimension may differ from the current file's; the caller swaps
+    it in with `_swap_vector_file` once the database agrees.
+    """
+    rows = conn.execute(
+        """
+        SELECT id, CASE WHEN shadow_model IS ? THEN shadow_embedding ELSE embedding END AS embedding
+        FROM chunks WHERE deleted = 0 AND (embedding_model IS ? OR shadow_model IS ?)
+        ORDER BY id
+        """,
+        (model_name, model_name, model_name),
+    ).fetchall()
+    if not rows:
+        return None
+    new = VectorFile(f"{vector_file().path}.tmp")
+    new.remove()
+    try:
+        new.write(
+            [row["id"] for row in rows],
+            [vector.tobytes() for vector in load_embeddings(rows)],
+            sync=True,
+        )
+    except BaseException:
+        new.remove()
+        raise
+    return new
+
+def _swap_vector_file(new: Optional[VectorFile]) -> None:
+    """Make `new` the vector file (or drop the file if None) and fsync the directory."""
+    current = vector_file()
+    if new is None:
+        current.remove()
+        return
+    os.replace(new.path, current.path)
+    dir_fd = os.open(os.path.dirname(os.path.abspath(current.path)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+def promote_shadow_embeddings(model_name: str) -> int:
+    """
+    Swap every `model_name` shadow vector into the live column in one
+    transaction. With mmap storage the new vector file is written and fsynced
+    first, but only replaces the current one after the transaction commits; if
+    the update fails, the temporary file is deleted and both stay as they were.
+    """
+    conn = get_connection()
+    new_file = None
+    try:
+        with observe(DB_LATENCY, operation="write"):
+            if VECTOR_STORAGE == "mmap":
+                new_file = _write_vector_file(conn, model_name)
+            cursor = conn.execute(
+                """
+                UPDATE chunks SET embedding = CASE WHEN ? THEN x'' ELSE shadow_embedding END,
+                                  embedding_model = shadow_model,
+                                  shadow_embedding = NULL, shadow_model = NULL
+                WHERE shadow_model = ?
+                """,
+                (VECTOR_STORAGE == "mmap", model_name),
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error promoting shadow embeddings for {model_name}: {e}")
+        conn.rollback()
+        if new_file is not None:
+            new_file.remove()
+        raise
+    finally:
+        conn.close()
+    if VECTOR_STORAGE == "mmap":
+        _swap_vector_file(new_file)
+    return cursor.rowcount
+
+def discard_shadow_embeddings() -> None:
+    """Drop the vectors of an abandoned re-embedding run."""
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="write"):
+            conn.execute(
+                "UPDATE chunks SET shadow_embedding = NULL, shadow_model = NULL WHERE shadow_model IS NOT NULL"
+            )
+            conn.commit()
+    finally:
+        conn.close()
+
+def replace_profiles_bulk(user_ids: List[str], chunks: List[Tuple[str, str, str, str, str, bytes]],
+                          embedding_model: Optional[str]) -> None:
+    """
+    Replace the profile chunks of many users in one transaction, as
+    `/index/profile/{user_id}` does for one. `chunks` holds
+    (chunk_id, user_id, source_type, source_id, text, embedding_bytes) tuples.
+    """
+    conn = get_connection()
+    try:
+        # Durable at the transaction boundary, without an fsync per page
+        conn.execute("PRAGMA synchronous = NORMAL")
+        current_time = datetime.utcnow().isoformat()
+        with observe(DB_LATENCY, operation="write"):
+            conn.executemany(
+                "UPDATE chunks SET deleted = 1 WHERE user_id = ? AND index_namespace = 'profile' AND deleted = 0",
+                [(user_id,) for user_id in user_ids],
+            )
+            _insert_chunk_rows(
+                conn.cursor(),
+                """
+                INSERT OR REPLACE INTO chunks
+                (chunk_id, user_id, index_namespace, section_id, source_type, source_id, text, embedding, embedding_model, created_at)
+                VALUES (?, ?, 'profile', NULL, ?, ?, ?, ?, ?, ?)
+                """,
+                [(*chunk, embedding_model, current_time) for chunk in chunks],
+                5,
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO users (user_id, last_indexed_at) VALUES (?, ?)",
+                [(user_id, current_time) for user_id in user_ids],
+            )
+            conn.commit()
+    except Exception as e:
+        print(f"Error bulk indexing {len(user_ids)} profiles: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
 
-def mark_user_indexed(user_id: str) -> None:
-    """Mark a user as indexed with current timestamp."""
+def apply_profile_changes(user_id: str, removed_keys: List[Tuple[str, str]],
+                          chunks: List[Tuple[str, str, str, str, bytes]],
+                          embedding_model: Optional[str]) -> Tuple[List[int], List[int], str]:
+    """
+    Apply a field-level profile change set in one transaction: tombstone the
+    profile chunks of every (source_type, source_id) in `removed_keys`, then
+    insert `chunks` as (chunk_id, source_type, source_id, text, embedding_bytes)
+    tuples. Returns the integer ids of the tombstoned chunks, the integer ids
+    of the inserted chunks (in order) and the new rows' created_at.
+    """
     conn = get_connection()
     try:
         cursor = conn.cursor()
         current_time = datetime.utcnow().isoformat()
-        cursor.execute("INSERT OR REPLACE INTO users (user_id, last_indexed_at) VALUES (?, ?)", (user_id, current_time))
-        conn.commit()
+        removed_ids: List[int] = []
+        with observe(DB_LATENCY, operation="write"):
+            for source_type, source_id in removed_keys:
+                cursor.execute(
+                    """
+                    SELECT id FROM chunks
+                    WHERE user_id = ? AND index_namespace = 'profile'
+                      AND source_type = ? AND source_id = ? AND deleted = 0
+                    """,
+                    (user_id, source_type, source_id),
+                )
+                removed_ids.extend(row["id"] for row in cursor.fetchall())
+            cursor.executemany(
+                "UPDATE chunks SET deleted = 1 WHERE id = ?",
+                [(chunk_id,) for chunk_id in removed_ids],
+            )
+            new_ids = _insert_chunk_rows(
+                cursor,
+                """
+                INSERT OR REPLACE INTO chunks
+                (chunk_id, user_id, index_namespace, section_id, source_type, source_id, text, embedding, embedding_model, created_at)
+                VALUES (?, ?, 'profile', NULL, ?, ?, ?, ?, ?, ?)
+                """,
+                [(chunk_id, user_id, *rest, embedding_model, current_time) for chunk_id, *rest in chunks],
+                5,
+            )
+            # Also clears the recorded profile version: the profile no longer
+            # matches the last full fetch.
+            cursor.execute(
+                "INSERT OR REPLACE INTO users (user_id, last_indexed_at) VALUES (?, ?)",
+                (user_id, current_time),
+            )
+            conn.commit()
+        return removed_ids, new_ids, current_time
+    except Exception as e:
+        print(f"Error applying profile changes for user {user_id}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def list_users() -> List[str]:
+    """Every user with live chunks, sorted."""
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="read"):
+            return [
+                row[0]
+                for row in conn.execute(
+                    "SELECT DISTINCT user_id FROM chunks WHERE deleted = 0 ORDER BY user_id"
+                )
+            ]
+    finally:
+        conn.close()
+
+def get_user_chunks(user_id: str) -> List[sqlite3.Row]:
+    """All live chunks of a user, across namespaces, in id order."""
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="read"):
+            return conn.execute(
+                "SELECT * FROM chunks WHERE user_id = ? AND deleted = 0 ORDER BY id", (user_id,)
+            ).fetchall()
+    finally:
+        conn.close()
+
+def delete_all_user_chunks(user_id: str) -> int:
+    """Tombstone every chunk of a user and forget their profile version. Returns rows deleted."""
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="write"):
+            cursor = conn.execute(
+                "UPDATE chunks SET deleted = 1 WHERE user_id = ? AND deleted = 0", (user_id,)
+            )
+            conn.execute("DELETE FROM users WHERE user_id = ?", (user_id,))
+            conn.commit()
+        return cursor.rowcount
+    except Exception as e:
+        print(f"Error deleting chunks for user {user_id}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def import_user_chunks(user_id: str, chunks: List[Tuple[str, str, Optional[str], str, str, str, bytes, Optional[str], str]],
+                       profile_etag: Optional[str] = None, profile_hash: Optional[str] = None) -> int:
+    """
+    Replace all of a user's chunks with `chunks` copied from another shard, in
+    one transaction. Each chunk is (chunk_id, index_namespace, section_id,
+    source_type, source_id, text, embedding_bytes, embedding_model, created_at);
+    ids and timestamps are kept. Returns the number of chunks imported.
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        with observe(DB_LATENCY, operation="write"):
+            # Re-importing the same user (e.g. a resumed rebalance) replaces
+            # the earlier copy, chunk_id for chunk_id
+            cursor.execute("DELETE FROM chunks WHERE user_id = ?", (user_id,))
+            _insert_chunk_rows(
+                cursor,
+                """
+                INSERT OR REPLACE INTO chunks
+                (chunk_id, user_id, index_namespace, section_id, source_type, source_id, text, embedding, embedding_model, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                [(chunk_id, user_id, *rest) for chunk_id, *rest in chunks],
+                7,
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO users (user_id, last_indexed_at, profile_etag, profile_hash) VALUES (?, ?, ?, ?)",
+                (user_id, datetime.utcnow().isoformat(), profile_etag, profile_hash),
+            )
+            conn.commit()
+        return len(chunks)
+    except Exception as e:
+        print(f"Error importing chunks for user {user_id}: {e}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def snapshot_fingerprint() -> List:
+    """
+    Cheap summary of the live chunks (count, highest rowid, count per model).
+    An index snapshot is only valid for the database state it was taken from.
+    """
+    conn = get_connection()
+    try:
+        with observe(DB_LATENCY, operation="read"):
+            live, max_rowid = conn.execute(
+                "SELECT COUNT(*), COALESCE(MAX(rowid), 0) FROM chunks WHERE deleted = 0"
+            ).fetchone()
+    finally:
+        conn.close()
+    by_model = sorted(count_chunks_by_model(), key=lambda pair: (pair[0] or "", pair[1]))
+    return [live, max_rowid, [list(pair) for pair in by_model]]
+
+
+def mark_user_indexed(user_id: str, profile_etag: Optional[str] = None,
+                      profile_hash: Optional[str] = None) -> None:
+    """
+    Mark a user as indexed with current timestamp, recording the version of
+    the profile that was indexed (if known).
+    """
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        current_time = datetime.utcnow().isoformat()
+        with observe(DB_LATENCY, operation="write"):
+            cursor.execute(
+                "INSERT OR REPLACE INTO users (user_id, last_indexed_at, profile_etag, profile_hash) VALUES (?, ?, ?, ?)",
+                (user_id, current_time, profile_etag, profile_hash),
+            )
+            conn.commit()
     except Exception as e:
         print(f"Error marking user {user_id} as indexed: {e}")
         conn.rollback()
         raise
     finally:
-        conn.close()
\ No newline at end of file
+        conn.close()
+
+def get_profile_version(user_id: str) -> Optional[sqlite3.Row]:
+    """The profile_etag and profile_hash recorded when the user was last indexed, if any."""
+    conn = get_connection()
+    try:
+        cursor = conn.cursor()
+        with observe(DB_LATENCY, operation="read"):
+            cursor.execute(
+                "SELECT profile_etag, profile_hash FROM users WHERE user_id = ?", (user_id,)
+            )
+            return cursor.fetchone()
+    except Exception as e:
+        print(f"Error fetching profile version for user {user_id}: {e}")
+        return None
+    finally:
+        conn.close()
@@ -1,59 +1,245 @@
 import faiss
+import os
+import pickle
+import uuid
 import numpy as np
-from typing import Dict, Tuple, List, Optional
+from dataclasses import dataclass, field
+from itertools import groupby
+from typing import Any, Dict, Tuple, List, Optional, Iterable, Iterator, Mapping, Set
 import sqlite3
 
-from .db import get_user_chunks_by_namespace
+from .db import get_user_chunks_by_namespace, load_embeddings
+from .metadata_store import ChunkMetadataStore
+from .metrics import HYDRATION_LATENCY, INDEX_BUILD_LATENCY, INDEX_SEARCH_LATENCY, observe
+from .model import get_embedding_dimension
+
+# Optional reduced-dimension search tier. For Matryoshka-trained models the
+# leading components of a vector are a usable embedding on their own, so a
+# first pass over truncated, renormalized vectors followed by exact rescoring
+# of the best candidates at full dimension approximates a full search at a
+# fraction of the cost. 0 disables the tier.
+SEARCH_REDUCED_DIM = int(os.getenv("SEARCH_REDUCED_DIM", "0"))
+# Candidates rescored at full dimension, as a multiple of the requested k
+SEARCH_RERANK_FACTOR = int(os.getenv("SEARCH_RERANK_FACTOR", "4"))
+# Smaller namespaces are cheap enough to always search at full dimension
+SEARCH_REDUCED_MIN_VECTORS = int(os.getenv("SEARCH_REDUCED_MIN_VECTORS", "1000"))
+
+
+@dataclass
+class NamespaceIndex:
+    """
+    A user/namespace FAISS index plus the chunk metadata for each of its rows.
+    FAISS labels rows by position; `metadata.ids` maps each position to the
+    chunk's integer id. `tombstones` holds rows that were deleted since the
+    last build; they stay in the index, are skipped at search time, and go
+    away on the next rebuild.
+    """
+
+    index: faiss.IndexFlatIP
+    metadata: ChunkMetadataStore
+    reduced: Optional[faiss.IndexFlatIP] = None
+    tombstones: Set[int] = field(default_factory=set)
+
+    def vector_bytes(self) -> int:
+        dims = self.index.d + (self.reduced.d if self.reduced is not None else 0)
+        return self.index.ntotal * dims * np.dtype(np.float32).itemsize
+
+    def live_count(self) -> int:
+        return self.index.ntotal - len(self.tombstones)
+
+    def tombstone_ratio(self) -> float:
+        return len(self.tombstones) / self.index.ntotal if self.index.ntotal else 0.0
+
 
 # Global dictionary to store FAISS indices per user and namespace
-# Structure: user_id -> namespace -> (faiss_index, id_to_chunk_id_map)
-user_indices: Dict[str, Dict[str, Tuple[faiss.IndexFlatIP, Dict[int, str]]]] = {}
+# Structure: user_id -> namespace -> NamespaceIndex
+user_indices: Dict[str, Dict[str, NamespaceIndex]] = {}
 
-def build_index_from_db(all_rows: List[sqlite3.Row]) -> None:
-    """Build FAISS indices from all chunks in database, respecting namespaces."""
-    global user_indices
-    user_indices.clear()
-    
-    # Group chunks by user_id and then by namespace
+# Bumped on every change to a user/namespace index, so long-running work
+# (e.g. a re-embedding run) can tell which indices changed underneath it.
+_generations: Dict[Tuple[str, str], int] = {}
+# Generations restart from zero with the process, so versions handed to
+# clients are prefixed with a per-process epoch to stay unique across restarts.
+_EPOCH = uuid.uuid4().hex[:12]
+
+def _bump(user_id: str, namespace: str) -> None:
+    key = (user_id, namespace)
+    _generations[key] = _generations.get(key, 0) + 1
+
+def generation_snapshot() -> Dict[Tuple[str, str], int]:
+    """Current generation of every index that has ever existed."""
+    return dict(_generations)
+
+def index_version(user_id: str, namespace: str) -> str:
+    """
+    Opaque version of a user/namespace index. It changes whenever the index
+    does, so search results cached under it are never stale.
+    """
+    return f"{_EPOCH}.{_generations.get((user_id, namespace), 0)}"
+
+def changed_since(snapshot: Mapping[Tuple[str, str], int]) -> Set[Tuple[str, str]]:
+    """(user_id, namespace) of every index changed after `snapshot` was taken."""
+    return {key for key, gen in _generations.items() if snapshot.get(key) != gen}
+
+def _group_rows(rows: Iterable[sqlite3.Row]) -> Dict[str, Dict[str, List[sqlite3.Row]]]:
+    """Group chunk rows by user_id and then by namespace."""
     user_namespace_chunks: Dict[str, Dict[str, List[sqlite3.Row]]] = {}
-    for row in all_rows:
+    for row in rows:
         user_id = row['user_id']
         namespace = row['index_namespace']
-        
+
         if user_id not in user_namespace_chunks:
             user_namespace_chunks[user_id] = {}
         if namespace not in user_namespace_chunks[user_id]:
             user_namespace_chunks[user_id][namespace] = []
         user_namespace_chunks[user_id][namespace].append(row)
-    
+    return user_namespace_chunks
+
+def build_index_from_db(all_rows: List[sqlite3.Row]) -> None:
+    """Build FAISS indices from all chunks in database, respecting namespaces."""
+    global user_indices
+    user_indices.clear()
+
     # Create FAISS index for each user/namespace pair
-    for user_id, namespaces in user_namespace_chunks.items():
+    for user_id, namespaces in _group_rows(all_rows).items():
         if user_id not in user_indices:
             user_indices[user_id] = {}
         for namespace, chunks in namespaces.items():
             _build_single_index(user_id, namespace, chunks)
-    
+
     print(f"Built FAISS indices for {len(user_indices)} users across namespaces.")
 
+def build_indices(rows: Iterable[sqlite3.Row]) -> Dict[str, Dict[str, NamespaceIndex]]:
+    """
+    Build indices for `rows` without touching the live `user_indices`. Safe to
+    call from a worker thread; publish the result with `replace_indices`.
+    """
+    return {
+        user_id: {namespace: make_index(user_id, namespace, chunks) for namespace, chunks in namespaces.items()}
+        for user_id, namespaces in _group_rows(rows).items()
+    }
+
+def replace_indices(new_indices: Dict[str, Dict[str, NamespaceIndex]]) -> None:
+    """Atomically (with respect to the event loop) replace every live index."""
+    for user_id, namespaces in list(user_indices.items()) + list(new_indices.items()):
+        for namespace in namespaces:
+            _bump(user_id, namespace)
+    user_indices.clear()
+    user_indices.update(new_indices)
+
+# Bumped whenever the pickled layout of NamespaceIndex changes
+SNAPSHOT_FORMAT = 3
+
+SnapshotEntry = Tuple[str, str, NamespaceIndex]
+
+def save_snapshot(path: str, fingerprint: Any, entries: Optional[Iterable[SnapshotEntry]] = None) -> None:
+    """
+    Write indices (vectors, ids, metadata and tombstones) to one file, tagged
+    with the database `fingerprint` they were built from. `entries` yields
+    (user_id, namespace, index) and defaults to every live index; each entry
+    is written as it arrives, so a generator that builds indices on demand
+    only holds one in memory. The file is a stream of pickles: only load
+    snapshots this service wrote.
+    """
+    if entries is None:
+        entries = [
+            (user_id, namespace, entry)
+            for user_id, namespaces in user_indices.items()
+            for namespace, entry in namespaces.items()
+        ]
+    users: Set[str] = set()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump({"format": SNAPSHOT_FORMAT, "fingerprint": fingerprint}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        for user_id, namespace, entry in entries:
+            record = (
+                user_id,
+                namespace,
+                faiss.serialize_index(entry.index),
+                faiss.serialize_index(entry.reduced) if entry.reduced is not None else None,
+                entry.metadata,
+                entry.tombstones,
+            )
+            pickle.dump(record, f, protocol=pickle.HIGHEST_PROTOCOL)
+            users.add(user_id)
+        pickle.dump(None, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    print(f"Wrote index snapshot for {len(users)} users to {path}")
+
+def load_snapshot(path: str, fingerprint: Any) -> bool:
+    """
+    Replace the live indices with a snapshot if it matches `fingerprint`.
+    Returns False (leaving the indices alone) if it is missing or stale.
+    """
+    if not os.path.exists(path):
+        return False
+    with open(path, "rb") as f:
+        header = pickle.load(f)
+        if (
+            not isinstance(header, dict)
+            or header.get("format") != SNAPSHOT_FORMAT
+            or header["fingerprint"] != fingerprint
+        ):
+            print(f"Index snapshot {path} does not match the database; ignoring it.")
+            return False
+        new_indices: Dict[str, Dict[str, NamespaceIndex]] = {}
+        while (record := pickle.load(f)) is not None:
+            user_id, namespace, index_bytes, reduced_bytes, metadata, tombstones = record
+            new_indices.setdefault(user_id, {})[namespace] = NamespaceIndex(
+                faiss.deserialize_index(index_bytes),
+                metadata,
+                faiss.deserialize_index(reduced_bytes) if reduced_bytes is not None else None,
+                tombstones,
+            )
+    replace_indices(new_indices)
+    print(f"Loaded index snapshot for {len(user_indices)} users from {path}")
+    return True
+
+def iter_indices(rows: Iterable[sqlite3.Row]) -> Iterator[SnapshotEntry]:
+    """
+    Build one index at a time from rows ordered by user_id and namespace
+    (e.g. `db.iter_all_chunks()`), without touching the live indices.
+    """
+    for (user_id, namespace), chunks in groupby(rows, key=lambda row: (row["user_id"], row["index_namespace"])):
+        yield user_id, namespace, make_index(user_id, namespace, list(chunks))
+
+def _truncate(vectors: np.ndarray, dim: int) -> np.ndarray:
+    """Keep the leading `dim` components of each row and renormalize to unit length."""
+    reduced = np.ascontiguousarray(vectors[:, :dim], dtype=np.float32)
+    norms = np.linalg.norm(reduced, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return reduced / norms
+
+def _new_reduced_index(dim: int) -> Optional[faiss.IndexFlatIP]:
+    """A reduced-dimension index for full dimension `dim`, if the tier is enabled."""
+    if 0 < SEARCH_REDUCED_DIM < dim:
+        return faiss.IndexFlatIP(SEARCH_REDUCED_DIM)
+    return None
+
+def make_index(user_id: str, namespace: str, chunks: List[sqlite3.Row]) -> NamespaceIndex:
+    """Build one index (vectors plus metadata) from chunk rows."""
+    with observe(INDEX_BUILD_LATENCY):
+        metadata = ChunkMetadataStore(user_id, namespace)
+        metadata.extend(chunks)
+
+        # The stored vectors define the dimension; an empty index takes the model's
+        embeddings_matrix = load_embeddings(chunks) if chunks else None
+        dim = embeddings_matrix.shape[1] if chunks else get_embedding_dimension()
+        index = faiss.IndexFlatIP(dim)
+        reduced = _new_reduced_index(dim)
+        if embeddings_matrix is not None:
+            index.add(embeddings_matrix)
+            if reduced is not None:
+                reduced.add(_truncate(embeddings_matrix, reduced.d))
+    return NamespaceIndex(index, metadata, reduced)
+
 def _build_single_index(user_id: str, namespace: str, chunks: List[sqlite3.Row]):
     """Helper to build or rebuild one specific index."""
-    dim = 384
-    index = faiss.IndexFlatIP(dim)
-    id_to_chunk_id = {}
-    embeddings = []
-    
-    for i, chunk_row in enumerate(chunks):
-        embedding = np.frombuffer(chunk_row['embedding'], dtype=np.float32)
-        embeddings.append(embedding)
-        id_to_chunk_id[i] = chunk_row['chunk_id']
-        
-    if embeddings:
-        embeddings_matrix = np.vstack(embeddings)
-        index.add(embeddings_matrix)
-    
+    entry = make_index(user_id, namespace, chunks)
     if user_id not in user_indices:
         user_indices[user_id] = {}
-    user_indices[user_id][namespace] = (index, id_to_chunk_id)
+    user_indices[user_id][namespace] = entry
+    _bump(user_id, namespace)
     print(f"Built FAISS index for user '{user_id}' namespace '{namespace}' with {len(chunks)} items.")
 
 def rebuild_index_for_user_namespace(user_id: str, namespace: str) -> None:
@@ -61,52 +247,227 @@ def rebuild_index_for_user_namespace(user_id: str, namespace: str) -> None:
     chunks = get_user_chunks_by_namespace(user_id, namespace)
     _build_single_index(user_id, namespace, chunks)
 
-def add_to_index(user_id: str, namespace: str, chunk_id: str, embedding_vector: np.ndarray) -> None:
-    """Add a new embedding vector to a user's namespaced FAISS index."""
+def add_to_index(
+    user_id: str,
+    namespace: str,
+    embedding_vector: np.ndarray,
+    metadata: Mapping[str, Any],
+) -> None:
+    """
+    Add a new embedding vector to a user's namespaced FAISS index.
+    `metadata` needs id, chunk_id, section_id, source_type, source_id, text
+    and created_at.
+    """
     global user_indices
-    
+
     if user_id not in user_indices or namespace not in user_indices[user_id]:
         # Create new index if it doesn't exist
-        dim = 384
-        index = faiss.IndexFlatIP(dim)
-        id_to_chunk_id = {}
+        dim = embedding_vector.shape[0]
         if user_id not in user_indices:
             user_indices[user_id] = {}
-        user_indices[user_id][namespace] = (index, id_to_chunk_id)
+        user_indices[user_id][namespace] = NamespaceIndex(
+            faiss.IndexFlatIP(dim),
+            ChunkMetadataStore(user_id, namespace),
+            _new_reduced_index(dim),
+        )
+
+    entry = user_indices[user_id][namespace]
+
+    vector_matrix = embedding_vector.reshape(1, -1)
+    entry.metadata.append(metadata)
+    entry.index.add(vector_matrix)
+    if entry.reduced is not None:
+        entry.reduced.add(_truncate(vector_matrix, entry.reduced.d))
+    _bump(user_id, namespace)
+
+def tombstone_section(user_id: str, namespace: str, section_id: str) -> int:
+    """
+    Tombstone every live row of `section_id` in a user's namespaced index.
+    Returns the number of rows tombstoned.
+    """
+    entry = user_indices.get(user_id, {}).get(namespace)
+    if entry is None:
+        return 0
+    codes = entry.metadata.section_codes_for([section_id])
+    if not codes:
+        return 0
+    (code,) = codes
+    positions = {
+        i for i, c in enumerate(entry.metadata.section_codes)
+        if c == code and i not in entry.tombstones
+    }
+    entry.tombstones.update(positions)
+    if positions:
+        _bump(user_id, namespace)
+    return len(positions)
+
+def tombstone_chunks(user_id: str, namespace: str, ids: Iterable[int]) -> int:
+    """
+    Tombstone the rows holding the integer chunk `ids` in a user's namespaced
+    index. Returns the number of rows tombstoned.
+    """
+    entry = user_indices.get(user_id, {}).get(namespace)
+    if entry is None:
+        return 0
+    positions = set(entry.metadata.positions_of(ids)) - entry.tombstones
+    entry.tombstones.update(positions)
+    if positions:
+        _bump(user_id, namespace)
+    return len(positions)
+
+def fragmented_indices(threshold: float) -> List[Tuple[str, str]]:
+    """(user_id, namespace) of every index whose tombstone ratio is at least `threshold`."""
+    return [
+        (user_id, namespace)
+        for user_id, namespaces in list(user_indices.items())
+        for namespace, entry in list(namespaces.items())
+        if entry.tombstones and entry.tombstone_ratio() >= threshold
+    ]
 
-    index, id_to_chunk_id = user_indices[user_id][namespace]
-    
-    new_faiss_id = index.ntotal
-    index.add(embedding_vector.reshape(1, -1))
-    id_to_chunk_id[new_faiss_id] = chunk_id
+def _search_rows(
+    entry: NamespaceIndex, namespace: str, query_vector: np.ndarray, k: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Run the FAISS search and return (scores, row positions) for one query.
+    Over-fetches by the tombstone count so that up to `k` live rows come back;
+    callers must still skip tombstoned positions.
+    """
+    actual_k = min(k + len(entry.tombstones), entry.index.ntotal)
+    query_matrix = query_vector.reshape(1, -1)
+    candidates = actual_k * SEARCH_RERANK_FACTOR
+    with observe(INDEX_SEARCH_LATENCY, namespace=namespace):
+        if (
+            entry.reduced is not None
+            and entry.index.ntotal >= SEARCH_REDUCED_MIN_VECTORS
+            and candidates < entry.index.ntotal
+        ):
+            return _two_tier_search(entry, query_matrix, actual_k, candidates)
+        scores, faiss_ids = entry.index.search(query_matrix, actual_k)
+    return scores[0], faiss_ids[0]
+
+def _two_tier_search(
+    entry: NamespaceIndex, query_matrix: np.ndarray, k: int, candidates: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Shortlist `candidates` rows on the reduced-dimension index, then rescore
+    them exactly at full dimension and keep the best `k`.
+    """
+    _, candidate_ids = entry.reduced.search(_truncate(query_matrix, entry.reduced.d), candidates)
+    candidate_ids = candidate_ids[0][candidate_ids[0] >= 0]
+    full_vectors = entry.index.reconstruct_batch(candidate_ids)
+    scores = full_vectors @ query_matrix[0]
+    order = np.argsort(-scores)[:k]
+    return scores[order], candidate_ids[order]
 
 def search(user_id: str, namespace: str, query_vector: np.ndarray, top_k: int) -> Tuple[List[str], List[float]]:
     """Search for similar embeddings in a user's namespaced FAISS index."""
     global user_indices
-    
+
     if user_id not in user_indices or namespace not in user_indices[user_id]:
         return [], []
-    
-    index, id_to_chunk_id = user_indices[user_id][namespace]
-    
-    if index.ntotal == 0:
+
+    entry = user_indices[user_id][namespace]
+
+    if entry.live_count() == 0:
         return [], []
-    
-    actual_k = min(top_k, index.ntotal)
-    query_matrix = query_vector.reshape(1, -1)
-    scores, faiss_ids = index.search(query_matrix, actual_k)
-    
-    chunk_ids = [id_to_chunk_id[i] for i in faiss_ids[0] if i in id_to_chunk_id]
-    similarity_scores = [float(s) for s in scores[0]]
-    
+
+    scores, faiss_ids = _search_rows(entry, namespace, query_vector, top_k)
+
+    chunk_ids = []
+    similarity_scores = []
+    for score, i in zip(scores, faiss_ids):
+        if i < 0 or i in entry.tombstones:
+            continue
+        chunk_ids.append(entry.metadata.chunk_id(i))
+        similarity_scores.append(float(score))
+        if len(chunk_ids) == top_k:
+            break
+
     return chunk_ids, similarity_scores
 
+def search_chunks(
+    user_id: str,
+    namespace: str,
+    query_vector: np.ndarray,
+    top_k: int,
+    section_ids: Optional[Iterable[str]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Search a user's namespaced index and hydrate hits from the in-memory
+    metadata store. Returns chunk dicts (chunks table columns plus `score`)
+    ordered by descending score. If `section_ids` is given, only chunks from
+    those sections are returned.
+    """
+    entry = user_indices.get(user_id, {}).get(namespace)
+    if entry is None or entry.live_count() == 0:
+        return []
+
+    allowed_codes = None
+    k = top_k
+    if section_ids is not None:
+        allowed_codes = entry.metadata.section_codes_for(section_ids)
+        if not allowed_codes:
+            return []
+        # Per-user indices are small; search them fully so the filter
+        # cannot starve the result list.
+        k = entry.index.ntotal
+
+    scores, positions = _search_rows(entry, namespace, query_vector, k)
+
+    results = []
+    with observe(HYDRATION_LATENCY, namespace=namespace):
+        for score, position in zip(scores, positions):
+            if position < 0 or position >= len(entry.metadata) or position in entry.tombstones:
+                continue
+            if allowed_codes is not None and entry.metadata.section_codes[position] not in allowed_codes:
+                continue
+            chunk = entry.metadata.get(position)
+            chunk["score"] = float(score)
+            results.append(chunk)
+            if len(results) == top_k:
+                break
+    return results
+
 def delete_user_index(user_id: str, namespace: Optional[str] = None):
     """Deletes an index. If namespace is given, deletes only that sub-index."""
     if user_id in user_indices:
         if namespace and namespace in user_indices[user_id]:
             del user_indices[user_id][namespace]
+            _bump(user_id, namespace)
             print(f"Deleted FAISS index for user '{user_id}' namespace '{namespace}'.")
         elif not namespace:
+            for user_namespace in user_indices[user_id]:
+                _bump(user_id, user_namespace)
             del user_indices[user_id]
-            print(f"Deleted all FAISS indices for user '{user_id}'.")
\ No newline at end of file
+            print(f"Deleted all FAISS indices for user '{user_id}'.")
+
+def user_index_stats(user_id: str) -> Dict[str, Dict[str, int]]:
+    """Per-namespace vector count and memory cost for one user's indices."""
+    stats = {}
+    for namespace, entry in list(user_indices.get(user_id, {}).items()):
+        stats[namespace] = {
+            "num_vectors": entry.index.ntotal,
+            "num_tombstoned": len(entry.tombstones),
+            "vector_bytes": entry.vector_bytes(),
+            "metadata_bytes": entry.metadata.nbytes(),
+        }
+    return stats
+
+def index_stats() -> Tuple[int, int, int, int, int]:
+    """
+    Returns (resident index count, total vectors, tombstoned vectors,
+    vector bytes, metadata bytes).
+    """
+    num_indices = 0
+    num_vectors = 0
+    num_tombstoned = 0
+    vector_bytes = 0
+    metadata_bytes = 0
+    for namespaces in list(user_indices.values()):
+        for entry in list(namespaces.values()):
+            num_indices += 1
+            num_vectors += entry.index.ntotal
+            num_tombstoned += len(entry.tombstones)
+            vector_bytes += entry.vector_bytes()
+            metadata_bytes += entry.metadata.nbytes()
+    return num_indices, num_vectors, num_tombstoned, vector_bytes, metadata_bytes
@@ -0,0 +1,174 @@
+"""
+Priority-isolated execution lanes for request handling.
+
+Latency-sensitive work (`/retrieve`, `/embed`) runs in the interactive lane;
+indexing runs in the bulk lane. Each lane has its own concurrency limit and
+a bounded queue, and a full queue turns new work away with a 503 instead of
+letting it pile up behind the event loop.
+
+The bulk lane always yields to the interactive one: a bulk request only
+starts, and only resumes between encode batches, once no interactive work is
+queued or running (or after waiting `LANE_BULK_MAX_DEFER_S`, so a constant
+stream of queries cannot starve indexing entirely). Bulk encoding runs on
+the lane's own small thread pool, off the event loop, so a profile import
+never blocks a query for the length of a whole encode. Query text is
+encoded on the interactive lane's own threads for the same reason: one
+query's encode must not stall every other request on the loop. Index and SQLite
+mutations stay on the event loop, which keeps them atomic with respect to
+search.
+"""
+
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from fastapi import HTTPException
+
+from .metrics import LANE_ACTIVE, LANE_QUEUE_DEPTH, LANE_WAIT_LATENCY, observe
+
+LANE_INTERACTIVE_CONCURRENCY = int(os.getenv("LANE_INTERACTIVE_CONCURRENCY", "64"))
+LANE_INTERACTIVE_QUEUE = int(os.getenv("LANE_INTERACTIVE_QUEUE", "256"))
+# Threads encoding query text off the event loop
+LANE_INTERACTIVE_THREADS = int(os.getenv("LANE_INTERACTIVE_THREADS", "4"))
+LANE_BULK_CONCURRENCY = int(os.getenv("LANE_BULK_CONCURRENCY", "2"))
+LANE_BULK_QUEUE = int(os.getenv("LANE_BULK_QUEUE", "64"))
+# Threads encoding bulk work off the event loop
+LANE_BULK_THREADS = int(os.getenv("LANE_BULK_THREADS", "1"))
+# Longest a bulk request defers to interactive work before running anyway
+LANE_BULK_MAX_DEFER_S = float(os.getenv("LANE_BULK_MAX_DEFER_S", "0.5"))
+
+
+class Lane:
+    """A concurrency-limited, bounded queue of requests of one priority."""
+
+    def __init__(
+        self,
+        name: str,
+        concurrency: int,
+        max_queue: int,
+        threads: int = 0,
+        yields_to: Optional["Lane"] = None,
+    ):
+        self.name = name
+        self.concurrency = concurrency
+        self.max_queue = max_queue
+        self.yields_to = yields_to
+        self.queued = 0
+        self.active = 0
+        self._executor = (
+            ThreadPoolExecutor(threads, thread_name_prefix=f"lane-{name}") if threads else None
+        )
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._idle: Optional[asyncio.Event] = None
+
+    def _bind(self) -> None:
+        # asyncio primitives belong to one event loop; recreate them if the
+        # app is restarted on a new loop (e.g. between test clients).
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._idle = asyncio.Event()
+            self._idle.set()
+            self.queued = self.active = 0
+            self._report()
+
+    def _report(self) -> None:
+        LANE_QUEUE_DEPTH.labels(lane=self.name).set(self.queued)
+        LANE_ACTIVE.labels(lane=self.name).set(self.active)
+        if self.queued or self.active:
+            self._idle.clear()
+        else:
+            self._idle.set()
+
+    async def defer(self) -> None:
+        """Wait for higher-priority lanes to drain, up to `LANE_BULK_MAX_DEFER_S`."""
+        if self.yields_to is None:
+            return
+        other = self.yields_to
+        other._bind()
+        if other._idle.is_set():
+            return
+        try:
+            await asyncio.wait_for(other._idle.wait(), LANE_BULK_MAX_DEFER_S)
+        except asyncio.TimeoutError:
+            pass
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the lane's slots for the enclosed block."""
+        self._bind()
+        if self.queued >= self.max_queue:
+            raise HTTPException(
+                status_code=503,
+                detail=f"The {self.name} lane is full; retry shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.queued += 1
+        self._report()
+        try:
+            with observe(LANE_WAIT_LATENCY, lane=self.name):
+                await self.defer()
+                await self._slots.acquire()
+        finally:
+            self.queued -= 1
+        self.active += 1
+        self._report()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+            self._report()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """
+        Run blocking `fn(*args)` for this lane: on its thread pool if it has
+        one (after deferring to higher-priority lanes), otherwise inline.
+        """
+        if self._executor is None:
+            return fn(*args)
+        await self.defer()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self.queued,
+            "active": self.active,
+            "concurrency": self.concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+INTERACTIVE = Lane(
+    "interactive",
+    LANE_INTERACTIVE_CONCURRENCY,
+    LANE_INTERACTIVE_QUEUE,
+    threads=LANE_INTERACTIVE_THREADS,
+)
+BULK = Lane(
+    "bulk",
+    LANE_BULK_CONCURRENCY,
+    LANE_BULK_QUEUE,
+    threads=LANE_BULK_THREADS,
+    yields_to=INTERACTIVE,
+)
+
+
+async def interactive_lane() -> AsyncIterator[None]:
+    """Route dependency: run the request in the interactive lane."""
+    async with INTERACTIVE.slot():
+        yield
+
+
+async def bulk_lane() -> AsyncIterator[None]:
+    """Route dependency: run the request in the bulk lane."""
+    async with BULK.slot():
+        yield
+
+
+def lane_stats() -> Dict[str, Dict[str, int]]:
+    return {lane.name: lane.stats() for lane in (INTERACTIVE, BULK)}
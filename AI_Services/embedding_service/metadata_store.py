@@ -0,0 +1,120 @@
+import sys
+import uuid
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Set
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class ChunkMetadataStore:
+    """
+    Columnar metadata for the chunks of one user/namespace FAISS index.
+
+    Row `i` describes FAISS row `i`. Low-cardinality string columns
+    (section_id, source_type, source_id) are interned into a per-store
+    vocabulary and kept as int32 code arrays; created_at is kept as int64
+    microseconds since the epoch. The chunk's integer id is an int64 column
+    and its public UUID is packed into 16 bytes (chunk ids that are not
+    UUIDs fall back to a small side table). Only chunk text is held as
+    Python strings. This lets `/retrieve` hydrate results without touching
+    SQLite.
+    """
+
+    def __init__(self, user_id: str, namespace: str):
+        self.user_id = user_id
+        self.namespace = namespace
+        self._vocab: Dict[Optional[str], int] = {}
+        self._strings: List[Optional[str]] = []
+        self.section_codes = array("i")
+        self.source_type_codes = array("i")
+        self.source_id_codes = array("i")
+        self.created_at_us = array("q")
+        self.ids = array("q")
+        self._uuids = bytearray()
+        self._other_chunk_ids: Dict[int, str] = {}
+        self.texts: List[str] = []
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    def _intern(self, value: Optional[str]) -> int:
+        code = self._vocab.get(value)
+        if code is None:
+            code = len(self._strings)
+            self._vocab[value] = code
+            self._strings.append(value)
+        return code
+
+    def append(self, row: Mapping[str, Any]) -> None:
+        """Append one chunk; `row` needs the chunk table's metadata columns."""
+        created_at = row["created_at"]
+        if isinstance(created_at, str):
+            created_at = datetime.fromisoformat(created_at)
+        delta = created_at - _EPOCH
+        self.section_codes.append(self._intern(row["section_id"]))
+        self.source_type_codes.append(self._intern(row["source_type"]))
+        self.source_id_codes.append(self._intern(row["source_id"]))
+        self.created_at_us.append(
+            (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+        )
+        self.ids.append(row["id"])
+        chunk_id = row["chunk_id"]
+        try:
+            packed = uuid.UUID(chunk_id).bytes
+        except ValueError:
+            packed = bytes(16)
+        if str(uuid.UUID(bytes=packed)) != chunk_id:
+            self._other_chunk_ids[len(self.texts)] = chunk_id
+        self._uuids += packed
+        self.texts.append(row["text"])
+
+    def extend(self, rows: Iterable[Mapping[str, Any]]) -> None:
+        for row in rows:
+            self.append(row)
+
+    def section_codes_for(self, section_ids: Iterable[str]) -> Set[int]:
+        """Codes of the given section_ids that occur in this store."""
+        return {self._vocab[s] for s in section_ids if s in self._vocab}
+
+    def chunk_id(self, position: int) -> str:
+        """The public chunk_id of row `position`."""
+        other = self._other_chunk_ids.get(position)
+        if other is not None:
+            return other
+        return str(uuid.UUID(bytes=bytes(self._uuids[position * 16:(position + 1) * 16])))
+
+    def positions_of(self, ids: Iterable[int]) -> List[int]:
+        """Rows holding any of the integer chunk `ids`."""
+        wanted = set(ids)
+        return [i for i, chunk_id in enumerate(self.ids) if chunk_id in wanted]
+
+    def get(self, position: int) -> Dict[str, Any]:
+        """Hydrate one row into the same shape as a `chunks` table row (minus the integer id)."""
+        return {
+            "chunk_id": self.chunk_id(position),
+            "user_id": self.user_id,
+            "index_namespace": self.namespace,
+            "section_id": self._strings[self.section_codes[position]],
+            "source_type": self._strings[self.source_type_codes[position]],
+            "source_id": self._strings[self.source_id_codes[position]],
+            "text": self.texts[position],
+            "created_at": _EPOCH + timedelta(microseconds=self.created_at_us[position]),
+        }
+
+    def nbytes(self) -> int:
+        """Approximate memory held by this store, in bytes."""
+        total = sys.getsizeof(self.texts) + sum(sys.getsizeof(t) for t in self.texts)
+        total += sys.getsizeof(self._strings) + sys.getsizeof(self._vocab)
+        total += len(self._uuids) + sys.getsizeof(self._other_chunk_ids)
+        total += sum(sys.getsizeof(c) for c in self._other_chunk_ids.values())
+        total += sum(sys.getsizeof(s) for s in self._strings if s is not None)
+        for column in (
+            self.section_codes,
+            self.source_type_codes,
+            self.source_id_codes,
+            self.created_at_us,
+            self.ids,
+        ):
+            total += column.buffer_info()[1] * column.itemsize
+        return total
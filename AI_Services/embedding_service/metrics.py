@@ -0,0 +1,122 @@
+"""
+Prometheus metrics for the embedding service.
+
+Histograms cover every stage of the request path (encode, FAISS search, SQLite
+reads/writes and result hydration) so a slow endpoint can be attributed to a
+single stage. Index gauges are refreshed when `/metrics` is scraped.
+"""
+
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Most stages here are sub-millisecond, so the default Prometheus buckets
+# (which start at 5ms) would put nearly every observation in the first bucket.
+LATENCY_BUCKETS = (
+    0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+REQUEST_COUNT = Counter(
+    "embedding_requests_total",
+    "Requests handled, by endpoint, index namespace and status code",
+    ["endpoint", "namespace", "status"],
+)
+REQUEST_LATENCY = Histogram(
+    "embedding_request_seconds",
+    "End-to-end request latency, by endpoint and index namespace",
+    ["endpoint", "namespace"],
+    buckets=LATENCY_BUCKETS,
+)
+ENCODE_LATENCY = Histogram(
+    "embedding_encode_seconds",
+    "Time spent in the sentence transformer per encode call",
+    buckets=LATENCY_BUCKETS,
+)
+ENCODE_BATCH_SIZE = Histogram(
+    "embedding_encode_batch_size",
+    "Number of texts per encode call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024),
+)
+EMBED_CACHE_REQUESTS = Counter(
+    "embedding_query_cache_requests_total",
+    "Query embedding cache lookups, by result ('hit' or 'miss')",
+    ["result"],
+)
+INDEX_SEARCH_LATENCY = Histogram(
+    "embedding_index_search_seconds",
+    "FAISS search latency, by index namespace",
+    ["namespace"],
+    buckets=LATENCY_BUCKETS,
+)
+INDEX_BUILD_LATENCY = Histogram(
+    "embedding_index_build_seconds",
+    "Time to build a single user/namespace FAISS index",
+    buckets=LATENCY_BUCKETS,
+)
+DB_LATENCY = Histogram(
+    "embedding_db_seconds",
+    "SQLite latency, by operation ('read' or 'write')",
+    ["operation"],
+    buckets=LATENCY_BUCKETS,
+)
+HYDRATION_LATENCY = Histogram(
+    "embedding_hydration_seconds",
+    "Time to turn search hits into response items, by index namespace",
+    ["namespace"],
+    buckets=LATENCY_BUCKETS,
+)
+RESIDENT_INDICES = Gauge(
+    "embedding_resident_indices", "Number of user/namespace FAISS indices in memory"
+)
+RESIDENT_VECTORS = Gauge(
+    "embedding_resident_vectors", "Number of vectors held across all FAISS indices"
+)
+TOMBSTONED_VECTORS = Gauge(
+    "embedding_tombstoned_vectors",
+    "Deleted vectors still held in FAISS indices, awaiting compaction",
+)
+INDEX_COMPACTIONS = Counter(
+    "embedding_index_compactions_total",
+    "Index rebuilds triggered by the tombstone ratio threshold",
+)
+REEMBEDDED_CHUNKS = Counter(
+    "embedding_reembedded_chunks_total",
+    "Chunks re-embedded into shadow vectors by model upgrade runs",
+)
+VACUUM_PAGES_FREED = Counter(
+    "embedding_vacuum_pages_freed_total",
+    "SQLite pages returned to the OS by incremental vacuum",
+)
+LANE_QUEUE_DEPTH = Gauge(
+    "embedding_lane_queue_depth", "Requests waiting for a slot, by execution lane", ["lane"]
+)
+LANE_ACTIVE = Gauge(
+    "embedding_lane_active", "Requests holding a slot, by execution lane", ["lane"]
+)
+LANE_WAIT_LATENCY = Histogram(
+    "embedding_lane_wait_seconds",
+    "Time from arrival to holding a lane slot, by execution lane",
+    ["lane"],
+    buckets=LATENCY_BUCKETS,
+)
+INDEX_MEMORY_BYTES = Gauge(
+    "embedding_index_memory_bytes", "Approximate memory held by FAISS index data"
+)
+METADATA_MEMORY_BYTES = Gauge(
+    "embedding_metadata_memory_bytes",
+    "Approximate memory held by the in-memory chunk metadata stores",
+)
+
+
+@contextmanager
+def observe(histogram: Histogram, **labels: str) -> Iterator[None]:
+    """Time the enclosed block and record it on `histogram` with `labels`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        target = histogram.labels(**labels) if labels else histogram
+        target.observe(time.perf_counter() - start)
@@ -1,36 +1,82 @@
 from sentence_transformers import SentenceTransformer
+import hashlib
+import os
+import threading
+from collections import OrderedDict
 import numpy as np
-from typing import Optional
+from typing import List, Optional, Tuple
 
-# Global model instance
+from .metrics import EMBED_CACHE_REQUESTS, ENCODE_BATCH_SIZE, ENCODE_LATENCY, observe
+
+# Global model instance and the name it was loaded from
 _model: Optional[SentenceTransformer] = None
+_model_name: Optional[str] = None
+
+# Bounded LRU cache of query embeddings, keyed by a hash of the text
+EMBED_CACHE_SIZE = int(os.getenv("EMBED_CACHE_SIZE", "1024"))
+_embedding_cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+_embedding_cache_lock = threading.Lock()
+
+# Any sentence-transformers model works; index and request dimensions follow it
+DEFAULT_MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
 
-def load_model(model_name: str = "all-MiniLM-L6-v2") -> SentenceTransformer:
+def load_model(model_name: str = DEFAULT_MODEL_NAME) -> SentenceTransformer:
     """
     Load the sentence transformer model. Called once during startup.
     """
-    global _model
+    global _model, _model_name
     if _model is None:
-        print(f"Loading sentence transformer model: {model_name}")
-        _model = SentenceTransformer(model_name)
-        print(f"Model loaded successfully. Embedding dimension: {_model.get_sentence_embedding_dimension()}")
+        _model = create_model(model_name)
+        _model_name = model_name
     return _model
 
-def embed_text(text: str) -> np.ndarray:
+def create_model(model_name: str) -> SentenceTransformer:
+    """Load a model without making it the active one (used for re-embedding)."""
+    print(f"Loading sentence transformer model: {model_name}")
+    model = SentenceTransformer(model_name)
+    print(f"Model loaded successfully. Embedding dimension: {model.get_sentence_embedding_dimension()}")
+    return model
+
+def swap_model(model: SentenceTransformer, model_name: str) -> None:
+    """Make `model` the active model and drop query embeddings from the old one."""
+    global _model, _model_name
+    _model = model
+    _model_name = model_name
+    clear_embedding_cache()
+
+def get_active_model() -> Tuple[Optional[SentenceTransformer], Optional[str]]:
+    """The active model and its name, read together."""
+    return _model, _model_name
+
+def get_model_name() -> Optional[str]:
+    """Name of the active model; stored with every chunk it embeds."""
+    return _model_name
+
+def get_embedding_dimension() -> int:
+    """Dimension of the vectors produced by the loaded model."""
+    if _model is None:
+        raise RuntimeError("Model not loaded. Call load_model() first.")
+    return _model.get_sentence_embedding_dimension()
+
+def embed_text(text: str, model: Optional[SentenceTransformer] = None) -> np.ndarray:
     """
     Generate normalized embedding vector for input text.
     
     Args:
         text: Input text to embed
+        model: Model to encode with; defaults to the active model
         
     Returns:
-        Normalized 384-dimensional float32 numpy array
+        Normalized float32 numpy array of the model's dimension
     """
-    if _model is None:
+    model = model or _model
+    if model is None:
         raise RuntimeError("Model not loaded. Call load_model() first.")
     
     # Generate embedding
-    embedding = _model.encode(text, convert_to_numpy=True)
+    ENCODE_BATCH_SIZE.observe(1)
+    with observe(ENCODE_LATENCY):
+        embedding = model.encode(text, convert_to_numpy=True)
     
     # Ensure float32 type
     embedding = embedding.astype(np.float32)
@@ -40,4 +86,59 @@ def embed_text(text: str) -> np.ndarray:
     if norm > 0:
         embedding = embedding / norm
     
-    return embedding
\ No newline at end of file
+    return embedding
+
+def embed_batch(texts: List[str], model: Optional[SentenceTransformer] = None) -> np.ndarray:
+    """
+    Embed many texts in one encode call and return a (len(texts), dim) matrix
+    of normalized float32 rows. Uses the active model unless `model` is given.
+    """
+    model = model or _model
+    if model is None:
+        raise RuntimeError("Model not loaded. Call load_model() first.")
+    ENCODE_BATCH_SIZE.observe(len(texts))
+    with observe(ENCODE_LATENCY):
+        embeddings = model.encode(texts, convert_to_numpy=True)
+    embeddings = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return embeddings / norms
+
+def embed_query(text: str) -> np.ndarray:
+    """
+    Like `embed_text`, but served from a bounded LRU cache. Used for query
+    text (job descriptions) that is embedded repeatedly. The returned array
+    is shared with the cache and is read-only.
+
+    Entries are keyed by model name as well as text, and a vector is only
+    cached if its model is still the active one once it is encoded, so an
+    encode that overlaps `swap_model` never leaves an old-model vector behind.
+    """
+    model, model_name = _model, _model_name
+    key = f"{model_name}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+    with _embedding_cache_lock:
+        cached = _embedding_cache.get(key)
+        if cached is not None:
+            _embedding_cache.move_to_end(key)
+    if cached is not None:
+        EMBED_CACHE_REQUESTS.labels(result="hit").inc()
+        return cached
+
+    EMBED_CACHE_REQUESTS.labels(result="miss").inc()
+    embedding = embed_text(text, model)
+    embedding.setflags(write=False)
+    if EMBED_CACHE_SIZE > 0:
+        with _embedding_cache_lock:
+            if _model_name != model_name:
+                # Swapped while encoding; the cache has already been cleared
+                return embedding
+            _embedding_cache[key] = embedding
+            _embedding_cache.move_to_end(key)
+            while len(_embedding_cache) > EMBED_CACHE_SIZE:
+                _embedding_cache.popitem(last=False)
+    return embedding
+
+def clear_embedding_cache() -> None:
+    """Drop all cached query embeddings."""
+    with _embedding_cache_lock:
+        _embedding_cache.clear()
@@ -0,0 +1,118 @@
+"""
+Move users between embedding_service shards after the shard list changes.
+
+Lists the users on every shard, works out which ones the new hash ring
+places elsewhere, and copies each of them (chunks, vectors and profile
+version) with `GET /admin/users/{user_id}/export` and
+`PUT /admin/users/{user_id}`. A later `--cleanup` pass deletes the old
+copies once the router has switched to the new shard list.
+
+Writes must be frozen from step 1 until the router has restarted in step 2:
+a user is copied from a snapshot of their old shard, so a chunk or profile
+written there after the copy never reaches the new shard, and is deleted
+by the cleanup pass. Stop the callers of the indexing and admin routes for
+the duration.
+
+Usage (from the AI_Services directory):
+    # 0. Freeze writes to the embedding service
+    # 1. Copy users to their new shards (dry run without --execute)
+    python -m embedding_service.rebalance --shards http://s0:8001,http://s1:8001,http://s2:8001 --execute
+    # 2. Restart the router with the new EMBEDDING_SHARDS, then unfreeze writes
+    # 3. Delete the copies left on the old shards
+    python -m embedding_service.rebalance --shards http://s0:8001,http://s1:8001,http://s2:8001 --cleanup --execute
+"""
+
+import argparse
+import json
+import sys
+from typing import Dict, List, Optional
+
+import httpx
+
+from .sharding import HashRing, parse_shards, plan_moves
+
+
+def list_users_by_shard(client: httpx.Client, shards: List[str]) -> Dict[str, List[str]]:
+    users = {}
+    for shard in shards:
+        response = client.get(f"{shard}/admin/users")
+        response.raise_for_status()
+        users[shard] = response.json()["users"]
+    return users
+
+
+def move_user(client: httpx.Client, user_id: str, source: str, target: str) -> int:
+    """Copy one user from `source` to `target`. Returns the number of chunks copied."""
+    export = client.get(f"{source}/admin/users/{user_id}/export")
+    export.raise_for_status()
+    response = client.put(
+        f"{target}/admin/users/{user_id}",
+        content=export.content,
+        headers={"Content-Type": "application/msgpack"},
+    )
+    response.raise_for_status()
+    return response.json()["num_chunks"]
+
+
+def rebalance(
+    shards: List[str],
+    extra_sources: Optional[List[str]] = None,
+    execute: bool = False,
+    cleanup: bool = False,
+    client: Optional[httpx.Client] = None,
+) -> dict:
+    """
+    Copy (or, with `cleanup`, delete the old copies of) every user that the
+    ring over `shards` places on a different shard. `extra_sources` are
+    shards being retired that still hold users. Returns a summary.
+    """
+    client = client or httpx.Client(timeout=300)
+    ring = HashRing(shards)
+    holders = sorted(set(shards) | set(extra_sources or []))
+    users_by_shard = list_users_by_shard(client, holders)
+    moves = plan_moves(users_by_shard, ring)
+
+    summary = {"moves": {f"{s} -> {t}": len(u) for (s, t), u in moves.items()}, "users": 0, "chunks": 0}
+    if not execute:
+        return summary
+
+    for (source, target), users in moves.items():
+        for user_id in users:
+            if cleanup:
+                # Only drop the old copy once the new owner has the user
+                if user_id not in users_by_shard.get(target, []):
+                    print(f"[rebalance] {user_id} not on {target} yet; keeping it on {source}", file=sys.stderr)
+                    continue
+                response = client.delete(f"{source}/admin/users/{user_id}")
+                response.raise_for_status()
+                summary["chunks"] += response.json()["num_chunks"]
+            else:
+                summary["chunks"] += move_user(client, user_id, source, target)
+            summary["users"] += 1
+            print(f"[rebalance] {'deleted' if cleanup else 'copied'} {user_id}: {source} -> {target}", file=sys.stderr)
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__.split("\n\n")[0].strip(),
+        epilog="Freeze writes to the embedding service before copying and keep them frozen "
+        "until the router runs with the new shard list; writes in between are lost.",
+    )
+    parser.add_argument("--shards", required=True, help="New comma-separated shard list")
+    parser.add_argument("--retiring", default="", help="Shards being removed that still hold users")
+    parser.add_argument("--cleanup", action="store_true", help="Delete old copies instead of copying")
+    parser.add_argument("--execute", action="store_true", help="Apply the plan (default: dry run)")
+    args = parser.parse_args(argv)
+
+    summary = rebalance(
+        parse_shards(args.shards),
+        parse_shards(args.retiring),
+        execute=args.execute,
+        cleanup=args.cleanup,
+    )
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Zero-downtime re-embedding of the corpus with a new model.
+
+A run loads the new model next to the active one and walks the live chunks
+in throttled batches, writing each new vector to the chunk's shadow column
+while search keeps serving the old vectors. Once every chunk has a shadow
+vector, shadow indices are built off the event loop and the cutover happens
+in one synchronous step: chunks written during the run are caught up, the
+shadow vectors are promoted in a single transaction, the active model is
+swapped and the live indices are replaced. No request ever sees a mix of
+vector spaces.
+"""
+
+import asyncio
+import os
+import sqlite3
+from contextlib import suppress
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .db import (
+    count_chunks_by_model,
+    discard_shadow_embeddings,
+    get_chunks_for_model,
+    get_chunks_for_reembedding,
+    get_user_chunks_by_namespace,
+    promote_shadow_embeddings,
+    store_shadow_embeddings,
+)
+from .faiss_index import (
+    NamespaceIndex,
+    build_indices,
+    changed_since,
+    generation_snapshot,
+    make_index,
+    replace_indices,
+)
+from .lanes import BULK
+from .metrics import REEMBEDDED_CHUNKS
+from .model import create_model, embed_batch, swap_model
+
+REEMBED_BATCH_SIZE = int(os.getenv("REEMBED_BATCH_SIZE", "64"))
+# Pause between batches so a run never starves live traffic of CPU
+REEMBED_PAUSE_S = float(os.getenv("REEMBED_PAUSE_S", "0.5"))
+
+
+@dataclass
+class ReembedJob:
+    """Progress of one re-embedding run."""
+
+    model_name: str
+    batch_size: int
+    pause_s: float
+    status: str = "running"  # running | completed | failed | cancelled
+    total: int = 0
+    processed: int = 0
+    started_at: datetime = field(default_factory=datetime.utcnow)
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+
+
+_job: Optional[ReembedJob] = None
+_task: Optional[asyncio.Task] = None
+
+
+def current_job() -> Optional[ReembedJob]:
+    """The running or most recently finished run, if any."""
+    return _job
+
+
+def start_reembedding(
+    model_name: str, batch_size: Optional[int] = None, pause_s: Optional[float] = None
+) -> ReembedJob:
+    """Start a background run. Raises RuntimeError if one is already in progress."""
+    global _job, _task
+    if _task is not None and not _task.done():
+        raise RuntimeError(f"Re-embedding to '{_job.model_name}' is already in progress")
+    _job = ReembedJob(
+        model_name=model_name,
+        batch_size=batch_size or REEMBED_BATCH_SIZE,
+        pause_s=REEMBED_PAUSE_S if pause_s is None else pause_s,
+    )
+    _task = asyncio.create_task(_run(_job))
+    return _job
+
+
+async def cancel_reembedding() -> bool:
+    """Cancel the running run and drop its shadow vectors. Returns False if none was running."""
+    if _task is None or _task.done():
+        return False
+    _task.cancel()
+    with suppress(asyncio.CancelledError):
+        await _task
+    return True
+
+
+def _embed_rows(new_model, model_name: str, rows: List[sqlite3.Row]) -> None:
+    vectors = embed_batch([row["text"] for row in rows], model=new_model)
+    store_shadow_embeddings(
+        model_name, [(row["id"], vector.tobytes()) for row, vector in zip(rows, vectors)]
+    )
+
+
+async def _run(job: ReembedJob) -> None:
+    try:
+        new_model = await asyncio.to_thread(create_model, job.model_name)
+        job.total = sum(n for name, n in count_chunks_by_model() if name != job.model_name)
+        print(f"Re-embedding {job.total} chunks with model '{job.model_name}'")
+
+        while True:
+            rows = get_chunks_for_reembedding(job.model_name, job.batch_size)
+            if not rows:
+                break
+            # Bulk work: shares the bulk lane's encoder threads and yields to queries
+            await BULK.run(_embed_rows, new_model, job.model_name, rows)
+            job.processed += len(rows)
+            REEMBEDDED_CHUNKS.inc(len(rows))
+            await asyncio.sleep(job.pause_s)
+
+        snapshot = generation_snapshot()
+        shadow = await asyncio.to_thread(
+            lambda: build_indices(get_chunks_for_model(job.model_name))
+        )
+        _cutover(job, new_model, shadow, snapshot)
+        job.status = "completed"
+        print(f"Cut over to model '{job.model_name}' after re-embedding {job.processed} chunks")
+    except asyncio.CancelledError:
+        discard_shadow_embeddings()
+        job.status = "cancelled"
+        raise
+    except Exception as e:
+        print(f"Error re-embedding with model '{job.model_name}': {e}")
+        discard_shadow_embeddings()
+        job.status = "failed"
+        job.error = str(e)
+    finally:
+        job.finished_at = datetime.utcnow()
+
+
+def _cutover(
+    job: ReembedJob,
+    new_model,
+    shadow: Dict[str, Dict[str, NamespaceIndex]],
+    snapshot: Dict,
+) -> None:
+    """
+    Switch to the new model. Runs without yielding to the event loop, so no
+    request observes a half-switched state.
+    """
+    # Chunks written while the shadow indices were being built
+    leftovers = get_chunks_for_reembedding(job.model_name)
+    if leftovers:
+        _embed_rows(new_model, job.model_name, leftovers)
+        job.processed += len(leftovers)
+        REEMBEDDED_CHUNKS.inc(len(leftovers))
+    stale = changed_since(snapshot) | {
+        (row["user_id"], row["index_namespace"]) for row in leftovers
+    }
+
+    promote_shadow_embeddings(job.model_name)
+    swap_model(new_model, job.model_name)
+
+    # Indices that changed after the snapshot are rebuilt from the promoted rows
+    for user_id, namespace in stale:
+        rows = get_user_chunks_by_namespace(user_id, namespace)
+        namespaces = shadow.setdefault(user_id, {})
+        if rows:
+            namespaces[namespace] = make_index(user_id, namespace, rows)
+        else:
+            namespaces.pop(namespace, None)
+    replace_indices(shadow)
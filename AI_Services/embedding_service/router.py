@@ -0,0 +1,174 @@
+"""
+Thin shard router in front of several embedding_service instances.
+
+Every user-scoped request (`/index/...`, `/retrieve/{user_id}...`,
+`/admin/users/{user_id}...`) is proxied unchanged to the shard that owns the
+user. The user is found by resolving the request against a copy of the
+embedding service's route table (`SERVICE_ROUTES`, kept in step with app.py
+by the tests), so a path means the same route here as on the shard
+(`GET /index/profile/stats` is the stats of user "profile"), and goes
+to the shard on the consistent-hash ring built from `EMBEDDING_SHARDS` (a
+comma-separated list of shard base URLs). `/embed` is user-independent and
+spread round-robin. Re-embedding admin calls are broadcast to every shard.
+
+Run with:
+    EMBEDDING_SHARDS=http://shard-0:8001,http://shard-1:8001 \\
+        uvicorn embedding_service.router:app --port 8000
+
+After changing the shard list, move users with `embedding_service.rebalance`.
+"""
+
+import asyncio
+import itertools
+import os
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request, Response
+from starlette.routing import compile_path
+
+from .sharding import HashRing, parse_shards
+
+ROUTER_TIMEOUT_S = float(os.getenv("ROUTER_TIMEOUT_S", "60"))
+
+# The embedding service's routes, in the order it matches them. Declared
+# here rather than read from app.py so the router does not load the model.
+SERVICE_ROUTES = [
+    ("POST", "/index/profile/{user_id}"),
+    ("POST", "/index/profile/{user_id}/changes"),
+    ("POST", "/index/{user_id}/section"),
+    ("DELETE", "/index/{user_id}/section/{section_id}"),
+    ("POST", "/retrieve/{user_id}"),
+    ("GET", "/index/{user_id}/stats"),
+    ("GET", "/index/{user_id}/version"),
+    ("POST", "/embed"),
+    ("POST", "/admin/reembed"),
+    ("GET", "/admin/reembed"),
+    ("DELETE", "/admin/reembed"),
+    ("GET", "/admin/users"),
+    ("GET", "/admin/users/{user_id}/export"),
+    ("PUT", "/admin/users/{user_id}"),
+    ("DELETE", "/admin/users/{user_id}"),
+    ("GET", "/health"),
+    ("GET", "/admin/lanes"),
+    ("GET", "/metrics"),
+]
+_ROUTE_PATTERNS = [(method, compile_path(template)[0]) for method, template in SERVICE_ROUTES]
+# Response headers that describe the hop rather than the payload
+_HOP_HEADERS = {"connection", "content-length", "content-encoding", "transfer-encoding", "keep-alive"}
+
+ring: HashRing
+http_client: httpx.AsyncClient
+_round_robin: itertools.cycle
+
+
+def configure(shards: str, client: Optional[httpx.AsyncClient] = None) -> None:
+    """(Re)build the ring from a comma-separated shard list."""
+    global ring, http_client, _round_robin
+    ring = HashRing(parse_shards(shards))
+    _round_robin = itertools.cycle(ring.shards)
+    http_client = client or httpx.AsyncClient(timeout=ROUTER_TIMEOUT_S)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure(os.getenv("EMBEDDING_SHARDS", "http://localhost:8001"))
+    print(f"Routing across {len(ring.shards)} embedding shards: {', '.join(ring.shards)}")
+    yield
+    await http_client.aclose()
+
+
+app = FastAPI(title="CVisionary Embedding Shard Router", version="1.0.0", lifespan=lifespan)
+
+
+def user_for_path(method: str, path: str) -> Optional[str]:
+    """
+    The user_id of the embedding service route `method` and `path` resolve
+    to, if that route is user-scoped.
+    """
+    for route_method, pattern in _ROUTE_PATTERNS:
+        match = pattern.match(path)
+        if match and method == route_method:
+            return match.groupdict().get("user_id")
+    return None
+
+
+async def _forward(shard: str, request: Request, path: str) -> Response:
+    headers = {
+        name: value
+        for name, value in request.headers.items()
+        if name.lower() not in {"host", "content-length"}
+    }
+    try:
+        upstream = await http_client.request(
+            request.method,
+            f"{shard}{path}",
+            params=request.query_params,
+            content=await request.body(),
+            headers=headers,
+        )
+    except httpx.RequestError as e:
+        raise HTTPException(status_code=503, detail=f"Shard {shard} is unreachable: {e}")
+    response_headers = {
+        name: value
+        for name, value in upstream.headers.items()
+        if name.lower() not in _HOP_HEADERS
+    }
+    response_headers["X-Embedding-Shard"] = shard
+    return Response(
+        content=upstream.content, status_code=upstream.status_code, headers=response_headers
+    )
+
+
+async def _broadcast(method: str, path: str, json: Optional[dict] = None) -> Dict[str, dict]:
+    async def call(shard: str) -> dict:
+        try:
+            response = await http_client.request(method, f"{shard}{path}", json=json)
+            return {"status_code": response.status_code, "body": response.json()}
+        except (httpx.RequestError, ValueError) as e:
+            return {"status_code": 503, "body": {"detail": str(e)}}
+
+    results = await asyncio.gather(*(call(shard) for shard in ring.shards))
+    return dict(zip(ring.shards, results))
+
+
+@app.get("/health", tags=["Utilities"])
+async def health_check():
+    """Router health plus the health of every shard."""
+    shards = await _broadcast("GET", "/health")
+    healthy = all(result["status_code"] == 200 for result in shards.values())
+    return {
+        "status": "healthy" if healthy else "degraded",
+        "service": "embedding_router",
+        "shards": {shard: result["status_code"] == 200 for shard, result in shards.items()},
+    }
+
+
+@app.get("/admin/shards", tags=["Admin"])
+async def get_shards():
+    """The shard list the ring was built from."""
+    return {"shards": ring.shards}
+
+
+@app.api_route("/admin/reembed", methods=["GET", "POST", "DELETE"], tags=["Admin"])
+async def reembed_all_shards(request: Request):
+    """Start, inspect or cancel a re-embedding run on every shard."""
+    body = await request.json() if request.method == "POST" else None
+    return await _broadcast(request.method, "/admin/reembed", body)
+
+
+@app.post("/embed", tags=["Utilities"])
+async def embed(request: Request):
+    """User-independent; spread round-robin across shards."""
+    return await _forward(next(_round_robin), request, "/embed")
+
+
+@app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE"])
+async def route_user_request(path: str, request: Request):
+    """Proxy a user-scoped request to the shard that owns the user."""
+    path = f"/{path}"
+    user_id = user_for_path(request.method, path)
+    if user_id is None:
+        raise HTTPException(status_code=404, detail=f"No user-scoped route for {path}")
+    return await _forward(ring.shard_for(user_id), request, path)
@@ -1,7 +1,7 @@
 # schemas.py
 
-from pydantic import BaseModel, Field
-from typing import List, Optional, Literal
+from pydantic import BaseModel, Field, model_validator
+from typing import Dict, List, Optional, Literal
 from datetime import datetime
 
 # Literal type for controlled vocabulary
@@ -17,7 +17,10 @@ class EmbedRequest(BaseModel):
 class EmbedResponse(BaseModel):
     """Response model for text embedding"""
 
-    embedding: List[float] = Field(..., description="384-dimensional embedding vector")
+    embedding: List[float] = Field(..., description="Normalized embedding vector")
+    model: Optional[str] = Field(
+        None, description="Name of the model that produced the embedding"
+    )
 
 
 class IndexProfileResponse(BaseModel):
@@ -27,6 +30,49 @@ class IndexProfileResponse(BaseModel):
     num_chunks: int = Field(
         ..., description="Number of chunks processed for the profile", ge=0
     )
+    skipped: bool = Field(
+        default=False,
+        description="True if the profile was unchanged since it was last indexed and no work was done",
+    )
+
+
+# Profile text fields as keyed by chunking.extract_text_fields
+ProfileSourceType = Literal["experience", "project", "skills", "summary", "bio"]
+
+
+class ProfileFieldChange(BaseModel):
+    """One added, updated or removed profile text field"""
+
+    op: Literal["add", "update", "remove"] = Field(..., description="Kind of change")
+    source_type: ProfileSourceType = Field(..., description="Profile field the entry belongs to")
+    source_id: str = Field(
+        ..., description="Entry identifier within the field, e.g. the experience index", min_length=1
+    )
+    text: Optional[str] = Field(
+        default=None, description="New text of the entry; required for 'add' and 'update'"
+    )
+
+    @model_validator(mode="after")
+    def text_required_unless_removing(self):
+        if self.op != "remove" and not (self.text and self.text.strip()):
+            raise ValueError(f"'text' is required for '{self.op}' changes")
+        return self
+
+
+class ProfileChangeSet(BaseModel):
+    """Request model for applying field-level profile changes"""
+
+    changes: List[ProfileFieldChange] = Field(
+        ..., description="Changes to apply, in order; the last change to an entry wins", min_length=1
+    )
+
+
+class ProfileChangeSetResponse(BaseModel):
+    """Response model for applying field-level profile changes"""
+
+    status: str = Field(..., description="Status of the update")
+    num_chunks_added: int = Field(..., description="Chunks embedded for added or updated entries", ge=0)
+    num_chunks_removed: int = Field(..., description="Chunks removed for updated or removed entries", ge=0)
 
 
 class IndexSectionRequest(BaseModel):
@@ -57,12 +103,9 @@ class DeleteSectionResponse(BaseModel):
     section_id: str = Field(..., description="The unique identifier of the deleted section.")
 
 
-class RetrieveRequest(BaseModel):
-    """Request model for similarity search"""
+class RetrieveOptions(BaseModel):
+    """Search parameters shared by every /retrieve body encoding"""
 
-    query_embedding: List[float] = Field(
-        ..., description="Query embedding vector", min_length=384, max_length=384
-    )
     top_k: int = Field(
         default=5, description="Number of top results to return", ge=1, le=100
     )
@@ -76,6 +119,30 @@ class RetrieveRequest(BaseModel):
     )
 
 
+class RetrieveRequest(RetrieveOptions):
+    """
+    Request model for similarity search. Exactly one of `query_embedding` or
+    `query_text` must be provided; `query_text` is embedded server-side.
+    """
+
+    query_embedding: Optional[List[float]] = Field(
+        default=None,
+        description="Query embedding vector; must match the loaded model's dimension",
+        min_length=1,
+    )
+    query_text: Optional[str] = Field(
+        default=None,
+        description="Query text to embed server-side instead of sending an embedding.",
+        min_length=1,
+    )
+
+    @model_validator(mode="after")
+    def check_exactly_one_query(self) -> "RetrieveRequest":
+        if (self.query_embedding is None) == (self.query_text is None):
+            raise ValueError("Provide exactly one of 'query_embedding' or 'query_text'")
+        return self
+
+
 class ChunkItem(BaseModel):
     """Individual chunk item in search results"""
 
@@ -101,4 +168,66 @@ class ChunkItem(BaseModel):
 class RetrieveResponse(BaseModel):
     """Response model for similarity search"""
 
-    results: List[ChunkItem] = Field(..., description="List of similar chunks")
\ No newline at end of file
+    results: List[ChunkItem] = Field(..., description="List of similar chunks")
+    index_version: Optional[str] = Field(
+        None, description="Version of the searched index; changes whenever the index does"
+    )
+
+
+class IndexVersionResponse(BaseModel):
+    """Response model for the current version of a user's namespaced index"""
+
+    user_id: str = Field(..., description="User identifier")
+    index_namespace: str = Field(..., description="Index namespace")
+    index_version: str = Field(..., description="Opaque version; changes whenever the index does")
+
+
+class NamespaceIndexStats(BaseModel):
+    """Size and memory cost of one resident user/namespace index"""
+
+    num_vectors: int = Field(..., description="Number of vectors in the FAISS index", ge=0)
+    num_tombstoned: int = Field(
+        ..., description="Deleted vectors still resident until the next compaction", ge=0
+    )
+    vector_bytes: int = Field(..., description="Approximate bytes of FAISS vector data", ge=0)
+    metadata_bytes: int = Field(
+        ..., description="Approximate bytes of the in-memory chunk metadata store", ge=0
+    )
+
+
+class IndexStatsResponse(BaseModel):
+    """Response model for a user's resident index statistics"""
+
+    user_id: str = Field(..., description="User identifier")
+    namespaces: Dict[str, NamespaceIndexStats] = Field(
+        ..., description="Statistics keyed by index namespace"
+    )
+
+
+class ReembedRequest(BaseModel):
+    """Request model for re-embedding the corpus with a new model"""
+
+    model_name: str = Field(
+        ..., description="sentence-transformers model to switch to", min_length=1
+    )
+    batch_size: Optional[int] = Field(
+        default=None, description="Chunks encoded per batch", ge=1, le=1024
+    )
+    pause_s: Optional[float] = Field(
+        default=None, description="Pause between batches, in seconds", ge=0
+    )
+
+
+class ReembedStatus(BaseModel):
+    """Progress of a re-embedding run"""
+
+    model_name: str = Field(..., description="Model being switched to")
+    active_model: Optional[str] = Field(..., description="Model currently serving search")
+    status: str = Field(
+        ..., description="'running', 'completed', 'failed' or 'cancelled'"
+    )
+    processed: int = Field(..., description="Chunks re-embedded so far", ge=0)
+    total: int = Field(..., description="Chunks to re-embed at the start of the run", ge=0)
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
@@ -0,0 +1,61 @@
+"""
+Consistent hashing of users onto embedding_service shards.
+
+Each shard is a separate embedding_service instance with its own SQLite
+file and index set. `HashRing` places every shard at `SHARD_VNODES` points
+on a 64-bit ring and a user belongs to the first shard clockwise of the
+hash of their user_id, so adding or removing one shard only moves about
+1/N of the users. Shards are identified by their base URL; keep URLs stable
+(e.g. DNS names rather than IPs) or users will move.
+"""
+
+import bisect
+import hashlib
+import os
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "128"))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def parse_shards(value: str) -> List[str]:
+    """Split a comma-separated list of shard base URLs."""
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+class HashRing:
+    """Maps user ids onto a fixed set of shards."""
+
+    def __init__(self, shards: Iterable[str], vnodes: int = SHARD_VNODES):
+        self.shards = sorted(set(shards))
+        if not self.shards:
+            raise ValueError("A hash ring needs at least one shard")
+        points = sorted(
+            (_hash(f"{shard}#{i}"), shard) for shard in self.shards for i in range(vnodes)
+        )
+        self._points = [point for point, _ in points]
+        self._owners = [shard for _, shard in points]
+
+    def shard_for(self, user_id: str) -> str:
+        """The shard that owns `user_id`."""
+        i = bisect.bisect(self._points, _hash(user_id)) % len(self._points)
+        return self._owners[i]
+
+
+def plan_moves(
+    users_by_shard: Mapping[str, Iterable[str]], ring: HashRing
+) -> Dict[Tuple[str, str], List[str]]:
+    """
+    Users that `ring` places on a different shard than the one holding them,
+    grouped by (source shard, target shard).
+    """
+    moves: Dict[Tuple[str, str], List[str]] = {}
+    for source, users in users_by_shard.items():
+        for user_id in users:
+            target = ring.shard_for(user_id)
+            if target != source:
+                moves.setdefault((source, target), []).append(user_id)
+    return moves
@@ -1,10 +1,19 @@
 # test_app.py
 
+import json
+import threading
+
+import msgpack
 import numpy as np
 # FIX: Import `Request` from httpx
 from httpx import Response, Request, RequestError, HTTPStatusError
 from unittest.mock import AsyncMock
 
+import app as app_module
+import db
+import faiss_index
+import model
+from benchmark import StubEncoder
 from conftest import SAMPLE_EMBEDDING_384D, SAMPLE_PROFILE_DATA
 
 # Use the 384d sample embedding
@@ -32,6 +41,7 @@ def test_embed_endpoint(test_client):
     # Check if it's normalized
     norm = np.linalg.norm(data["embedding"])
     assert np.isclose(norm, 1.0)
+    assert data["model"] == model.get_model_name()
 
 
 def test_index_profile_happy_path(test_client):
@@ -64,7 +74,7 @@ def test_index_profile_happy_path(test_client):
 
     # Verify the mock was called correctly
     expected_url = f"http://localhost:5000/profile/{USER_ID}"
-    mock_http_client.get.assert_called_once_with(expected_url)
+    mock_http_client.get.assert_called_once_with(expected_url, headers={})
 
 
 def test_index_profile_reindexing_is_idempotent(test_client):
@@ -91,6 +101,44 @@ def test_index_profile_reindexing_is_idempotent(test_client):
     assert response1.json()["num_chunks"] == response2.json()["num_chunks"]
 
 
+def test_index_profile_skips_unchanged_profile(test_client):
+    """Test that an unchanged profile is detected by content hash and skipped."""
+    client, mock_http_client = test_client
+    mock_request = Request(method="GET", url=f"http://localhost:5000/profile/{USER_ID}")
+    mock_http_client.get = AsyncMock(
+        return_value=Response(status_code=200, json=SAMPLE_PROFILE_DATA, request=mock_request)
+    )
+
+    first = client.post(f"/index/profile/{USER_ID}").json()
+    second = client.post(f"/index/profile/{USER_ID}").json()
+    assert first["skipped"] is False
+    assert second["skipped"] is True
+    assert second["num_chunks"] == first["num_chunks"]
+    # Nothing was tombstoned by the skipped run
+    stats = client.get(f"/index/{USER_ID}/stats").json()["namespaces"]["profile"]
+    assert stats["num_tombstoned"] == 0
+
+    forced = client.post(f"/index/profile/{USER_ID}", params={"force": "true"}).json()
+    assert forced["skipped"] is False
+
+
+def test_index_profile_conditional_fetch_with_etag(test_client):
+    """Test that the stored ETag is sent as If-None-Match and a 304 skips indexing."""
+    client, mock_http_client = test_client
+    url = f"http://localhost:5000/profile/{USER_ID}"
+    mock_request = Request(method="GET", url=url)
+    mock_http_client.get = AsyncMock(side_effect=[
+        Response(status_code=200, json=SAMPLE_PROFILE_DATA, headers={"ETag": '"v1"'}, request=mock_request),
+        Response(status_code=304, request=mock_request),
+    ])
+
+    client.post(f"/index/profile/{USER_ID}")
+    response = client.post(f"/index/profile/{USER_ID}")
+
+    assert response.json()["skipped"] is True
+    mock_http_client.get.assert_called_with(url, headers={"If-None-Match": '"v1"'})
+
+
 def test_index_profile_backend_not_found(test_client):
     """Test handling of a 404 error from the backend profile service."""
     client, mock_http_client = test_client
@@ -208,4 +256,374 @@ def test_retrieve_invalid_embedding_dimension(test_client):
     response = client.post(
         f"/retrieve/{USER_ID}", json={"query_embedding": invalid_embedding}
     )
-    assert response.status_code == 422  # Unprocessable Entity
\ No newline at end of file
+    assert response.status_code == 422  # Unprocessable Entity
+
+def test_metrics_endpoint(test_client):
+    """Test that /metrics exposes stage histograms and index gauges."""
+    client, _ = test_client
+    client.post(
+        f"/index/{USER_ID}/section",
+        json={"section_id": SECTION_ID, "text": "A bullet point to index."},
+    )
+    client.post(
+        f"/retrieve/{USER_ID}",
+        json={"query_embedding": SAMPLE_EMBEDDING, "index_namespace": "resume_sections"},
+    )
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    body = response.text
+    assert "embedding_encode_seconds" in body
+    assert "embedding_index_search_seconds" in body
+    assert "embedding_hydration_seconds" in body
+    assert 'embedding_db_seconds_count{operation="write"}' in body
+    assert "embedding_resident_vectors 1.0" in body
+    assert (
+        'embedding_requests_total{endpoint="/retrieve/{user_id}",'
+        'namespace="resume_sections",status="200"}'
+    ) in body
+
+
+def test_index_stats_endpoint(test_client):
+    """Test that per-index memory cost is reported for a user."""
+    client, _ = test_client
+    client.post(
+        f"/index/{USER_ID}/section",
+        json={"section_id": SECTION_ID, "text": "A bullet point to index."},
+    )
+
+    response = client.get(f"/index/{USER_ID}/stats")
+    assert response.status_code == 200
+    data = response.json()
+    assert data["user_id"] == USER_ID
+    stats = data["namespaces"]["resume_sections"]
+    assert stats["num_vectors"] == 1
+    assert stats["vector_bytes"] == 384 * 4
+    assert stats["metadata_bytes"] > 0
+
+
+def test_retrieve_with_query_text(test_client):
+    """Test that /retrieve embeds query_text server-side and searches in one request."""
+    client, _ = test_client
+    section_text = "Built a distributed cache in Go."
+    client.post(
+        f"/index/{USER_ID}/section",
+        json={"section_id": SECTION_ID, "text": section_text},
+    )
+
+    response = client.post(
+        f"/retrieve/{USER_ID}",
+        json={"query_text": section_text, "index_namespace": "resume_sections"},
+    )
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert len(results) == 1
+    assert results[0]["text"] == section_text
+    # Identical text embeds to the same vector, so the match is exact
+    assert np.isclose(results[0]["score"], 1.0, atol=1e-5)
+
+    # Neither query field is a validation error
+    response = client.post(f"/retrieve/{USER_ID}", json={"top_k": 3})
+    assert response.status_code == 422
+
+
+def test_index_version_changes_with_the_index(test_client):
+    """Test that /retrieve reports the index version and that writes change it."""
+    client, _ = test_client
+    query = {"query_text": "Built a distributed cache in Go.", "index_namespace": "resume_sections"}
+    version_url = f"/index/{USER_ID}/version?index_namespace=resume_sections"
+    client.post(f"/index/{USER_ID}/section", json={"section_id": SECTION_ID, "text": query["query_text"]})
+
+    first = client.post(f"/retrieve/{USER_ID}", json=query).json()["index_version"]
+    assert client.get(version_url).json()["index_version"] == first
+    assert client.post(f"/retrieve/{USER_ID}", json=query).json()["index_version"] == first
+
+    client.delete(f"/index/{USER_ID}/section/{SECTION_ID}")
+    assert client.get(version_url).json()["index_version"] != first
+    # Other namespaces keep their own version
+    assert client.get(f"/index/{USER_ID}/version").json()["index_namespace"] == "profile"
+
+
+def test_embed_endpoint_binary_formats(test_client):
+    """Test that /embed returns packed float32 for msgpack and octet-stream clients."""
+    client, _ = test_client
+    json_response = client.post("/embed", json={"text": "Hello world"})
+    expected = np.array(json_response.json()["embedding"], dtype=np.float32)
+
+    response = client.post(
+        "/embed", json={"text": "Hello world"}, headers={"Accept": "application/msgpack"}
+    )
+    assert response.headers["content-type"] == "application/msgpack"
+    data = msgpack.unpackb(response.content, raw=False)
+    assert data["dim"] == 384
+    assert data["model"] == model.get_model_name()
+    assert np.array_equal(np.frombuffer(data["embedding"], dtype="<f4"), expected)
+
+    response = client.post(
+        "/embed", json={"text": "Hello world"}, headers={"Accept": "application/octet-stream"}
+    )
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.headers["x-embedding-dim"] == "384"
+    assert response.headers["x-embedding-model"] == model.get_model_name()
+    assert np.array_equal(np.frombuffer(response.content, dtype="<f4"), expected)
+
+
+def test_retrieve_binary_formats(test_client):
+    """Test /retrieve with msgpack and raw octet-stream request bodies."""
+    client, _ = test_client
+    client.post(
+        f"/index/{USER_ID}/section",
+        json={"section_id": "section-1", "text": "Text for section one."},
+    )
+    client.post(
+        f"/index/{USER_ID}/section",
+        json={"section_id": "section-2", "text": "Text for section two."},
+    )
+    packed = np.array(SAMPLE_EMBEDDING, dtype="<f4").tobytes()
+
+    # msgpack in, msgpack out
+    response = client.post(
+        f"/retrieve/{USER_ID}",
+        content=msgpack.packb(
+            {
+                "query_embedding": packed,
+                "index_namespace": "resume_sections",
+                "filter_by_section_ids": ["section-1"],
+            },
+            use_bin_type=True,
+        ),
+        headers={"Content-Type": "application/msgpack", "Accept": "application/msgpack"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    results = msgpack.unpackb(response.content, raw=False)["results"]
+    assert [r["section_id"] for r in results] == ["section-1"]
+
+    # Bare vector in, options in the query string, JSON out
+    response = client.post(
+        f"/retrieve/{USER_ID}?index_namespace=resume_sections&top_k=1",
+        content=packed,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == 1
+
+    # One chunk per line for streaming clients
+    response = client.post(
+        f"/retrieve/{USER_ID}?index_namespace=resume_sections&top_k=2",
+        content=packed,
+        headers={"Content-Type": "application/octet-stream", "Accept": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["x-index-version"]
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 2 and {line["user_id"] for line in lines} == {USER_ID}
+
+    # Wrong dimension is still a validation error
+    response = client.post(
+        f"/retrieve/{USER_ID}",
+        content=packed[:12],
+        headers={"Content-Type": "application/octet-stream"},
+    )
+    assert response.status_code == 422
+
+    response = client.post(
+        f"/retrieve/{USER_ID}", content=b"<xml/>", headers={"Content-Type": "application/xml"}
+    )
+    assert response.status_code == 415
+
+
+def test_section_reindex_tombstones_old_chunks(test_client):
+    """Test that re-indexing a section tombstones its old vectors instead of rebuilding."""
+    client, _ = test_client
+    client.post(
+        f"/index/{USER_ID}/section",
+        json={"section_id": SECTION_ID, "text": "Original bullet point."},
+    )
+    client.post(
+        f"/index/{USER_ID}/section",
+        json={"section_id": SECTION_ID, "text": "Rewritten bullet point."},
+    )
+
+    stats = client.get(f"/index/{USER_ID}/stats").json()["namespaces"]["resume_sections"]
+    assert stats["num_vectors"] == 2
+    assert stats["num_tombstoned"] == 1
+
+    response = client.post(
+        f"/retrieve/{USER_ID}",
+        json={"query_text": "Original bullet point.", "index_namespace": "resume_sections", "top_k": 5},
+    )
+    assert [r["text"] for r in response.json()["results"]] == ["Rewritten bullet point."]
+
+
+def test_profile_change_set_applies_only_changed_entries(test_client):
+    """Test that a change set re-embeds only the changed entries, without a backend fetch."""
+    client, mock_http_client = test_client
+    mock_http_client.get = AsyncMock()
+
+    response = client.post(
+        f"/index/profile/{USER_ID}/changes",
+        json={"changes": [
+            {"op": "add", "source_type": "experience", "source_id": "0", "text": "Led the payments team."},
+            {"op": "add", "source_type": "skills", "source_id": "0", "text": "Python, Go"},
+        ]},
+    )
+    assert response.status_code == 200
+    assert response.json()["num_chunks_added"] == 2
+
+    response = client.post(
+        f"/index/profile/{USER_ID}/changes",
+        json={"changes": [
+            {"op": "update", "source_type": "experience", "source_id": "0", "text": "Led the search team."},
+            {"op": "remove", "source_type": "skills", "source_id": "0"},
+        ]},
+    )
+    assert response.json()["num_chunks_added"] == 1
+    assert response.json()["num_chunks_removed"] == 2
+    mock_http_client.get.assert_not_called()
+
+    stats = client.get(f"/index/{USER_ID}/stats").json()["namespaces"]["profile"]
+    assert stats["num_vectors"] == 3
+    assert stats["num_tombstoned"] == 2
+
+    response = client.post(
+        f"/retrieve/{USER_ID}",
+        json={"query_text": "Led the payments team.", "index_namespace": "profile", "top_k": 5},
+    )
+    assert [r["text"] for r in response.json()["results"]] == ["Led the search team."]
+
+
+def test_profile_change_set_requires_text(test_client):
+    """Test that add/update changes without text are rejected."""
+    client, _ = test_client
+    response = client.post(
+        f"/index/profile/{USER_ID}/changes",
+        json={"changes": [{"op": "update", "source_type": "summary", "source_id": "0"}]},
+    )
+    assert response.status_code == 422
+
+
+def test_user_export_import_and_delete(test_client):
+    """Test moving a user's chunks out of and back into an instance, as a rebalance does."""
+    client, _ = test_client
+    client.post(f"/index/{USER_ID}/section", json={"section_id": SECTION_ID, "text": "Shipped the search rewrite."})
+    assert client.get("/admin/users").json() == {"users": [USER_ID]}
+
+    export = client.get(f"/admin/users/{USER_ID}/export")
+    assert export.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(export.content)["chunks"][0]["text"] == "Shipped the search rewrite."
+
+    assert client.delete(f"/admin/users/{USER_ID}").json()["num_chunks"] == 1
+    assert client.get("/admin/users").json() == {"users": []}
+    assert client.get(f"/admin/users/{USER_ID}/export").status_code == 404
+
+    response = client.put(
+        f"/admin/users/{USER_ID}", content=export.content, headers={"Content-Type": "application/msgpack"}
+    )
+    assert response.json()["num_chunks"] == 1
+    response = client.post(
+        f"/retrieve/{USER_ID}",
+        json={"query_text": "Shipped the search rewrite.", "index_namespace": "resume_sections"},
+    )
+    assert [r["text"] for r in response.json()["results"]] == ["Shipped the search rewrite."]
+
+
+def test_reembed_admin_endpoints(test_client):
+    """Test the re-embedding admin endpoints' guard rails."""
+    client, _ = test_client
+    assert client.get("/admin/reembed").status_code == 404
+    assert client.delete("/admin/reembed").status_code == 404
+
+    # Re-embedding to the model that is already active is a no-op conflict
+    active = client.post("/admin/reembed", json={"model_name": "all-MiniLM-L6-v2"})
+    assert active.status_code == 409
+
+
+def test_retrieve_trusted_internal_hops_matches_validated_response(test_client, monkeypatch):
+    """Test that skipping response validation does not change the /retrieve JSON."""
+    client, _ = test_client
+    query = {"query_text": "Built a distributed cache in Go.", "index_namespace": "resume_sections"}
+    client.post(f"/index/{USER_ID}/section", json={"section_id": SECTION_ID, "text": query["query_text"]})
+
+    validated = client.post(f"/retrieve/{USER_ID}", json=query)
+    monkeypatch.setenv("TRUSTED_INTERNAL_HOPS", "true")
+    trusted = client.post(f"/retrieve/{USER_ID}", json=query)
+
+    assert trusted.status_code == 200
+    assert trusted.headers["content-type"] == "application/json"
+    assert trusted.json() == validated.json()
+
+
+def test_query_text_is_encoded_off_the_event_loop(test_client, monkeypatch):
+    """Test that /embed and /retrieve encode query text on the interactive lane's threads."""
+    client, _ = test_client
+    threads = []
+    encode = app_module.embed_query
+
+    def recording_embed_query(text):
+        threads.append(threading.current_thread().name)
+        return encode(text)
+
+    monkeypatch.setattr(app_module, "embed_query", recording_embed_query)
+
+    assert client.post("/embed", json={"text": "Python developer"}).status_code == 200
+    client.post(f"/retrieve/{USER_ID}", json={"query_text": "Python developer"})
+
+    assert len(threads) == 2
+    assert all(name.startswith("lane-interactive") for name in threads)
+
+
+def test_model_swap_during_query_encode_reencodes_before_search(test_client, monkeypatch):
+    """Test that /retrieve never searches with a query vector from a swapped-out model."""
+    client, _ = test_client
+    client.post(f"/index/{USER_ID}/section", json={"section_id": "section-1", "text": "Python developer"})
+    monkeypatch.setattr(model, "_model_name", model._model_name)
+    encode = app_module.embed_query
+    names = []
+
+    def swapping_embed_query(text):
+        names.append(model.get_model_name())
+        if len(names) == 1:
+            model._model_name = "renamed"  # a cutover lands mid-encode
+        return encode(text)
+
+    monkeypatch.setattr(app_module, "embed_query", swapping_embed_query)
+
+    response = client.post(
+        f"/retrieve/{USER_ID}",
+        json={"query_text": "Python developer", "index_namespace": "resume_sections"},
+    )
+
+    assert response.status_code == 200
+    assert names[1] == "renamed" and len(names) == 2
+
+
+def test_model_swap_during_encoding_reencodes_with_new_model(test_client, monkeypatch):
+    """Test that a re-embed cutover landing mid-encode does not store old-model vectors."""
+    client, _ = test_client
+    # Let monkeypatch restore the active model afterwards
+    monkeypatch.setattr(model, "_model", model._model)
+    monkeypatch.setattr(model, "_model_name", model._model_name)
+    encode = app_module.embed_batch
+    calls = []
+
+    def slow_embed_batch(texts, encoder=None):
+        vectors = encode(texts, encoder)
+        calls.append(vectors.shape[1])
+        if len(calls) == 1:
+            # The cutover lands while this batch is encoding
+            model.swap_model(StubEncoder(64), "new-model")
+        return vectors
+
+    monkeypatch.setattr(app_module, "embed_batch", slow_embed_batch)
+
+    response = client.post(
+        f"/index/{USER_ID}/section",
+        json={"section_id": SECTION_ID, "text": "Built a distributed cache in Go."},
+    )
+
+    assert response.status_code == 200
+    assert calls == [384, 64]
+    assert {row["embedding_model"] for row in db.get_user_chunks_by_namespace(USER_ID, "resume_sections")} == {"new-model"}
+    assert faiss_index.user_indices[USER_ID]["resume_sections"].index.d == 64
@@ -0,0 +1,44 @@
+# test_benchmark.py
+
+import benchmark
+
+
+def test_benchmark_smoke(tmp_path, monkeypatch):
+    """Run the benchmark at tiny scale and check the report shape."""
+    # run_benchmark swaps in the stub encoder and its own DB; undo that afterwards.
+    monkeypatch.setattr(benchmark.model, "_model", benchmark.model._model)
+    monkeypatch.setattr(benchmark.db, "DB_PATH", benchmark.db.DB_PATH)
+    report = benchmark.run_benchmark(
+        num_chunks=60,
+        num_users=3,
+        queries=5,
+        write_sample=10,
+        rebuild_sample=2,
+        workdir=str(tmp_path),
+    )
+
+    assert report["meta"]["params"]["chunks"] == 60
+    stages = report["stages"]
+    for name in (
+        "store_chunk",
+        "bulk_write",
+        "build_index_from_db",
+        "rebuild_index_for_user_namespace",
+        "search",
+        "retrieve_endpoint",
+    ):
+        assert name in stages
+        assert stages[name]["items"] > 0
+        assert stages[name]["peak_rss_mb"] > 0
+    assert stages["search"]["p99_ms"] >= stages["search"]["p50_ms"]
+    benchmark.faiss_index.user_indices.clear()
+
+
+def test_stub_encoder_is_deterministic():
+    """The stub encoder must map the same text to the same vector."""
+    encoder = benchmark.StubEncoder(dim=16)
+    first = encoder.encode("same text")
+    second = encoder.encode(["same text", "other text"])
+    assert first.shape == (16,)
+    assert second.shape == (2, 16)
+    assert (first == second[0]).all()
@@ -0,0 +1,67 @@
+# test_bulk_index.py
+
+import json
+import random
+
+import pytest
+
+import bulk_index
+import db
+import faiss_index
+import model
+from benchmark import StubEncoder, generate_profile
+
+
+@pytest.fixture
+def profile_dump(tmp_path, monkeypatch):
+    """A JSONL dump of four profiles (one user twice) plus one malformed line."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "bulk.db"))
+    monkeypatch.setattr(model, "_model", StubEncoder(384))
+    rng = random.Random(7)
+    lines = [
+        json.dumps({"user_id": "u1", "profile": generate_profile(rng)}),
+        json.dumps({**generate_profile(rng), "user_id": "u2"}),
+        "{not json",
+        json.dumps({"user_id": "u3", "profile": generate_profile(rng)}),
+        json.dumps({"user_id": "u1", "profile": {"summary": "Replaced summary."}}),
+    ]
+    path = tmp_path / "profiles.jsonl"
+    path.write_text("\n".join(lines) + "\n")
+    yield path
+    faiss_index.user_indices.clear()
+
+
+def test_bulk_index_checkpoint_and_snapshot(profile_dump, tmp_path):
+    """Test a backfill, a no-op resume, and loading the snapshot it wrote."""
+    checkpoint = tmp_path / "run.ckpt"
+    snapshot = tmp_path / "indices.snapshot"
+
+    state = bulk_index.run_bulk_index(
+        str(profile_dump), workers=0, slice_size=2,
+        checkpoint_path=str(checkpoint), snapshot_path=str(snapshot),
+    )
+
+    assert state["next_line"] == 5
+    assert state["errors"] == 1
+    assert json.loads(checkpoint.read_text())["next_line"] == 5
+    # u1's second profile replaced the first
+    u1_chunks = db.get_user_chunks_by_namespace("u1", "profile")
+    assert [row["text"] for row in u1_chunks] == ["Replaced summary."]
+    assert {row["user_id"] for row in db.get_all_chunks()} == {"u1", "u2", "u3"}
+
+    # Resuming a finished run does nothing
+    live_chunks = len(db.get_all_chunks())
+    resumed = bulk_index.run_bulk_index(
+        str(profile_dump), workers=0, slice_size=2, checkpoint_path=str(checkpoint)
+    )
+    assert resumed["chunks"] == state["chunks"]
+    assert len(db.get_all_chunks()) == live_chunks
+
+    # The snapshot was streamed out index by index, not built into memory
+    assert faiss_index.user_indices == {}
+
+    # The snapshot loads while it matches the database, and not after a change
+    assert faiss_index.load_snapshot(str(snapshot), db.snapshot_fingerprint())
+    assert faiss_index.user_indices["u1"]["profile"].index.ntotal == 1
+    db.delete_user_chunks("u2", "profile")
+    assert not faiss_index.load_snapshot(str(snapshot), db.snapshot_fingerprint())
@@ -0,0 +1,51 @@
+# test_compaction.py
+
+import numpy as np
+import pytest
+
+import compaction
+import db
+import faiss_index
+
+
+@pytest.fixture
+def section_index(tmp_path, monkeypatch):
+    """A temporary database with four indexed chunks across two sections."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    db.init_db()
+    faiss_index.user_indices.clear()
+    for i in range(4):
+        v = (np.random.rand(384) - 0.5).astype(np.float32)
+        db.store_chunk(f"c{i}", "u1", "resume_sections", f"s{i % 2}", "user_edited",
+                       str(i), f"text {i}", (v / np.linalg.norm(v)).tobytes())
+    faiss_index.rebuild_index_for_user_namespace("u1", "resume_sections")
+    yield
+    faiss_index.user_indices.clear()
+
+
+def test_compact_indices_rebuilds_past_threshold(section_index):
+    """Test that only indices at or above the tombstone ratio are rebuilt."""
+    db.delete_chunks_by_section_id("u1", "s0")
+    faiss_index.tombstone_section("u1", "resume_sections", "s0")
+
+    assert compaction.compact_indices(threshold=0.75) == 0
+    assert compaction.compact_indices(threshold=0.5) == 1
+
+    entry = faiss_index.user_indices["u1"]["resume_sections"]
+    assert entry.index.ntotal == 2
+    assert entry.tombstones == set()
+    assert sorted(entry.metadata.chunk_id(i) for i in range(len(entry.metadata))) == ["c1", "c3"]
+
+
+def test_vacuum_waits_for_quiet_period(section_index, monkeypatch):
+    """Test that tombstoned rows are only purged once the service is idle."""
+    db.delete_chunks_by_section_id("u1", "s0")
+    purge_calls = []
+    monkeypatch.setattr(compaction, "purge_deleted_chunks", lambda: purge_calls.append(1) or 2)
+
+    compaction.note_activity()
+    compaction.vacuum_if_quiet(quiet_period_s=60)
+    assert purge_calls == []
+
+    compaction.vacuum_if_quiet(quiet_period_s=0)
+    assert purge_calls == [1]
@@ -85,4 +85,86 @@ def test_get_user_chunks_by_namespace(isolated_db):
     assert len(profile_chunks) == 1
     assert profile_chunks[0]["chunk_id"] == "c1"
     assert len(section_chunks) == 1
-    assert section_chunks[0]["chunk_id"] == "c2"
\ No newline at end of file
+    assert section_chunks[0]["chunk_id"] == "c2"
+
+def test_deletes_are_tombstones_until_purged(isolated_db):
+    """Test that deletes only mark rows, and purging removes and vacuums them."""
+    for i in range(50):
+        db.store_chunk(f"c{i}", "u1", "resume_sections", "s1", "t", "i", "x" * 2000, b"")
+    db.store_chunk("keep", "u1", "resume_sections", "s2", "t", "i", "txt", b"")
+
+    assert db.delete_chunks_by_section_id("u1", "s1") == 50
+    # Deleting again finds nothing live
+    assert db.delete_chunks_by_section_id("u1", "s1") == 0
+    assert [r["chunk_id"] for r in db.get_all_chunks()] == ["keep"]
+
+    conn = sqlite3.connect(isolated_db)
+    assert conn.execute("SELECT COUNT(*) FROM chunks WHERE deleted = 1").fetchone()[0] == 50
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2  # INCREMENTAL
+    conn.close()
+
+    assert db.purge_deleted_chunks() == 50
+    assert db.incremental_vacuum(10_000) > 0
+    assert db.incremental_vacuum(10_000) == 0
+    assert db.get_chunk_by_id("keep") is not None
+
+def test_init_db_without_reset_keeps_and_migrates(isolated_db):
+    """Test that init_db(reset=False) keeps rows and adds missing columns."""
+    db.store_chunk("c1", "u1", "profile", None, "t", "i", "txt", b"", "model-a")
+    conn = sqlite3.connect(isolated_db)
+    conn.execute("ALTER TABLE chunks DROP COLUMN shadow_model")
+    conn.commit()
+    conn.close()
+
+    db.init_db(reset=False)
+
+    assert db.get_chunk_by_id("c1")["embedding_model"] == "model-a"
+    assert db.count_chunks_by_model() == [("model-a", 1)]
+    db.init_db(reset=True)
+    assert db.get_chunk_by_id("c1") is None
+
+
+def test_profile_version_is_recorded(isolated_db):
+    """Test that mark_user_indexed records the profile ETag and hash."""
+    assert db.get_profile_version("u1") is None
+    db.mark_user_indexed("u1", '"v1"', "abc")
+    version = db.get_profile_version("u1")
+    assert (version["profile_etag"], version["profile_hash"]) == ('"v1"', "abc")
+
+    # An incremental change set invalidates the recorded version
+    db.apply_profile_changes("u1", [("summary", "0")], [], "model-a")
+    version = db.get_profile_version("u1")
+    assert (version["profile_etag"], version["profile_hash"]) == (None, None)
+
+def test_chunks_get_ascending_integer_ids(isolated_db):
+    """Test that store_chunk returns increasing integer ids that are never reused."""
+    first, _ = db.store_chunk("c1", "u1", "profile", None, "t", "i", "a", b"")
+    second, _ = db.store_chunk("c2", "u1", "profile", None, "t", "i", "b", b"")
+    assert second > first
+    db.delete_user_chunks("u1", "profile")
+    db.purge_deleted_chunks()
+    third, _ = db.store_chunk("c3", "u1", "profile", None, "t", "i", "c", b"")
+    assert third > second
+    assert db.get_chunk_by_id("c3")["id"] == third
+
+def test_text_keyed_chunks_table_is_migrated(isolated_db):
+    """Test that a chunks table keyed by chunk_id is rebuilt with integer ids."""
+    conn = sqlite3.connect(isolated_db)
+    conn.execute("DROP TABLE chunks")
+    conn.execute("""
+        CREATE TABLE chunks (
+            chunk_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, index_namespace TEXT NOT NULL,
+            section_id TEXT, source_type TEXT NOT NULL, source_id TEXT NOT NULL,
+            text TEXT NOT NULL, embedding BLOB NOT NULL, created_at TEXT NOT NULL
+        )
+    """)
+    conn.execute("INSERT INTO chunks VALUES ('old-1', 'u1', 'profile', NULL, 't', '0', 'x', x'', '2024-01-01')")
+    conn.commit()
+    conn.close()
+
+    db.init_db(reset=False)
+
+    row = db.get_chunk_by_id("old-1")
+    assert row["id"] == 1 and row["deleted"] == 0
+    new_id, _ = db.store_chunk("new-1", "u1", "profile", None, "t", "1", "y", b"")
+    assert new_id == 2
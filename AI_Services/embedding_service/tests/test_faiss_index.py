@@ -1,12 +1,24 @@
 # test_faiss_index.py
 
+import itertools
+
 import numpy as np
 from unittest.mock import MagicMock
 import faiss_index
 
+_ids = itertools.count(1)
+
 # Mock sqlite3.Row to behave like a dictionary
 class MockRow(dict):
     def __init__(self, *args, **kwargs):
+        # Metadata columns the in-memory store reads from every row
+        kwargs.setdefault("id", next(_ids))
+        kwargs.setdefault("chunk_id", f"c{kwargs['id']}")
+        kwargs.setdefault("section_id", None)
+        kwargs.setdefault("source_type", "experience")
+        kwargs.setdefault("source_id", "0")
+        kwargs.setdefault("text", "some text")
+        kwargs.setdefault("created_at", "2024-01-01T00:00:00.000001")
         super(MockRow, self).__init__(*args, **kwargs)
         self.__dict__ = self
 
@@ -42,8 +54,9 @@ def test_build_and_search_index():
     # Assert: Build
     assert "u1" in faiss_index.user_indices
     assert "profile" in faiss_index.user_indices["u1"]
-    index, _ = faiss_index.user_indices["u1"]["profile"]
-    assert index.ntotal == 2
+    entry = faiss_index.user_indices["u1"]["profile"]
+    assert entry.index.ntotal == 2
+    assert len(entry.metadata) == 2
 
     # Act: Search with a query vector very close to vec1
     query_vec = (vec1 + (np.random.rand(384) - 0.5) * 0.01).astype(np.float32)
@@ -80,9 +93,106 @@ def test_rebuild_index(monkeypatch):
     # Assert
     mock_get_chunks.assert_called_once_with("u1", "profile")
     assert "u1" in faiss_index.user_indices
-    index, id_map = faiss_index.user_indices["u1"]["profile"]
-    assert index.ntotal == 1
-    assert id_map[0] == "c1"
+    entry = faiss_index.user_indices["u1"]["profile"]
+    assert entry.index.ntotal == 1
+    assert entry.metadata.chunk_id(0) == "c1"
+
+
+def test_search_chunks_hydrates_from_memory():
+    """Test that search_chunks returns full metadata and honours section filters."""
+    faiss_index.user_indices.clear()
+    vecs = []
+    for _ in range(3):
+        v = (np.random.rand(384) - 0.5).astype(np.float32)
+        vecs.append(v / np.linalg.norm(v))
+    mock_rows = [
+        MockRow(chunk_id=f"c{i}", user_id="u1", index_namespace="resume_sections",
+                section_id=f"s{i}", source_type="user_edited", source_id=str(i),
+                text=f"text {i}", embedding=v.tobytes())
+        for i, v in enumerate(vecs)
+    ]
+    faiss_index.build_index_from_db(mock_rows)
+
+    results = faiss_index.search_chunks("u1", "resume_sections", vecs[2], top_k=1)
+    assert len(results) == 1
+    assert results[0]["chunk_id"] == "c2"
+    assert results[0]["section_id"] == "s2"
+    assert results[0]["text"] == "text 2"
+    assert results[0]["user_id"] == "u1"
+    assert results[0]["created_at"].microsecond == 1
+
+    # The filter is applied before truncation, so a weaker match is still found
+    filtered = faiss_index.search_chunks(
+        "u1", "resume_sections", vecs[2], top_k=1, section_ids=["s0"]
+    )
+    assert [r["chunk_id"] for r in filtered] == ["c0"]
+    assert faiss_index.search_chunks("u1", "resume_sections", vecs[2], 5, section_ids=["nope"]) == []
+
+    # add_to_index keeps the metadata store aligned with the FAISS rows
+    faiss_index.add_to_index("u1", "resume_sections", vecs[0], MockRow(chunk_id="c3", section_id="s3"))
+    stats = faiss_index.user_index_stats("u1")["resume_sections"]
+    assert stats["num_vectors"] == 4
+    assert stats["vector_bytes"] == 4 * 384 * 4
+    assert stats["metadata_bytes"] > 0
+
+
+def test_tombstoned_rows_are_skipped():
+    """Test that tombstoned sections stop matching and count towards fragmentation."""
+    faiss_index.user_indices.clear()
+    vecs = []
+    for _ in range(4):
+        v = (np.random.rand(384) - 0.5).astype(np.float32)
+        vecs.append(v / np.linalg.norm(v))
+    mock_rows = [
+        MockRow(chunk_id=f"c{i}", user_id="u1", index_namespace="resume_sections",
+                section_id="s0" if i < 2 else f"s{i}", embedding=v.tobytes())
+        for i, v in enumerate(vecs)
+    ]
+    faiss_index.build_index_from_db(mock_rows)
+
+    assert faiss_index.tombstone_section("u1", "resume_sections", "s0") == 2
+    # Already-tombstoned rows and unknown sections are no-ops
+    assert faiss_index.tombstone_section("u1", "resume_sections", "s0") == 0
+    assert faiss_index.tombstone_section("u1", "resume_sections", "nope") == 0
+
+    # The best match is dead, but top_k live results still come back
+    results = faiss_index.search_chunks("u1", "resume_sections", vecs[0], top_k=2)
+    assert sorted(r["chunk_id"] for r in results) == ["c2", "c3"]
+    chunk_ids, _ = faiss_index.search("u1", "resume_sections", vecs[1], top_k=4)
+    assert sorted(chunk_ids) == ["c2", "c3"]
+
+    assert faiss_index.user_index_stats("u1")["resume_sections"]["num_tombstoned"] == 2
+    assert faiss_index.fragmented_indices(0.5) == [("u1", "resume_sections")]
+    assert faiss_index.fragmented_indices(0.75) == []
+
+
+def test_reduced_dimension_tier_rescores_at_full_dimension(monkeypatch):
+    """Test that the truncated first pass returns full-dimension scores."""
+    monkeypatch.setattr(faiss_index, "SEARCH_REDUCED_DIM", 64)
+    monkeypatch.setattr(faiss_index, "SEARCH_RERANK_FACTOR", 10)
+    monkeypatch.setattr(faiss_index, "SEARCH_REDUCED_MIN_VECTORS", 0)
+    faiss_index.user_indices.clear()
+    vecs = (np.random.rand(200, 384) - 0.5).astype(np.float32)
+    vecs /= np.linalg.norm(vecs, axis=1, keepdims=True)
+    mock_rows = [
+        MockRow(chunk_id=f"c{i}", user_id="u1", index_namespace="profile", embedding=v.tobytes())
+        for i, v in enumerate(vecs)
+    ]
+    faiss_index.build_index_from_db(mock_rows)
+
+    entry = faiss_index.user_indices["u1"]["profile"]
+    assert entry.reduced.d == 64
+    assert entry.reduced.ntotal == 200
+    assert entry.vector_bytes() == 200 * (384 + 64) * 4
+
+    chunk_ids, scores = faiss_index.search("u1", "profile", vecs[7], top_k=3)
+    assert chunk_ids[0] == "c7"
+    assert np.isclose(scores[0], 1.0, atol=1e-5)
+    assert scores == sorted(scores, reverse=True)
+
+    # Appended vectors are mirrored into the reduced index
+    faiss_index.add_to_index("u1", "profile", vecs[0], MockRow(chunk_id="c200"))
+    assert entry.reduced.ntotal == 201
 
 
 def test_delete_index():
@@ -0,0 +1,91 @@
+# test_lanes.py
+
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+import lanes
+
+
+def _lanes():
+    interactive = lanes.Lane("interactive", concurrency=4, max_queue=8)
+    bulk = lanes.Lane("bulk", concurrency=1, max_queue=1, threads=1, yields_to=interactive)
+    return interactive, bulk
+
+
+def test_bulk_work_waits_for_interactive_work():
+    """Test that bulk encoding only starts once queued interactive work has drained."""
+    interactive, bulk = _lanes()
+    order = []
+
+    async def query():
+        async with interactive.slot():
+            await asyncio.sleep(0.05)
+            order.append("query")
+
+    async def index():
+        await asyncio.sleep(0)  # let the query take its slot first
+        await bulk.run(lambda: order.append("encode"))
+
+    async def scenario():
+        await asyncio.gather(query(), index())
+
+    asyncio.run(scenario())
+    assert order == ["query", "encode"]
+
+
+def test_bulk_defer_is_bounded(monkeypatch):
+    """Test that a busy interactive lane delays bulk work by at most LANE_BULK_MAX_DEFER_S."""
+    monkeypatch.setattr(lanes, "LANE_BULK_MAX_DEFER_S", 0.01)
+    interactive, bulk = _lanes()
+
+    async def scenario():
+        done = asyncio.Event()
+        order = []
+
+        async def query():
+            async with interactive.slot():
+                await done.wait()
+
+        task = asyncio.create_task(query())
+        await asyncio.sleep(0)
+        # Runs while the query still holds its slot
+        await bulk.run(lambda: order.append(threading.current_thread().name))
+        done.set()
+        await task
+        return order
+
+    (thread_name,) = asyncio.run(scenario())
+    assert thread_name.startswith("lane-bulk")
+
+
+def test_full_queue_is_rejected():
+    """Test that a lane turns work away with a 503 once its queue is full."""
+    _, bulk = _lanes()
+
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def hold():
+            async with bulk.slot():
+                await gate.wait()
+
+        holder = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert bulk.stats()["active"] == 1
+        assert bulk.stats()["queued"] == 1
+
+        with pytest.raises(HTTPException) as exc_info:
+            async with bulk.slot():
+                pass
+        gate.set()
+        await asyncio.gather(holder, waiter)
+        return exc_info.value
+
+    error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert bulk.stats()["queued"] == 0 and bulk.stats()["active"] == 0
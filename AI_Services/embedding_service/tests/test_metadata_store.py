@@ -0,0 +1,50 @@
+# test_metadata_store.py
+
+import uuid
+from datetime import datetime
+
+from metadata_store import ChunkMetadataStore
+
+
+def test_append_and_get_round_trip():
+    """Test that rows come back unchanged and strings are interned."""
+    store = ChunkMetadataStore("u1", "profile")
+    created = datetime(2024, 5, 17, 12, 30, 45, 123456)
+    chunk_id = str(uuid.uuid4())
+    store.append({"id": 7, "chunk_id": chunk_id, "section_id": None, "source_type": "experience",
+                  "source_id": "0", "text": "first", "created_at": created.isoformat()})
+    store.append({"id": 9, "chunk_id": "legacy-id", "section_id": None, "source_type": "experience",
+                  "source_id": "1", "text": "second", "created_at": created})
+
+    assert len(store) == 2
+    row = store.get(0)
+    assert row == {
+        "chunk_id": chunk_id,
+        "user_id": "u1",
+        "index_namespace": "profile",
+        "section_id": None,
+        "source_type": "experience",
+        "source_id": "0",
+        "text": "first",
+        "created_at": created,
+    }
+    assert store.get(1)["source_id"] == "1"
+    # UUIDs are packed; other chunk ids are kept as given
+    assert store.get(1)["chunk_id"] == "legacy-id"
+    assert list(store.ids) == [7, 9]
+    assert store.positions_of([9, 10]) == [1]
+    # 'experience' and None are shared between rows
+    assert store.source_type_codes[0] == store.source_type_codes[1]
+    assert store.section_codes[0] == store.section_codes[1]
+
+
+def test_section_codes_and_nbytes():
+    """Test section filtering codes and memory accounting."""
+    store = ChunkMetadataStore("u1", "resume_sections")
+    for i in range(3):
+        store.append({"id": i, "chunk_id": str(uuid.uuid4()), "section_id": f"s{i}", "source_type": "user_edited",
+                      "source_id": "0", "text": "x" * 100, "created_at": datetime(2024, 1, 1)})
+
+    codes = store.section_codes_for(["s1", "missing"])
+    assert codes == {store.section_codes[1]}
+    assert store.nbytes() > 300
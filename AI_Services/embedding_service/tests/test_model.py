@@ -1,7 +1,7 @@
 # test_model.py
 
 import numpy as np
-from model import load_model, embed_text
+from model import load_model, embed_text, get_embedding_dimension
 
 def test_model_loading_and_embedding():
     """Test that the model loads and produces a valid, normalized embedding."""
@@ -14,6 +14,7 @@ def test_model_loading_and_embedding():
     assert isinstance(embedding, np.ndarray)
     assert embedding.dtype == np.float32
     assert embedding.shape == (384,)
+    assert get_embedding_dimension() == 384
     
     # Check for normalization
     norm = np.linalg.norm(embedding)
@@ -21,4 +22,41 @@ def test_model_loading_and_embedding():
 
     # Test singleton behavior
     model2 = load_model()
-    assert model is model2
\ No newline at end of file
+    assert model is model2
+
+def test_embed_query_is_cached():
+    """Test that repeated query text is served from the cache."""
+    from model import embed_query, clear_embedding_cache
+
+    load_model()
+    clear_embedding_cache()
+    first = embed_query("Senior Python engineer")
+    second = embed_query("Senior Python engineer")
+
+    assert first is second
+    assert not first.flags.writeable
+    assert np.allclose(first, embed_text("Senior Python engineer"))
+
+def test_embed_query_does_not_cache_across_a_model_swap(monkeypatch):
+    """Test that an encode overlapping a model swap leaves no old-model vector in the cache."""
+    import model
+    from benchmark import StubEncoder
+
+    new_model = StubEncoder(64)
+
+    class SwappingEncoder(StubEncoder):
+        def encode(self, texts, **kwargs):
+            # A re-embedding cutover lands while this encode is running
+            model.swap_model(new_model, "new")
+            return super().encode(texts, **kwargs)
+
+    monkeypatch.setattr(model, "_model", SwappingEncoder(384))
+    monkeypatch.setattr(model, "_model_name", "old")
+    model.clear_embedding_cache()
+
+    stale = model.embed_query("Senior Python engineer")
+    fresh = model.embed_query("Senior Python engineer")
+
+    assert stale.shape == (384,)
+    assert fresh.shape == (64,)
+    model.clear_embedding_cache()
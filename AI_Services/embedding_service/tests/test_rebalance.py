@@ -0,0 +1,60 @@
+# test_rebalance.py
+
+import json
+
+import httpx
+
+import rebalance
+from sharding import HashRing
+
+OLD = ["http://s0:8001", "http://s1:8001"]
+NEW = OLD + ["http://s2:8001"]
+
+
+def _fake_shards(data):
+    """httpx client over in-memory shards: {shard: {user_id: export bytes}}."""
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        shard = f"{request.url.scheme}://{request.url.host}:{request.url.port}"
+        users = data.setdefault(shard, {})
+        parts = request.url.path.strip("/").split("/")
+        if parts == ["admin", "users"]:
+            return httpx.Response(200, json={"users": sorted(users)})
+        user_id = parts[2]
+        if request.method == "GET":
+            return httpx.Response(200, content=users[user_id])
+        if request.method == "PUT":
+            users[user_id] = request.content
+            return httpx.Response(200, json={"user_id": user_id, "num_chunks": 1})
+        users.pop(user_id)
+        return httpx.Response(200, json={"user_id": user_id, "num_chunks": 1})
+
+    return httpx.Client(transport=httpx.MockTransport(handler))
+
+
+def test_rebalance_copies_then_cleans_up():
+    """Test the dry run, copy and cleanup passes after adding a shard."""
+    old_ring = HashRing(OLD)
+    data = {shard: {} for shard in NEW}
+    for i in range(60):
+        user_id = f"user-{i}"
+        data[old_ring.shard_for(user_id)][user_id] = json.dumps(user_id).encode()
+    client = _fake_shards(data)
+
+    plan = rebalance.rebalance(NEW, client=client)
+    moving = sum(plan["moves"].values())
+    assert moving > 0 and plan["users"] == 0
+    assert data["http://s2:8001"] == {}
+
+    copied = rebalance.rebalance(NEW, execute=True, client=client)
+    assert copied["users"] == moving
+    # Copies exist on both sides until cleanup
+    assert len(data["http://s2:8001"]) == moving
+    assert sum(len(users) for users in data.values()) == 60 + moving
+
+    cleaned = rebalance.rebalance(NEW, execute=True, cleanup=True, client=client)
+    assert cleaned["users"] == moving
+    new_ring = HashRing(NEW)
+    for shard, users in data.items():
+        assert all(new_ring.shard_for(user_id) == shard for user_id in users)
+    assert sum(len(users) for users in data.values()) == 60
@@ -0,0 +1,100 @@
+# test_reembed.py
+
+import asyncio
+
+import numpy as np
+import pytest
+
+import db
+import faiss_index
+import model
+import reembed
+from benchmark import StubEncoder
+
+
+@pytest.fixture
+def old_model_corpus(tmp_path, monkeypatch):
+    """Three chunks indexed with a 384d model named 'old'."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(model, "_model", StubEncoder(384))
+    monkeypatch.setattr(model, "_model_name", "old")
+    monkeypatch.setattr(reembed, "_job", None)
+    monkeypatch.setattr(reembed, "_task", None)
+    db.init_db()
+    for i in range(3):
+        text = f"chunk number {i}"
+        db.store_chunk(f"c{i}", "u1", "profile", None, "summary", str(i), text,
+                       model.embed_text(text).tobytes(), "old")
+    faiss_index.build_index_from_db(db.get_all_chunks())
+    yield
+    faiss_index.user_indices.clear()
+    model.clear_embedding_cache()
+
+
+def _run_to_completion(model_name: str) -> reembed.ReembedJob:
+    async def scenario():
+        job = reembed.start_reembedding(model_name, batch_size=2, pause_s=0)
+        await reembed._task
+        return job
+
+    return asyncio.run(scenario())
+
+
+def test_reembedding_cuts_over_to_new_model(old_model_corpus, monkeypatch):
+    """Test a full run: shadow vectors, promotion, model swap and index swap."""
+    monkeypatch.setattr(reembed, "create_model", lambda name: StubEncoder(64))
+
+    job = _run_to_completion("new")
+
+    assert job.status == "completed"
+    assert (job.total, job.processed) == (3, 3)
+    assert model.get_model_name() == "new"
+    assert model.get_embedding_dimension() == 64
+    assert db.count_chunks_by_model() == [("new", 3)]
+
+    entry = faiss_index.user_indices["u1"]["profile"]
+    assert entry.index.d == 64
+    chunk_ids, scores = faiss_index.search("u1", "profile", model.embed_text("chunk number 1"), 1)
+    assert chunk_ids == ["c1"]
+    assert np.isclose(scores[0], 1.0, atol=1e-5)
+
+
+def test_cutover_catches_up_concurrent_writes(old_model_corpus):
+    """Test that chunks written after the shadow build are embedded and indexed at cutover."""
+    new_model = StubEncoder(64)
+    job = reembed.ReembedJob(model_name="new", batch_size=10, pause_s=0)
+    reembed._embed_rows(new_model, "new", db.get_chunks_for_reembedding("new"))
+    snapshot = faiss_index.generation_snapshot()
+    shadow = faiss_index.build_indices(db.get_chunks_for_model("new"))
+
+    # A section edit lands between the shadow build and the cutover
+    vector = model.embed_text("late edit")
+    row_id, created_at = db.store_chunk("late", "u1", "profile", None, "summary", "9", "late edit",
+                                vector.tobytes(), "old")
+    faiss_index.add_to_index("u1", "profile", vector, {
+        "id": row_id, "chunk_id": "late", "section_id": None, "source_type": "summary", "source_id": "9",
+        "text": "late edit", "created_at": created_at,
+    })
+
+    reembed._cutover(job, new_model, shadow, snapshot)
+
+    entry = faiss_index.user_indices["u1"]["profile"]
+    assert entry.index.d == 64
+    assert entry.index.ntotal == 4
+    chunk_ids, _ = faiss_index.search("u1", "profile", model.embed_text("late edit"), 1)
+    assert chunk_ids == ["late"]
+
+
+def test_failed_run_keeps_current_model(old_model_corpus, monkeypatch):
+    """Test that a run that cannot load its model leaves search untouched."""
+    def broken(name):
+        raise OSError(f"no such model: {name}")
+
+    monkeypatch.setattr(reembed, "create_model", broken)
+
+    job = _run_to_completion("missing")
+
+    assert job.status == "failed"
+    assert "no such model" in job.error
+    assert model.get_model_name() == "old"
+    assert faiss_index.user_indices["u1"]["profile"].index.d == 384
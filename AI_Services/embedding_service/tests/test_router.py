@@ -0,0 +1,87 @@
+# test_router.py
+
+import httpx
+import pytest
+from fastapi.routing import APIRoute
+from fastapi.testclient import TestClient
+
+import router
+
+SHARDS = "http://s0:8001,http://s1:8001"
+
+
+@pytest.fixture
+def routed():
+    """The router over two fake shards that echo back the path they received."""
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        shard = f"{request.url.scheme}://{request.url.host}:{request.url.port}"
+        seen.append((shard, request.method, request.url.path, request.content))
+        return httpx.Response(200, json={"shard": shard, "path": request.url.path})
+
+    router.configure(SHARDS, httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    # No `with`: the lifespan would rebuild the ring from the environment
+    return TestClient(router.app), seen
+
+
+def test_user_requests_go_to_the_owning_shard(routed):
+    """Test that every user-scoped route is proxied to the ring's shard for that user."""
+    client, seen = routed
+    for user_id in ["alice", "bob", "carol", "dave"]:
+        owner = router.ring.shard_for(user_id)
+        for method, path in [
+            ("POST", f"/index/profile/{user_id}"),
+            ("POST", f"/index/{user_id}/section"),
+            ("GET", f"/index/{user_id}/stats"),
+            ("POST", f"/retrieve/{user_id}"),
+            ("DELETE", f"/admin/users/{user_id}"),
+        ]:
+            response = client.request(method, path, content=b"body")
+            assert response.status_code == 200
+            assert response.headers["x-embedding-shard"] == owner
+            assert seen[-1] == (owner, method, path, b"body")
+
+
+def test_user_named_like_a_route_segment(routed):
+    """Test that a path resolves to the same route, and user, as on the shard."""
+    client, seen = routed
+    for method, path, user_id in [
+        ("GET", "/index/profile/stats", "profile"),
+        ("GET", "/index/profile/version", "profile"),
+        ("DELETE", "/index/profile/section/s1", "profile"),
+        # The service itself resolves this one as profile indexing for "section"
+        ("POST", "/index/profile/section", "section"),
+        ("POST", "/index/profile/profile/changes", "profile"),
+    ]:
+        response = client.request(method, path, content=b"body")
+        assert response.status_code == 200
+        assert seen[-1][0] == router.ring.shard_for(user_id), path
+
+    assert client.put("/index/alice/stats").status_code == 404
+
+
+def test_unscoped_routes(routed):
+    """Test /embed round-robin, reembed broadcast and unknown paths."""
+    client, seen = routed
+    client.post("/embed", json={"text": "a"})
+    client.post("/embed", json={"text": "b"})
+    assert {shard for shard, *_ in seen} == set(router.ring.shards)
+
+    response = client.post("/admin/reembed", json={"model_name": "m"})
+    assert set(response.json()) == set(router.ring.shards)
+
+    assert client.get("/nope").status_code == 404
+    assert client.get("/health").json()["status"] == "healthy"
+
+
+def test_route_table_matches_the_service():
+    """Test that the router's copy of the route table is the embedding service's, in order."""
+    from app import app as service_app
+
+    routes = [
+        (method, route.path)
+        for route in service_app.routes if isinstance(route, APIRoute)
+        for method in sorted(route.methods)
+    ]
+    assert routes == router.SERVICE_ROUTES
@@ -0,0 +1,39 @@
+# test_sharding.py
+
+from collections import Counter
+
+import pytest
+
+from sharding import HashRing, parse_shards, plan_moves
+
+SHARDS = ["http://s0:8001", "http://s1:8001", "http://s2:8001"]
+USERS = [f"user-{i}" for i in range(3000)]
+
+
+def test_ring_is_deterministic_and_balanced():
+    """Test that placement is stable and roughly even across shards."""
+    ring = HashRing(SHARDS)
+    assert ring.shard_for("user-42") == HashRing(reversed(SHARDS)).shard_for("user-42")
+    counts = Counter(ring.shard_for(u) for u in USERS)
+    assert set(counts) == set(SHARDS)
+    assert min(counts.values()) > len(USERS) / len(SHARDS) * 0.7
+    with pytest.raises(ValueError):
+        HashRing([])
+
+
+def test_adding_a_shard_only_moves_users_to_it():
+    """Test that growing the ring moves about 1/N of the users, all onto the new shard."""
+    old = HashRing(SHARDS)
+    new = HashRing(SHARDS + ["http://s3:8001"])
+    users_by_shard = {}
+    for user_id in USERS:
+        users_by_shard.setdefault(old.shard_for(user_id), []).append(user_id)
+
+    moves = plan_moves(users_by_shard, new)
+    moved = sum(len(users) for users in moves.values())
+    assert {target for _, target in moves} == {"http://s3:8001"}
+    assert len(USERS) * 0.15 < moved < len(USERS) * 0.35
+
+
+def test_parse_shards():
+    assert parse_shards(" http://a:1/, http://b:2 ,") == ["http://a:1", "http://b:2"]
@@ -58,12 +58,10 @@ def test_retrieve_request_schema():
     assert req.top_k == 10
     assert req.index_namespace == "resume_sections"
 
-    # Unhappy paths
-    with pytest.raises(ValidationError, match="List should have at least 384 items"):
-        RetrieveRequest(query_embedding=[0.0] * 100)
-
-    with pytest.raises(ValidationError, match="List should have at most 384 items"):
-        RetrieveRequest(query_embedding=[0.0] * 400)
+    # Unhappy paths. The dimension itself is checked against the loaded
+    # model by the endpoint, so only an empty vector is a schema error.
+    with pytest.raises(ValidationError, match="List should have at least 1 item"):
+        RetrieveRequest(query_embedding=[])
 
     with pytest.raises(ValidationError, match="Input should be greater than or equal to 1"):
         RetrieveRequest(query_embedding=valid_embedding, top_k=0)
@@ -74,6 +72,16 @@ def test_retrieve_request_schema():
     with pytest.raises(ValidationError):
         RetrieveRequest(query_embedding=valid_embedding, index_namespace="invalid_namespace")
 
+    # query_text is an alternative to query_embedding; exactly one is required
+    req = RetrieveRequest(query_text="Looking for a Python engineer")
+    assert req.query_embedding is None
+
+    with pytest.raises(ValidationError, match="exactly one"):
+        RetrieveRequest()
+
+    with pytest.raises(ValidationError, match="exactly one"):
+        RetrieveRequest(query_embedding=valid_embedding, query_text="both")
+
 def test_chunk_item_schema():
     """Test the output schema for ChunkItem."""
     # This schema is for output, so we mainly test creation
@@ -0,0 +1,102 @@
+# test_vector_store.py
+
+import numpy as np
+import pytest
+
+import db
+import faiss_index
+from vector_store import VectorFile
+
+
+def _vectors(n, dim=8):
+    v = (np.random.rand(n, dim) - 0.5).astype(np.float32)
+    return v / np.linalg.norm(v, axis=1, keepdims=True)
+
+
+def test_vector_file_round_trip(tmp_path):
+    """Test that vectors come back by id, for contiguous and scattered reads."""
+    store = VectorFile(str(tmp_path / "v.vectors"))
+    assert store.dimension() is None
+    vecs = _vectors(5)
+    store.write([1, 2, 3, 4, 5], [v.tobytes() for v in vecs])
+
+    assert store.dimension() == 8
+    assert np.array_equal(store.read([2, 3, 4]), vecs[1:4])
+    assert np.array_equal(store.read([5, 1]), vecs[[4, 0]])
+    with pytest.raises(KeyError):
+        store.read([6])
+    with pytest.raises(ValueError):
+        store.write([6], [np.zeros(4, dtype=np.float32).tobytes()])
+
+
+@pytest.fixture
+def mmap_db(tmp_path, monkeypatch):
+    """A temporary database with VECTOR_STORAGE=mmap."""
+    monkeypatch.setattr(db, "DB_PATH", str(tmp_path / "test.db"))
+    monkeypatch.setattr(db, "VECTOR_STORAGE", "mmap")
+    db.init_db()
+    faiss_index.user_indices.clear()
+    yield
+    faiss_index.user_indices.clear()
+
+
+def test_mmap_storage_keeps_vectors_out_of_sqlite(mmap_db):
+    """Test that chunks are written to the vector file and indices build from it."""
+    vecs = _vectors(3)
+    for i, v in enumerate(vecs):
+        db.store_chunk(f"c{i}", "u1", "profile", None, "summary", str(i), f"text {i}", v.tobytes(), "m")
+
+    rows = db.get_all_chunks()
+    assert all(row["embedding"] == b"" for row in rows)
+    assert np.array_equal(db.load_embeddings(rows), vecs)
+
+    faiss_index.build_index_from_db(rows)
+    chunk_ids, _ = faiss_index.search("u1", "profile", vecs[2], top_k=1)
+    assert chunk_ids == ["c2"]
+
+
+def test_mmap_promotion_rewrites_vector_file(mmap_db):
+    """Test that a model cutover swaps in a vector file of the new dimension."""
+    for i, v in enumerate(_vectors(3)):
+        db.store_chunk(f"c{i}", "u1", "profile", None, "summary", str(i), f"text {i}", v.tobytes(), "old")
+    new_vecs = _vectors(3, dim=4)
+    ids = [row["id"] for row in db.get_all_chunks()]
+    db.store_shadow_embeddings("new", [(row_id, v.tobytes()) for row_id, v in zip(ids, new_vecs)])
+
+    assert db.promote_shadow_embeddings("new") == 3
+
+    assert db.vector_file().dimension() == 4
+    rows = db.get_all_chunks()
+    assert all(row["embedding"] == b"" and row["embedding_model"] == "new" for row in rows)
+    assert np.array_equal(db.load_embeddings(rows), new_vecs)
+
+
+def test_failed_mmap_promotion_keeps_the_old_vector_file(mmap_db, monkeypatch):
+    """Test that the new vector file is only swapped in once the promotion commits."""
+    old_vecs = _vectors(3)
+    for i, v in enumerate(old_vecs):
+        db.store_chunk(f"c{i}", "u1", "profile", None, "summary", str(i), f"text {i}", v.tobytes(), "old")
+    ids = [row["id"] for row in db.get_all_chunks()]
+    db.store_shadow_embeddings("new", [(row_id, v.tobytes()) for row_id, v in zip(ids, _vectors(3, dim=4))])
+
+    class FailingCommit:
+        def __init__(self, conn):
+            self.conn = conn
+
+        def __getattr__(self, name):
+            return getattr(self.conn, name)
+
+        def commit(self):
+            raise db.sqlite3.OperationalError("disk I/O error")
+
+    connect = db.get_connection
+    monkeypatch.setattr(db, "get_connection", lambda: FailingCommit(connect()))
+    with pytest.raises(db.sqlite3.OperationalError):
+        db.promote_shadow_embeddings("new")
+    monkeypatch.setattr(db, "get_connection", connect)
+
+    assert db.vector_file().dimension() == 8
+    assert not VectorFile(f"{db.vector_file().path}.tmp").dimension()
+    rows = db.get_all_chunks()
+    assert all(row["embedding_model"] == "old" for row in rows)
+    assert np.array_equal(db.load_embeddings(rows), old_vecs)
@@ -0,0 +1,83 @@
+"""
+Append-only, memory-mapped float32 vector file.
+
+With `VECTOR_STORAGE=mmap`, chunk vectors are kept here instead of in the
+`embedding` BLOB column, and SQLite holds only metadata. The vector of chunk
+`id` lives in slot `id`, so rows written together sit next to each other and
+an index build reads them as one contiguous slice of the mapping. Chunk ids
+are never reused, so a slot is written once; slots of purged chunks are left
+behind until the file is rewritten by a model cutover.
+
+Layout: a 64-byte header (magic, dimension), then `dim` little-endian
+float32 values per slot.
+"""
+
+import os
+import struct
+from typing import Iterable, Optional, Sequence
+
+import numpy as np
+
+MAGIC = b"CVVEC001"
+HEADER = struct.Struct("<8sI")
+HEADER_SIZE = 64
+DTYPE = np.dtype("<f4")
+
+
+class VectorFile:
+    """Vectors of one dimension, addressed by integer chunk id."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def dimension(self) -> Optional[int]:
+        """The file's vector dimension, or None if it does not exist yet."""
+        try:
+            with open(self.path, "rb") as f:
+                magic, dim = HEADER.unpack(f.read(HEADER.size))
+        except FileNotFoundError:
+            return None
+        if magic != MAGIC:
+            raise ValueError(f"{self.path} is not a vector file")
+        return dim
+
+    def write(self, ids: Sequence[int], vectors: Iterable[bytes], sync: bool = False) -> None:
+        """Write packed float32 `vectors` to the slots of `ids`, fsyncing if `sync`."""
+        dim = self.dimension()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            for chunk_id, vector in zip(ids, vectors):
+                if dim is None:
+                    dim = len(vector) // DTYPE.itemsize
+                    os.pwrite(fd, HEADER.pack(MAGIC, dim).ljust(HEADER_SIZE, b"\0"), 0)
+                if len(vector) != dim * DTYPE.itemsize:
+                    raise ValueError(
+                        f"Vector of {len(vector) // DTYPE.itemsize} dims does not fit "
+                        f"{self.path} ({dim} dims)"
+                    )
+                os.pwrite(fd, vector, HEADER_SIZE + chunk_id * dim * DTYPE.itemsize)
+            if sync:
+                os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def read(self, ids: Sequence[int]) -> np.ndarray:
+        """Vectors for `ids` as a (len(ids), dim) float32 matrix."""
+        dim = self.dimension()
+        if dim is None:
+            raise FileNotFoundError(self.path)
+        slots = (os.path.getsize(self.path) - HEADER_SIZE) // (dim * DTYPE.itemsize)
+        mapping = np.memmap(self.path, dtype=DTYPE, mode="r", offset=HEADER_SIZE, shape=(slots, dim))
+        ids = np.asarray(ids, dtype=np.int64)
+        if ids.size and ids.max() >= slots:
+            raise KeyError(f"No vector stored for chunk id {int(ids.max())}")
+        # One contiguous slice when the ids are consecutive, as after a bulk import
+        if ids.size and ids[-1] - ids[0] == ids.size - 1 and np.all(np.diff(ids) == 1):
+            return np.array(mapping[ids[0]:ids[-1] + 1], dtype=np.float32)
+        return np.array(mapping[ids], dtype=np.float32)
+
+    def remove(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
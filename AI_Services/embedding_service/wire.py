@@ -0,0 +1,67 @@
+"""
+Binary wire formats for vector-carrying endpoints.
+
+JSON stays the default. Clients that send or accept `application/msgpack`
+get vectors as packed little-endian float32 `bin` fields, and
+`application/octet-stream` carries a bare packed vector. Packed vectors
+decode zero-copy into NumPy and skip per-element validation.
+`application/x-ndjson` streams /retrieve results one JSON chunk per line.
+"""
+
+from typing import Any, Optional
+
+import msgpack
+import numpy as np
+
+JSON = "application/json"
+MSGPACK = "application/msgpack"
+OCTET_STREAM = "application/octet-stream"
+NDJSON = "application/x-ndjson"
+
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+def negotiate(accept: Optional[str], *offered: str) -> str:
+    """
+    Pick the first media type in `offered` that the Accept header allows,
+    honouring the client's order. Falls back to JSON.
+    """
+    if not accept:
+        return JSON
+    for part in accept.split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in offered:
+            return media_type
+    return JSON
+
+
+def media_type_of(content_type: Optional[str]) -> str:
+    """Strip parameters from a Content-Type header; missing means JSON."""
+    if not content_type:
+        return JSON
+    return content_type.split(";")[0].strip().lower()
+
+
+def pack_vector(vector: np.ndarray) -> bytes:
+    """Serialize a vector as packed little-endian float32."""
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def unpack_vector(buffer: Any) -> np.ndarray:
+    """
+    Decode a packed little-endian float32 buffer without copying. Raises
+    ValueError if the buffer length is not a whole number of floats.
+    """
+    if isinstance(buffer, (list, tuple)):
+        return np.asarray(buffer, dtype=np.float32)
+    if len(buffer) % VECTOR_DTYPE.itemsize:
+        raise ValueError("Vector buffer length is not a multiple of 4 bytes")
+    return np.frombuffer(buffer, dtype=VECTOR_DTYPE)
+
+
+def packb(obj: Any) -> bytes:
+    return msgpack.packb(obj, use_bin_type=True)
+
+
+def unpackb(data: bytes) -> Any:
+    return msgpack.unpackb(data, raw=False)
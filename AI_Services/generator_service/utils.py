@@ -5,13 +5,25 @@ Utility functions for orchestrating calls to the Retrieval Service.
 """
 import logging
 import os
-from typing import List
+from typing import Any, Dict, List
 import httpx
 from .schemas import ChunkItem, RetrieveResponse
 
 logger = logging.getLogger(__name__)
 
 
+def parse_retrieve_response(data: Dict[str, Any]) -> RetrieveResponse:
+    """
+    Parse a Retrieval Service response. With TRUSTED_INTERNAL_HOPS=true the
+    chunks are not validated; they are only read to build the prompt.
+    """
+    if os.getenv("TRUSTED_INTERNAL_HOPS", "false").lower() == "true":
+        return RetrieveResponse.model_construct(
+            results=[ChunkItem.model_construct(**chunk) for chunk in data["results"]]
+        )
+    return RetrieveResponse(**data)
+
+
 async def retrieve_full_context(
     client: httpx.AsyncClient, user_id: str, job_description: str, top_k: int
 ) -> List[ChunkItem]:
@@ -35,7 +47,7 @@ async def retrieve_full_context(
         response.raise_for_status()
         
         # Use the Pydantic model for robust parsing
-        retrieved_data = RetrieveResponse(**response.json())
+        retrieved_data = parse_retrieve_response(response.json())
         chunks = retrieved_data.results
         
         logger.info(f"Successfully retrieved {len(chunks)} chunks for full context")
@@ -72,7 +84,7 @@ async def retrieve_section_context(
         response = await client.post(endpoint, json=payload, timeout=30.0)
         response.raise_for_status()
         
-        retrieved_data = RetrieveResponse(**response.json())
+        retrieved_data = parse_retrieve_response(response.json())
         chunks = retrieved_data.results
         
         logger.info(f"Successfully retrieved {len(chunks)} chunks for section context")
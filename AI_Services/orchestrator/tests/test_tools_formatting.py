@@ -1,6 +1,6 @@
 from datetime import datetime
 from schemas import ChunkItem
-from tools import format_context_for_prompt
+from tools import format_context_for_prompt, parse_retrieve_response
 
 def test_format_context_for_prompt_logic():
     """Tests the logic for formatting retrieved chunks into a string."""
@@ -31,4 +31,19 @@ def test_format_context_for_prompt_logic():
 
 def test_format_context_for_prompt_with_empty_list():
     """Tests the formatter with an empty list of chunks."""
-    assert format_context_for_prompt([]) == "No relevant context was found from the user's profile."
\ No newline at end of file
+    assert format_context_for_prompt([]) == "No relevant context was found from the user's profile."
+
+def test_parse_retrieve_response_trusted_internal_hops(monkeypatch):
+    """Tests that trusted retrieval responses are used without re-validation."""
+    data = {"results": [{
+        "chunk_id": "c1", "user_id": "u1", "index_namespace": "profile", "section_id": None,
+        "source_type": "experience", "source_id": "0", "text": "Profile experience text.",
+        "score": 0.9, "created_at": "2024-01-01T00:00:00",
+    }]}
+    validated = parse_retrieve_response(data)
+
+    monkeypatch.setenv("TRUSTED_INTERNAL_HOPS", "true")
+    trusted = parse_retrieve_response(data)
+
+    assert format_context_for_prompt(trusted.results) == format_context_for_prompt(validated.results)
+    assert trusted.results[0].created_at == "2024-01-01T00:00:00"  # left as received
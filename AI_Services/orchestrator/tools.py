@@ -8,12 +8,18 @@ from langchain.tools import tool
 from pydantic import ValidationError
 
 from .memory import get_session_context, update_session_context
-from .schemas import RetrieveResponse, GenerateResponse, ScoreResponse, SuggestionResponse
+from .schemas import ChunkItem, RetrieveResponse, GenerateResponse, ScoreResponse, SuggestionResponse
 
 SCORING_SERVICE_URL = os.getenv("SCORING_SERVICE_URL", "http://localhost:8004")
 RETRIEVAL_SERVICE_URL = os.getenv("RETRIEVAL_SERVICE_URL", "http://localhost:8002")
 GENERATION_SERVICE_URL = os.getenv("GENERATION_SERVICE_URL", "http://localhost:8003")
 
+def parse_retrieve_response(data: dict) -> RetrieveResponse:
+    """Parses a Retrieval Service response, skipping validation when TRUSTED_INTERNAL_HOPS=true."""
+    if os.getenv("TRUSTED_INTERNAL_HOPS", "false").lower() == "true":
+        return RetrieveResponse.model_construct(results=[ChunkItem.model_construct(**c) for c in data["results"]])
+    return RetrieveResponse(**data)
+
 def format_context_for_prompt(chunks: List) -> str:
     """Formats retrieved chunks into a human-readable context string."""
     if not chunks:
@@ -47,7 +53,7 @@ class ToolBox:
         try:
             response = await self.http_client.post(endpoint, json=payload)
             response.raise_for_status()
-            return format_context_for_prompt(RetrieveResponse(**response.json()).results)
+            return format_context_for_prompt(parse_retrieve_response(response.json()).results)
         except Exception as e: return f"Error retrieving context: {e}"
 
     async def _generate_text_tool(self, section_id: Optional[str] = None, existing_text: Optional[str] = None) -> str:
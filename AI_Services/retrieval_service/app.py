@@ -18,28 +18,71 @@ The service acts as an intermediary between the Generation Service and the
 Embedding Service, handling HTTP orchestration and response formatting.
 
 Environment Variables:
-- EMBEDDING_SERVICE_URL: Base URL of the Embedding Service (required)
+- EMBEDDING_SERVICE_URL: Base URL of the Embedding Service (required unless
+  EMBEDDING_SERVICE_URLS is set)
+- EMBEDDING_SERVICE_URLS: Comma-separated replica URLs; /embed is load-balanced
+  with hedged requests, user-scoped calls go to the first URL (optional; see
+  replicas.py)
 - DEFAULT_TOP_K: Default number of chunks to retrieve (optional, default: 5)
+- EMBED_QUERY_SERVER_SIDE: If "true", send the job description as `query_text`
+  so the Embedding Service embeds and searches in one request (optional, default: false)
+- EMBEDDING_WIRE_FORMAT: "json" or "msgpack"; msgpack sends and receives query
+  vectors as packed float32 instead of JSON float lists (optional, default: json)
+- JD_EMBED_CACHE_SIZE / JD_EMBED_CACHE_TTL_S / JD_EMBED_CACHE_REDIS_URL: Job
+  description embedding cache settings (see cache.py)
+- RESULT_CACHE_SIZE: Max cached retrieval responses, 0 to disable (optional, default: 1024)
+- TRUSTED_INTERNAL_HOPS: If "true", chunks from the Embedding Service are used
+  without validation; nothing validates them before they are returned, so set
+  it only when the Embedding Service is internal (optional, default: false)
 - LOG_LEVEL: Logging level INFO or DEBUG (optional, default: INFO)
+
+/retrieve/full and /retrieve/section stream their chunks as NDJSON, one
+chunk per line, when the request sends `Accept: application/x-ndjson`.
+
+Every /retrieve/* response carries a `Server-Timing` header with the time
+spent per stage (see timing.py); the same values are logged with the request
+and exported as histograms on /metrics.
 """
 
+import asyncio
 import logging
 import os
 import time
-from typing import Dict, Any
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple
 
 import httpx
 from fastapi import FastAPI, HTTPException, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 from .schemas import (
+    ChunkItem,
     FullRetrieveRequest,
     SectionRetrieveRequest,
+    SectionsRetrieveRequest,
+    FusedRetrieveRequest,
     RetrieveResponse,
+    SectionsRetrieveResponse,
     HealthResponse,
 )
-from .utils import embed_text, retrieve_profile_chunks, retrieve_section_chunks
+from .cache import ResultCache, ResultKey, cache_from_env, result_cache_from_env
+from .replicas import replica_urls
+from .resilience import breaker_states, retry_budget
+from .singleflight import SingleFlight
+from . import timing
+from .timing import stage
+from .utils import (
+    NDJSON,
+    Embedding,
+    aiter_streamed_chunks,
+    embed_text,
+    fetch_index_version,
+    fuse_chunks,
+    open_chunk_stream,
+    retrieve_chunks,
+)
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -54,6 +97,10 @@ logger = logging.getLogger(__name__)
 # App state to hold the shared httpx client
 app_state: Dict[str, Any] = {}
 
+# Coalesce identical concurrent downstream calls
+embed_flights = SingleFlight("embed")
+retrieve_flights = SingleFlight("retrieve")
+
 # Initialize FastAPI application
 app = FastAPI(
     title="CVisionary Retrieval Service",
@@ -81,10 +128,10 @@ async def startup_event():
     logger.info("[RETRIEVAL] Starting CVisionary Retrieval Service")
 
     # Validate required environment variables
-    embedding_service_url = os.getenv("EMBEDDING_SERVICE_URL")
-    if not embedding_service_url:
+    embedding_service_urls = replica_urls()
+    if not embedding_service_urls:
         logger.error(
-            "[RETRIEVAL] EMBEDDING_SERVICE_URL environment variable is required"
+            "[RETRIEVAL] EMBEDDING_SERVICE_URL (or EMBEDDING_SERVICE_URLS) environment variable is required"
         )
         raise RuntimeError("EMBEDDING_SERVICE_URL environment variable is required")
 
@@ -100,21 +147,25 @@ async def startup_event():
 
     # Create and store a single, shared httpx.AsyncClient instance
     app_state["http_client"] = httpx.AsyncClient(timeout=30.0)
-
-    # Test connectivity to Embedding Service
-    try:
-        health_url = f"{embedding_service_url.rstrip('/')}/health"
-        response = await app_state["http_client"].get(health_url)
-        if response.status_code == 200:
-            logger.info(
-                f"[RETRIEVAL] Successfully connected to Embedding Service at {embedding_service_url}"
-            )
-        else:
-            logger.warning(
-                f"[RETRIEVAL] Embedding Service health check returned {response.status_code}"
-            )
-    except Exception as e:
-        logger.warning(f"[RETRIEVAL] Could not connect to Embedding Service: {e}")
+    app_state["embedding_cache"] = cache_from_env()
+    app_state["result_cache"] = result_cache_from_env()
+
+    # Test connectivity to every Embedding Service replica
+    for embedding_service_url in embedding_service_urls:
+        try:
+            health_url = f"{embedding_service_url}/health"
+            response = await app_state["http_client"].get(health_url)
+            if response.status_code == 200:
+                logger.info(
+                    f"[RETRIEVAL] Successfully connected to Embedding Service at {embedding_service_url}"
+                )
+            else:
+                logger.warning(
+                    f"[RETRIEVAL] Embedding Service health check at {embedding_service_url} "
+                    f"returned {response.status_code}"
+                )
+        except Exception as e:
+            logger.warning(f"[RETRIEVAL] Could not connect to Embedding Service at {embedding_service_url}: {e}")
 
     logger.info("[RETRIEVAL] Service startup complete")
 
@@ -128,6 +179,9 @@ async def shutdown_event():
     client: httpx.AsyncClient = app_state.get("http_client")
     if client:
         await client.aclose()
+    cache = app_state.get("embedding_cache")
+    if cache:
+        await cache.close()
     logger.info("[RETRIEVAL] Shutdown complete")
 
 
@@ -137,16 +191,210 @@ async def get_http_client() -> httpx.AsyncClient:
     return app_state["http_client"]
 
 
+def _embed_query_server_side() -> bool:
+    """Whether to skip the /embed hop and let /retrieve embed the query."""
+    return os.getenv("EMBED_QUERY_SERVER_SIDE", "false").lower() == "true"
+
+
+async def embed_job_description(client: httpx.AsyncClient, job_description: str) -> Embedding:
+    """
+    Embed a job description, reusing the vector from earlier retrievals of the
+    same text when the embedding cache has it. Concurrent requests for the
+    same text share one downstream call.
+    """
+    return await embed_flights.do(
+        job_description, lambda: _embed_job_description(client, job_description)
+    )
+
+
+async def _embed_job_description(client: httpx.AsyncClient, job_description: str) -> Embedding:
+    cache = app_state.get("embedding_cache")
+    if cache is None:
+        embedding, _ = await embed_text(client, job_description)
+        return embedding
+    with stage("cache"):
+        embedding = await cache.get(job_description)
+    if embedding is None:
+        embedding, model = await embed_text(client, job_description)
+        with stage("cache"):
+            await cache.put(job_description, embedding, model)
+    return embedding
+
+
+async def retrieve_context(
+    client: httpx.AsyncClient,
+    user_id: str,
+    namespace: str,
+    job_description: str,
+    top_k: int,
+    section_id: Optional[str] = None,
+    embedding: Optional[Embedding] = None,
+) -> RetrieveResponse:
+    """
+    Retrieve chunks for a job description, serving a cached response when the
+    same retrieval was made against the current version of the user's index.
+    Identical concurrent retrievals share one downstream retrieval. Pass the
+    job description's `embedding` when the caller already has it.
+    """
+    key = ResultCache.key(user_id, namespace, section_id, job_description, top_k)
+    return await retrieve_flights.do(
+        key,
+        lambda: _retrieve_context(
+            client, key, user_id, namespace, job_description, top_k, section_id, embedding
+        ),
+    )
+
+
+async def _retrieve_context(
+    client: httpx.AsyncClient,
+    key: ResultKey,
+    user_id: str,
+    namespace: str,
+    job_description: str,
+    top_k: int,
+    section_id: Optional[str],
+    embedding: Optional[Embedding],
+) -> RetrieveResponse:
+    cached = await _cached_result(client, key, user_id, namespace)
+    if cached is not None:
+        return cached
+
+    embedding, query_text = await _query(client, job_description, embedding)
+    response = await retrieve_chunks(
+        client, user_id, namespace, embedding, top_k,
+        query_text=query_text, section_id=section_id,
+    )
+    result_cache = app_state.get("result_cache")
+    if result_cache is not None:
+        with stage("cache"):
+            result_cache.put(key, response)
+    return response
+
+
+async def _cached_result(
+    client: httpx.AsyncClient, key: ResultKey, user_id: str, namespace: str
+) -> Optional[RetrieveResponse]:
+    """The cached response for `key`, if it is from the current index version."""
+    result_cache = app_state.get("result_cache")
+    if result_cache is None:
+        return None
+    # Only ask for the version when there is something to validate
+    with stage("cache"):
+        cached = result_cache.peek(key)
+    current = await fetch_index_version(client, user_id, namespace) if cached is not None else None
+    with stage("cache"):
+        return result_cache.hit(key, current)
+
+
+async def _query(
+    client: httpx.AsyncClient, job_description: str, embedding: Optional[Embedding]
+) -> Tuple[Optional[Embedding], Optional[str]]:
+    """The (embedding, query_text) to search with; exactly one is set."""
+    if _embed_query_server_side():
+        return None, job_description
+    if embedding is None:
+        embedding = await embed_job_description(client, job_description)
+    return embedding, None
+
+
+def _wants_ndjson(request: Request) -> bool:
+    return NDJSON in request.headers.get("accept", "")
+
+
+async def stream_context(
+    client: httpx.AsyncClient,
+    user_id: str,
+    namespace: str,
+    job_description: str,
+    top_k: int,
+    section_id: Optional[str] = None,
+) -> StreamingResponse:
+    """
+    Like `retrieve_context`, but answer with one NDJSON line per chunk. The
+    Embedding Service is asked for NDJSON too, and each chunk is validated
+    and written as its line arrives, so neither hop builds, parses or
+    serializes the whole list and only one chunk is held at a time.
+
+    Everything up to the Embedding Service's status line happens before the
+    stream starts, so those failures still get the usual JSON error response.
+    The index version goes in the `X-Index-Version` header.
+
+    Limits: the Embedding Service still runs the whole top-k search before
+    its first line, so streaming saves buffering, not search time, and the
+    embedding shard router buffers the body it forwards. Streamed
+    retrievals are served from the result cache but never fill it, and are
+    not coalesced or retried. A failure mid-stream ends the body early.
+    """
+    key = ResultCache.key(user_id, namespace, section_id, job_description, top_k)
+    cached = await _cached_result(client, key, user_id, namespace)
+    if cached is not None:
+        return _ndjson_response(_ndjson_lines(cached.results), cached.index_version)
+
+    embedding, query_text = await _query(client, job_description, None)
+    response, index_version = await open_chunk_stream(
+        client, user_id, namespace, embedding, top_k,
+        query_text=query_text, section_id=section_id,
+    )
+
+    async def lines() -> AsyncIterator[bytes]:
+        async for chunk in aiter_streamed_chunks(response, user_id):
+            yield _ndjson_line(chunk)
+
+    # Close the downstream response even if the client goes away before the
+    # stream is read
+    return _ndjson_response(lines(), index_version, BackgroundTask(response.aclose))
+
+
+def _ndjson_line(chunk: ChunkItem) -> bytes:
+    return chunk.model_dump_json().encode("utf-8") + b"\n"
+
+
+async def _ndjson_lines(chunks: List[ChunkItem]) -> AsyncIterator[bytes]:
+    for chunk in chunks:
+        yield _ndjson_line(chunk)
+
+
+def _ndjson_response(
+    lines: AsyncIterator[bytes],
+    index_version: Optional[str],
+    background: Optional[BackgroundTask] = None,
+) -> StreamingResponse:
+    headers = {"X-Index-Version": index_version} if index_version is not None else None
+    return StreamingResponse(lines, media_type=NDJSON, headers=headers, background=background)
+
+
 @app.middleware("http")
 async def log_requests(request: Request, call_next):
-    """Log all incoming requests and response times."""
+    """
+    Log all incoming requests and response times. Retrieval requests are timed
+    per stage: the breakdown goes into a `Server-Timing` header, the log line
+    (also as the `timings_ms` record field) and the stage histograms.
+    """
     start_time = time.time()
     logger.info(f"[RETRIEVAL] {request.method} {request.url.path} - Request received")
-    response = await call_next(request)
-    duration = time.time() - start_time
+    if not request.url.path.startswith("/retrieve/"):
+        response = await call_next(request)
+        duration = time.time() - start_time
+        logger.info(
+            f"[RETRIEVAL] {request.method} {request.url.path} - "
+            f"Response {response.status_code} in {duration:.2f}s"
+        )
+        return response
+
+    timer, token = timing.start_request()
+    try:
+        response = await call_next(request)
+    finally:
+        timing.end_request(token)
+    timings = timer.fields()
+    response.headers["Server-Timing"] = timer.server_timing()
+    # Label by route template, so unknown paths do not add label values
+    timer.observe(getattr(request.scope.get("route"), "path", "unmatched"))
     logger.info(
         f"[RETRIEVAL] {request.method} {request.url.path} - "
-        f"Response {response.status_code} in {duration:.2f}s"
+        f"Response {response.status_code} in {timings[timing.TOTAL] / 1000:.2f}s "
+        f"({' '.join(f'{name}={ms}ms' for name, ms in timings.items())})",
+        extra={"timings_ms": timings},
     )
     return response
 
@@ -188,17 +436,37 @@ async def general_exception_handler(request: Request, exc: Exception):
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
-    """Health check endpoint for service monitoring."""
-    return HealthResponse(status="ok", service="retrieval")
+    """
+    Health check endpoint for service monitoring. Reports "degraded" while any
+    downstream circuit breaker is not closed.
+    """
+    breakers = breaker_states()
+    status = "ok" if all(state == "closed" for state in breakers.values()) else "degraded"
+    return HealthResponse(
+        status=status,
+        service="retrieval",
+        circuit_breakers=breakers,
+        retry_budget=round(retry_budget.tokens, 2),
+    )
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics."""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 @app.post("/retrieve/full", response_model=RetrieveResponse)
 async def retrieve_full_context(
-    request: FullRetrieveRequest, client: httpx.AsyncClient = Depends(get_http_client)
+    request: FullRetrieveRequest,
+    http_request: Request,
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     """
-    Retrieve relevant profile chunks for full resume generation.
+    Retrieve relevant profile chunks for full resume generation. Streams
+    NDJSON when the client accepts `application/x-ndjson`.
     """
+    timing.mark("parse")
     logger.info(
         f"[RETRIEVAL] Full context retrieval: user_id={request.user_id}, "
         f"job_desc_len={len(request.job_description)}, top_k={request.top_k}"
@@ -207,15 +475,18 @@ async def retrieve_full_context(
         if not request.user_id.strip() or not request.job_description.strip():
             raise HTTPException(status_code=400, detail="user_id and job_description cannot be empty")
 
-        embedding = await embed_text(client, request.job_description)
-        chunks = await retrieve_profile_chunks(
-            client, user_id=request.user_id, embedding=embedding, top_k=request.top_k
+        if _wants_ndjson(http_request):
+            return await stream_context(
+                client, request.user_id, "profile", request.job_description, request.top_k
+            )
+        response = await retrieve_context(
+            client, request.user_id, "profile", request.job_description, request.top_k
         )
         logger.info(
             f"[RETRIEVAL] Full context retrieval complete: "
-            f"user_id={request.user_id}, retrieved {len(chunks)} chunks"
+            f"user_id={request.user_id}, retrieved {len(response.results)} chunks"
         )
-        return RetrieveResponse(results=chunks)
+        return response
 
     except HTTPException:
         raise
@@ -228,11 +499,15 @@ async def retrieve_full_context(
 
 @app.post("/retrieve/section", response_model=RetrieveResponse)
 async def retrieve_section_context(
-    request: SectionRetrieveRequest, client: httpx.AsyncClient = Depends(get_http_client)
+    request: SectionRetrieveRequest,
+    http_request: Request,
+    client: httpx.AsyncClient = Depends(get_http_client),
 ):
     """
     Retrieve relevant profile chunks for specific resume section editing.
+    Streams NDJSON when the client accepts `application/x-ndjson`.
     """
+    timing.mark("parse")
     logger.info(
         f"[RETRIEVAL] Section context retrieval: user_id={request.user_id}, "
         f"section_id={request.section_id}, top_k={request.top_k}"
@@ -241,20 +516,29 @@ async def retrieve_section_context(
         if not all([s.strip() for s in [request.user_id, request.section_id, request.job_description]]):
             raise HTTPException(status_code=400, detail="user_id, section_id, and job_description cannot be empty")
 
-        embedding = await embed_text(client, request.job_description)
-        chunks = await retrieve_section_chunks(
+        if _wants_ndjson(http_request):
+            return await stream_context(
+                client,
+                request.user_id,
+                "resume_sections",
+                request.job_description,
+                request.top_k,
+                section_id=request.section_id,
+            )
+        response = await retrieve_context(
             client,
-            user_id=request.user_id,
+            request.user_id,
+            "resume_sections",
+            request.job_description,
+            request.top_k,
             section_id=request.section_id,
-            embedding=embedding,
-            top_k=request.top_k,
         )
         logger.info(
             f"[RETRIEVAL] Section context retrieval complete: "
             f"user_id={request.user_id}, section_id={request.section_id}, "
-            f"retrieved {len(chunks)} chunks"
+            f"retrieved {len(response.results)} chunks"
         )
-        return RetrieveResponse(results=chunks)
+        return response
 
     except HTTPException:
         raise
@@ -265,6 +549,131 @@ async def retrieve_section_context(
         raise HTTPException(status_code=500, detail="Failed to retrieve section context")
 
 
+@app.post("/retrieve/sections", response_model=SectionsRetrieveResponse)
+async def retrieve_sections_context(
+    request: SectionsRetrieveRequest, client: httpx.AsyncClient = Depends(get_http_client)
+):
+    """
+    Retrieve relevant profile chunks for several resume sections at once. The
+    job description is embedded once and the per-section searches (plus the
+    full-profile search, if requested) run concurrently.
+    """
+    timing.mark("parse")
+    section_ids = list(dict.fromkeys(request.section_ids))
+    logger.info(
+        f"[RETRIEVAL] Multi-section context retrieval: user_id={request.user_id}, "
+        f"sections={len(section_ids)}, include_profile={request.include_profile}, "
+        f"top_k={request.top_k}"
+    )
+    try:
+        if not request.user_id.strip() or not request.job_description.strip():
+            raise HTTPException(status_code=400, detail="user_id and job_description cannot be empty")
+        if not all(s.strip() for s in section_ids):
+            raise HTTPException(status_code=400, detail="section_ids cannot contain empty values")
+
+        embedding = None
+        if not _embed_query_server_side():
+            embedding = await embed_job_description(client, request.job_description)
+
+        searches = [
+            retrieve_context(
+                client,
+                request.user_id,
+                "resume_sections",
+                request.job_description,
+                request.top_k,
+                section_id=section_id,
+                embedding=embedding,
+            )
+            for section_id in section_ids
+        ]
+        if request.include_profile:
+            searches.append(
+                retrieve_context(
+                    client,
+                    request.user_id,
+                    "profile",
+                    request.job_description,
+                    request.top_k,
+                    embedding=embedding,
+                )
+            )
+        responses = await asyncio.gather(*searches)
+
+        sections = dict(zip(section_ids, responses))
+        profile = responses[-1] if request.include_profile else None
+        logger.info(
+            f"[RETRIEVAL] Multi-section context retrieval complete: user_id={request.user_id}, "
+            f"retrieved {sum(len(r.results) for r in responses)} chunks"
+        )
+        return SectionsRetrieveResponse(sections=sections, profile=profile)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(
+            f"[RETRIEVAL] Multi-section context retrieval failed: {str(e)}", exc_info=True
+        )
+        raise HTTPException(status_code=500, detail="Failed to retrieve sections context")
+
+
+@app.post("/retrieve/fused", response_model=RetrieveResponse)
+async def retrieve_fused_context(
+    request: FusedRetrieveRequest, client: httpx.AsyncClient = Depends(get_http_client)
+):
+    """
+    Retrieve context from several index namespaces at once. The namespaces are
+    searched concurrently with one job description embedding, then merged by
+    score with optional per-namespace quotas and near-duplicates removed.
+    """
+    timing.mark("parse")
+    logger.info(
+        f"[RETRIEVAL] Fused context retrieval: user_id={request.user_id}, "
+        f"namespaces={request.namespaces}, top_k={request.top_k}"
+    )
+    try:
+        if not request.user_id.strip() or not request.job_description.strip():
+            raise HTTPException(status_code=400, detail="user_id and job_description cannot be empty")
+
+        embedding = None
+        if not _embed_query_server_side():
+            embedding = await embed_job_description(client, request.job_description)
+
+        # Over-fetch so deduplication can still fill top_k
+        fetch_k = min(50, request.top_k * 2)
+        namespaces = [ns for ns in request.namespaces if request.quotas.get(ns, fetch_k) > 0]
+        responses = await asyncio.gather(*(
+            retrieve_context(
+                client,
+                request.user_id,
+                namespace,
+                request.job_description,
+                min(fetch_k, request.quotas.get(namespace, fetch_k)),
+                embedding=embedding,
+            )
+            for namespace in namespaces
+        ))
+
+        results = fuse_chunks(
+            {ns: response.results for ns, response in zip(namespaces, responses)},
+            request.top_k,
+            request.quotas,
+        )
+        logger.info(
+            f"[RETRIEVAL] Fused context retrieval complete: user_id={request.user_id}, "
+            f"kept {len(results)} of {sum(len(r.results) for r in responses)} chunks"
+        )
+        return RetrieveResponse(results=results)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(
+            f"[RETRIEVAL] Fused context retrieval failed: {str(e)}", exc_info=True
+        )
+        raise HTTPException(status_code=500, detail="Failed to retrieve fused context")
+
+
 @app.get("/")
 async def root():
     """Root endpoint with service information."""
@@ -0,0 +1,233 @@
+# cache.py
+
+"""
+CVisionary Retrieval Service - Embedding and Result Caches
+
+Within one orchestrator session the same job description is retrieved against
+many times, and each retrieval used to pay for an /embed round trip and a
+model forward pass. `EmbeddingCache` keeps query vectors in a bounded
+in-process LRU with a TTL, keyed by a SHA-256 of the text, and optionally in a
+shared Redis store so replicas reuse each other's entries.
+
+Keys also carry the name of the model that produced the vector, as reported
+by the Embedding Service's /embed. When /embed reports a different model
+(e.g. after a re-embedding cutover), local entries are dropped and shared
+entries from the old model are no longer looked up. Cache hits make no /embed
+call, so a model change is only noticed at the next miss; until then, hits
+can still return old-model vectors for at most `JD_EMBED_CACHE_TTL_S`.
+
+Vectors are stored as packed little-endian float32 bytes, the same form the
+Embedding Service returns in msgpack mode; `utils._retrieve_body` turns them
+back into floats for JSON requests.
+
+`ResultCache` keeps whole `RetrieveResponse`s for repeated
+(user, namespace, section, job description, top_k) retrievals. Each entry
+remembers the `index_version` the Embedding Service searched, and is only
+served while that is still the index's current version, so results are never
+stale.
+
+Environment Variables:
+- JD_EMBED_CACHE_SIZE: Max entries in the in-process cache; 0 disables caching (default: 1024)
+- JD_EMBED_CACHE_TTL_S: Seconds an entry stays valid in either tier (default: 3600)
+- JD_EMBED_CACHE_REDIS_URL: Redis URL of the shared tier (optional, default: unset)
+- RESULT_CACHE_SIZE: Max cached retrieval responses; 0 disables the result cache (default: 1024)
+"""
+
+import hashlib
+import logging
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+
+from .metrics import (
+    JD_EMBED_CACHE_ENTRIES,
+    JD_EMBED_CACHE_REQUESTS,
+    RESULT_CACHE_ENTRIES,
+    RESULT_CACHE_REQUESTS,
+)
+from .schemas import RetrieveResponse
+from .utils import Embedding
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # The shared tier is optional
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "jd-embed"
+
+
+def pack_embedding(embedding: Embedding) -> bytes:
+    """Packed float32 bytes for a JSON float list; packed vectors pass through."""
+    if isinstance(embedding, bytes):
+        return embedding
+    return struct.pack(f"<{len(embedding)}f", *embedding)
+
+
+class EmbeddingCache:
+    """Two-tier TTL/LRU cache of query embeddings keyed by a hash of the text."""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl_s: float = 3600.0,
+        shared: Optional[Any] = None,
+        model: Optional[str] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.shared = shared
+        self.model = model
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    def key(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{KEY_PREFIX}:{self.model or 'default'}:{digest}"
+
+    def use_model(self, model: str) -> None:
+        """Key entries by `model` from now on, dropping local entries from another one."""
+        if model == self.model:
+            return
+        if self.model is not None:
+            logger.info(
+                f"[RETRIEVAL] Embedding model changed from {self.model} to {model}; "
+                f"dropping {len(self._entries)} cached embeddings"
+            )
+        self.model = model
+        self._entries.clear()
+        JD_EMBED_CACHE_ENTRIES.set(0)
+
+    async def get(self, text: str) -> Optional[bytes]:
+        """The cached vector for `text`, checking the local tier first."""
+        key = self.key(text)
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, vector = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                JD_EMBED_CACHE_REQUESTS.labels(tier="local", result="hit").inc()
+                return vector
+            del self._entries[key]
+        JD_EMBED_CACHE_REQUESTS.labels(tier="local", result="miss").inc()
+
+        if self.shared is None:
+            return None
+        try:
+            vector = await self.shared.get(key)
+        except Exception as e:
+            # A cache outage must not fail retrieval; fall back to /embed
+            logger.warning(f"[RETRIEVAL] Shared embedding cache read failed: {e}")
+            return None
+        JD_EMBED_CACHE_REQUESTS.labels(tier="shared", result="hit" if vector else "miss").inc()
+        if vector:
+            self._remember(key, vector)
+        return vector or None
+
+    async def put(self, text: str, embedding: Embedding, model: Optional[str] = None) -> None:
+        """Store the vector for `text`, produced by `model`, in both tiers."""
+        if model is not None:
+            self.use_model(model)
+        key = self.key(text)
+        vector = pack_embedding(embedding)
+        self._remember(key, vector)
+        if self.shared is None:
+            return
+        try:
+            await self.shared.set(key, vector, ex=max(1, int(self.ttl_s)))
+        except Exception as e:
+            logger.warning(f"[RETRIEVAL] Shared embedding cache write failed: {e}")
+
+    def _remember(self, key: str, vector: bytes) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl_s, vector)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        JD_EMBED_CACHE_ENTRIES.set(len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def close(self) -> None:
+        if self.shared is not None:
+            await self.shared.aclose()
+
+
+ResultKey = Tuple[str, str, Optional[str], str, int]
+
+
+class ResultCache:
+    """Bounded LRU of retrieval responses, validated by index version."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[ResultKey, RetrieveResponse]" = OrderedDict()
+
+    @staticmethod
+    def key(
+        user_id: str, namespace: str, section_id: Optional[str], job_description: str, top_k: int
+    ) -> ResultKey:
+        digest = hashlib.sha256(job_description.encode("utf-8")).hexdigest()
+        return (user_id, namespace, section_id, digest, top_k)
+
+    def peek(self, key: ResultKey) -> Optional[RetrieveResponse]:
+        """The cached response for `key`, not yet validated against the index."""
+        return self._entries.get(key)
+
+    def hit(self, key: ResultKey, current_version: Optional[str]) -> Optional[RetrieveResponse]:
+        """
+        The cached response for `key` if it was produced from `current_version`
+        of the index. A response from an older version is dropped.
+        """
+        response = self._entries.get(key)
+        if response is None:
+            RESULT_CACHE_REQUESTS.labels(result="miss").inc()
+            return None
+        if current_version is None or response.index_version != current_version:
+            del self._entries[key]
+            RESULT_CACHE_ENTRIES.set(len(self._entries))
+            RESULT_CACHE_REQUESTS.labels(result="stale").inc()
+            return None
+        self._entries.move_to_end(key)
+        RESULT_CACHE_REQUESTS.labels(result="hit").inc()
+        return response
+
+    def put(self, key: ResultKey, response: RetrieveResponse) -> None:
+        """Cache `response`; responses without an index version are not cacheable."""
+        if response.index_version is None:
+            return
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        RESULT_CACHE_ENTRIES.set(len(self._entries))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def result_cache_from_env() -> Optional[ResultCache]:
+    """Build the result cache from RESULT_CACHE_SIZE, or None when disabled."""
+    max_entries = int(os.getenv("RESULT_CACHE_SIZE", "1024"))
+    return ResultCache(max_entries) if max_entries > 0 else None
+
+
+def cache_from_env() -> Optional[EmbeddingCache]:
+    """Build the cache from JD_EMBED_CACHE_* settings, or None when disabled."""
+    max_entries = int(os.getenv("JD_EMBED_CACHE_SIZE", "1024"))
+    if max_entries <= 0:
+        return None
+    shared = None
+    redis_url = os.getenv("JD_EMBED_CACHE_REDIS_URL")
+    if redis_url:
+        if aioredis is None:
+            logger.warning("[RETRIEVAL] JD_EMBED_CACHE_REDIS_URL is set but redis is not installed")
+        else:
+            shared = aioredis.from_url(redis_url)
+    return EmbeddingCache(
+        max_entries=max_entries,
+        ttl_s=float(os.getenv("JD_EMBED_CACHE_TTL_S", "3600")),
+        shared=shared,
+    )
@@ -0,0 +1,78 @@
+"""
+Prometheus metrics for the retrieval service, exposed on `/metrics`.
+"""
+
+from prometheus_client import Counter, Gauge, Histogram
+
+JD_EMBED_CACHE_REQUESTS = Counter(
+    "retrieval_jd_embed_cache_requests_total",
+    "Job description embedding cache lookups, by tier ('local' or 'shared') and result ('hit' or 'miss')",
+    ["tier", "result"],
+)
+JD_EMBED_CACHE_ENTRIES = Gauge(
+    "retrieval_jd_embed_cache_entries",
+    "Job description embeddings held in the in-process cache",
+)
+RESULT_CACHE_REQUESTS = Counter(
+    "retrieval_result_cache_requests_total",
+    "Retrieval result cache lookups, by result ('hit', 'stale' or 'miss')",
+    ["result"],
+)
+RESULT_CACHE_ENTRIES = Gauge(
+    "retrieval_result_cache_entries",
+    "Retrieval responses held in the result cache",
+)
+SINGLE_FLIGHT_REQUESTS = Counter(
+    "retrieval_single_flight_requests_total",
+    "Calls through the request coalescer, by operation and role ('leader' started a "
+    "downstream call, 'shared' joined one already in flight)",
+    ["operation", "role"],
+)
+SINGLE_FLIGHT_IN_FLIGHT = Gauge(
+    "retrieval_single_flight_in_flight",
+    "Coalesced downstream calls currently in flight, by operation",
+    ["operation"],
+)
+REPLICA_REQUESTS = Counter(
+    "retrieval_embedding_replica_requests_total",
+    "Calls to Embedding Service replicas, by replica and outcome "
+    "('ok', 'rejected' for 4xx, 'error' for 5xx/network, 'cancelled' for lost hedges)",
+    ["replica", "outcome"],
+)
+REPLICA_OUTSTANDING = Gauge(
+    "retrieval_embedding_replica_outstanding",
+    "Calls in flight to each Embedding Service replica",
+    ["replica"],
+)
+REPLICA_EJECTIONS = Counter(
+    "retrieval_embedding_replica_ejections_total",
+    "Times a replica was ejected after consecutive failures",
+    ["replica"],
+)
+HEDGED_REQUESTS = Counter(
+    "retrieval_hedged_requests_total",
+    "Calls that sent a hedge to a second replica, by operation and which attempt won",
+    ["operation", "winner"],
+)
+BREAKER_STATE = Gauge(
+    "retrieval_circuit_breaker_state",
+    "Circuit breaker state per downstream operation (0 closed, 1 half-open, 2 open)",
+    ["operation"],
+)
+BREAKER_REJECTIONS = Counter(
+    "retrieval_circuit_breaker_rejections_total",
+    "Calls failed fast because the operation's circuit breaker was open",
+    ["operation"],
+)
+RETRIES = Counter(
+    "retrieval_embedding_retries_total",
+    "Retries and hedges requested from the retry budget, by outcome ('allowed' or 'denied')",
+    ["outcome"],
+)
+STAGE_DURATION = Histogram(
+    "retrieval_stage_duration_seconds",
+    "Time spent per retrieval request in each stage ('parse', 'cache', 'version', 'embed', "
+    "'search', 'decode', 'coalesced') and in 'total', by endpoint",
+    ["endpoint", "stage"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
@@ -0,0 +1,272 @@
+# replicas.py
+
+"""
+CVisionary Retrieval Service - Embedding Service Replica Pool
+
+With several Embedding Service replicas (`EMBEDDING_SERVICE_URLS`), stateless
+calls (`/embed`, see `STATELESS_OPERATIONS`) go through a `ReplicaPool`:
+
+- Least outstanding requests: each call goes to the healthy replica with the
+  fewest requests in flight from this process (ties broken at random).
+- Passive health ejection: a replica that fails `REPLICA_EJECT_AFTER` calls in
+  a row (5xx or network error) is skipped for `REPLICA_EJECT_S` seconds. If
+  every replica is ejected, they are tried anyway rather than failing fast.
+- Hedged requests: if the first attempt has not answered within the recent
+  p95 latency of that operation, a second attempt is sent to another replica
+  and whichever answers first wins; the other is cancelled. Only stateless
+  reads are hedged, so duplicates are harmless.
+- Retries go to a different replica immediately instead of sleeping. Retries
+  and hedges both spend from the retry budget (resilience.py), so neither
+  multiplies load during an incident.
+
+Each Embedding Service process keeps its own FAISS indices, so replicas are
+not interchangeable for user-scoped calls (`/retrieve/{user_id}`,
+`/index/{user_id}/version`): a user's chunks live only on the instance that
+indexed them. Those calls always go to the first URL, which must be the
+instance holding every user's indices or the shard router in front of them
+(`embedding_service.router`). The remaining URLs only serve `/embed`.
+
+The pool is generic: callers pass a coroutine function taking a replica base
+URL, and signal "try another replica" by raising `ReplicaError`.
+
+Environment Variables:
+- EMBEDDING_SERVICE_URLS: Comma-separated replica base URLs (falls back to EMBEDDING_SERVICE_URL)
+- EMBEDDING_HEDGING: "false" disables hedged requests (default: true)
+- HEDGE_PERCENTILE: Latency percentile that triggers a hedge (default: 0.95)
+- HEDGE_DEFAULT_DELAY_S: Hedge delay until enough latencies are observed (default: 0.25)
+- HEDGE_MIN_DELAY_S: Lower bound on the hedge delay (default: 0.005)
+- REPLICA_EJECT_AFTER: Consecutive failures before a replica is ejected (default: 3)
+- REPLICA_EJECT_S: Seconds an ejected replica is skipped (default: 10)
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterable, List, Optional, TypeVar
+
+from .metrics import HEDGED_REQUESTS, REPLICA_EJECTIONS, REPLICA_OUTSTANDING, REPLICA_REQUESTS
+from .resilience import RetryBudget, retry_budget
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Operations any replica can answer; everything else is user-scoped
+STATELESS_OPERATIONS = frozenset({"embed"})
+
+# Latencies kept per operation for the hedge percentile
+LATENCY_WINDOW = 256
+MIN_LATENCY_SAMPLES = 20
+
+
+class ReplicaError(Exception):
+    """A replica failed in a way another replica may not; wraps the error to surface."""
+
+    def __init__(self, error: Exception):
+        super().__init__(str(error))
+        self.error = error
+
+
+class Replica:
+    """One Embedding Service base URL and its passive health state."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.ejected_until = 0.0
+
+    def ejected(self, now: float) -> bool:
+        return self.ejected_until > now
+
+    def snapshot(self, now: float) -> Dict[str, object]:
+        return {
+            "url": self.url,
+            "outstanding": self.outstanding,
+            "consecutive_failures": self.consecutive_failures,
+            "ejected": self.ejected(now),
+        }
+
+
+class ReplicaPool:
+    """Load-balanced, hedged calls across Embedding Service replicas."""
+
+    def __init__(
+        self,
+        urls: Iterable[str],
+        max_attempts: int = 2,
+        hedging: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_default_delay_s: float = 0.25,
+        hedge_min_delay_s: float = 0.005,
+        eject_after: int = 3,
+        eject_s: float = 10.0,
+        budget: Optional[RetryBudget] = None,
+    ):
+        self.replicas = [Replica(url.rstrip("/")) for url in urls]
+        if not self.replicas:
+            raise ValueError("A replica pool needs at least one URL")
+        self.max_attempts = max_attempts
+        self.hedging = hedging
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_delay_s = hedge_default_delay_s
+        self.hedge_min_delay_s = hedge_min_delay_s
+        self.eject_after = eject_after
+        self.eject_s = eject_s
+        self.budget = budget
+        self._latencies: Dict[str, Deque[float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.replicas)
+
+    def pick(self, exclude: Iterable[Replica] = ()) -> Optional[Replica]:
+        """The healthy replica with the fewest requests in flight, not in `exclude`."""
+        excluded = set(map(id, exclude))
+        candidates = [r for r in self.replicas if id(r) not in excluded]
+        now = time.monotonic()
+        healthy = [r for r in candidates if not r.ejected(now)]
+        candidates = healthy or candidates
+        if not candidates:
+            return None
+        fewest = min(r.outstanding for r in candidates)
+        return random.choice([r for r in candidates if r.outstanding == fewest])
+
+    def hedge_delay(self, operation: str) -> float:
+        """How long to wait on the first attempt of `operation` before hedging."""
+        samples = self._latencies.get(operation)
+        if not samples or len(samples) < MIN_LATENCY_SAMPLES:
+            return self.hedge_default_delay_s
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(self.hedge_percentile * len(ordered)))
+        return max(self.hedge_min_delay_s, ordered[index])
+
+    async def call(self, operation: str, fn: Callable[[str], Awaitable[T]]) -> T:
+        """
+        Run `fn(base_url)` against the pool. `ReplicaError`s move on to another
+        replica, up to `max_attempts` hedged attempts while the retry budget
+        allows, and the last one is raised; any other exception is raised as is.
+        """
+        tried: List[Replica] = []
+        last_error: Optional[ReplicaError] = None
+        for attempt in range(self.max_attempts):
+            if attempt > 0 and not self._may_retry():
+                break
+            try:
+                return await self._hedged(operation, fn, tried)
+            except ReplicaError as e:
+                last_error = e
+                logger.warning(f"[RETRIEVAL] {operation} failed on a replica: {e}")
+        raise last_error
+
+    def _may_retry(self) -> bool:
+        return self.budget is None or self.budget.try_spend()
+
+    async def _hedged(self, operation: str, fn: Callable[[str], Awaitable[T]], tried: List[Replica]) -> T:
+        primary = self.pick(exclude=tried) or self.pick()
+        tried.append(primary)
+        attempts = {asyncio.ensure_future(self._attempt(operation, primary, fn)): "primary"}
+        pending = set(attempts)
+        error: Optional[ReplicaError] = None
+        try:
+            if self.hedging and len(self.replicas) > 1:
+                done, pending = await asyncio.wait(pending, timeout=self.hedge_delay(operation))
+                backup = None if done or not self._may_retry() else self.pick(exclude=tried)
+                if backup is not None:
+                    tried.append(backup)
+                    hedge = asyncio.ensure_future(self._attempt(operation, backup, fn))
+                    attempts[hedge] = "hedge"
+                    pending.add(hedge)
+                pending |= done
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    exc = task.exception()
+                    if exc is None:
+                        if len(attempts) > 1:
+                            HEDGED_REQUESTS.labels(operation=operation, winner=attempts[task]).inc()
+                        return task.result()
+                    if not isinstance(exc, ReplicaError):
+                        raise exc
+                    error = exc
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(self, operation: str, replica: Replica, fn: Callable[[str], Awaitable[T]]) -> T:
+        replica.outstanding += 1
+        REPLICA_OUTSTANDING.labels(replica=replica.url).inc()
+        start = time.monotonic()
+        try:
+            result = await fn(replica.url)
+        except ReplicaError:
+            self._failed(replica)
+            REPLICA_REQUESTS.labels(replica=replica.url, outcome="error").inc()
+            raise
+        except asyncio.CancelledError:
+            REPLICA_REQUESTS.labels(replica=replica.url, outcome="cancelled").inc()
+            raise
+        except Exception:
+            # The replica answered; the request itself was rejected
+            replica.consecutive_failures = 0
+            REPLICA_REQUESTS.labels(replica=replica.url, outcome="rejected").inc()
+            raise
+        else:
+            replica.consecutive_failures = 0
+            self._latencies.setdefault(operation, deque(maxlen=LATENCY_WINDOW)).append(
+                time.monotonic() - start
+            )
+            REPLICA_REQUESTS.labels(replica=replica.url, outcome="ok").inc()
+            return result
+        finally:
+            replica.outstanding -= 1
+            REPLICA_OUTSTANDING.labels(replica=replica.url).dec()
+
+    def _failed(self, replica: Replica) -> None:
+        replica.consecutive_failures += 1
+        if replica.consecutive_failures >= self.eject_after and not replica.ejected(time.monotonic()):
+            replica.ejected_until = time.monotonic() + self.eject_s
+            REPLICA_EJECTIONS.labels(replica=replica.url).inc()
+            logger.warning(
+                f"[RETRIEVAL] Ejecting replica {replica.url} for {self.eject_s:.0f}s after "
+                f"{replica.consecutive_failures} consecutive failures"
+            )
+
+    def snapshot(self) -> List[Dict[str, object]]:
+        now = time.monotonic()
+        return [replica.snapshot(now) for replica in self.replicas]
+
+
+def replica_urls() -> List[str]:
+    """Configured replica base URLs: EMBEDDING_SERVICE_URLS, else EMBEDDING_SERVICE_URL."""
+    value = os.getenv("EMBEDDING_SERVICE_URLS") or os.getenv("EMBEDDING_SERVICE_URL") or ""
+    return [url.strip().rstrip("/") for url in value.split(",") if url.strip()]
+
+
+_pools: Dict[tuple, ReplicaPool] = {}
+
+
+def replica_pool(max_attempts: int = 2) -> Optional[ReplicaPool]:
+    """The pool for the configured URLs (rebuilt if they change), or None if unset."""
+    urls = tuple(replica_urls())
+    if not urls:
+        return None
+    pool = _pools.get(urls)
+    if pool is None:
+        pool = ReplicaPool(
+            urls,
+            max_attempts=max_attempts,
+            hedging=os.getenv("EMBEDDING_HEDGING", "true").lower() == "true",
+            hedge_percentile=float(os.getenv("HEDGE_PERCENTILE", "0.95")),
+            hedge_default_delay_s=float(os.getenv("HEDGE_DEFAULT_DELAY_S", "0.25")),
+            hedge_min_delay_s=float(os.getenv("HEDGE_MIN_DELAY_S", "0.005")),
+            eject_after=int(os.getenv("REPLICA_EJECT_AFTER", "3")),
+            eject_s=float(os.getenv("REPLICA_EJECT_S", "10")),
+            budget=retry_budget,
+        )
+        _pools.clear()
+        _pools[urls] = pool
+    return pool
@@ -0,0 +1,135 @@
+# resilience.py
+
+"""
+CVisionary Retrieval Service - Circuit Breakers and Retry Budget
+
+Retrying every 5xx and connection error unconditionally turns an Embedding
+Service brownout into a retry storm: each retrieval waits out its timeouts,
+retries, and adds load to the struggling service. This module bounds that:
+
+- `CircuitBreaker`: one per downstream operation (`embed`, `retrieve`,
+  `version`). After `BREAKER_FAILURE_THRESHOLD` consecutive failed calls the
+  breaker opens and calls fail immediately. After `BREAKER_RESET_S` it goes
+  half-open and lets a single probe through; the probe's outcome closes or
+  re-opens it. Replica ejection (replicas.py) handles one bad replica; the
+  breaker handles the service as a whole.
+- `RetryBudget`: one for the process. Every call deposits `RETRY_BUDGET_RATIO`
+  tokens and every retry or hedge spends one, so sustained retries stay below
+  that fraction of traffic. The bucket holds at most `RETRY_BUDGET_RESERVE`
+  tokens, which is also the burst allowed when traffic is low.
+- `backoff_delay`: exponential backoff with full jitter between retries.
+"""
+
+import os
+import random
+import time
+from typing import Dict
+
+from .metrics import BREAKER_REJECTIONS, BREAKER_STATE, RETRIES
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker over consecutive call failures."""
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_s: float = 10.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        BREAKER_STATE.labels(operation=name).set(_STATE_VALUES[CLOSED])
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now. Counts a rejection if not."""
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout_s:
+            self._set_state(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        BREAKER_REJECTIONS.labels(operation=self.name).inc()
+        return False
+
+    def record_success(self) -> None:
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+        if self.state != CLOSED:
+            self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    def release(self) -> None:
+        """Forget a call that ended without an outcome (e.g. was cancelled)."""
+        self._probe_in_flight = False
+
+    def _set_state(self, state: str) -> None:
+        self.state = state
+        BREAKER_STATE.labels(operation=self.name).set(_STATE_VALUES[state])
+
+
+class RetryBudget:
+    """Token bucket limiting retries to a fraction of requests."""
+
+    def __init__(self, ratio: float = 0.2, reserve: float = 10.0):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = reserve
+
+    def record_request(self) -> None:
+        self.tokens = min(self.reserve, self.tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        """Take one token for a retry or hedge; False when the budget is exhausted."""
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            RETRIES.labels(outcome="allowed").inc()
+            return True
+        RETRIES.labels(outcome="denied").inc()
+        return False
+
+
+def backoff_delay(attempt: int, base_s: float, cap_s: float) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (1-based)."""
+    return random.uniform(0, min(cap_s, base_s * 2 ** (attempt - 1)))
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+retry_budget = RetryBudget(
+    ratio=float(os.getenv("RETRY_BUDGET_RATIO", "0.2")),
+    reserve=float(os.getenv("RETRY_BUDGET_RESERVE", "10")),
+)
+
+
+def breaker(operation: str) -> CircuitBreaker:
+    """The circuit breaker for a downstream operation."""
+    if operation not in _breakers:
+        _breakers[operation] = CircuitBreaker(
+            operation,
+            failure_threshold=int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5")),
+            reset_timeout_s=float(os.getenv("BREAKER_RESET_S", "10")),
+        )
+    return _breakers[operation]
+
+
+def breaker_states() -> Dict[str, str]:
+    """Current state of every breaker, for /health."""
+    return {name: b.state for name, b in sorted(_breakers.items())}
+
+
+def reset() -> None:
+    """Forget all breaker state and refill the retry budget."""
+    _breakers.clear()
+    retry_budget.tokens = retry_budget.reserve
@@ -7,10 +7,12 @@ This module defines the request and response models for the Retrieval Service.
 """
 
 import os
-from typing import List, Optional
-from pydantic import BaseModel, Field
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, Field, field_validator
 from datetime import datetime
 
+Namespace = Literal["profile", "resume_sections"]
+
 
 class FullRetrieveRequest(BaseModel):
     """
@@ -41,6 +43,61 @@ class SectionRetrieveRequest(BaseModel):
     )
 
 
+class SectionsRetrieveRequest(BaseModel):
+    """
+    Request model for context retrieval across several resume sections at once.
+    """
+    user_id: str = Field(..., description="User identifier for profile lookup", min_length=1)
+    section_ids: List[str] = Field(
+        ..., description="Resume section identifiers", min_length=1, max_length=50
+    )
+    job_description: str = Field(..., description="Job posting text for relevance matching", min_length=1)
+    top_k: int = Field(
+        default_factory=lambda: int(os.getenv("DEFAULT_TOP_K", "5")),
+        description="Number of chunks to retrieve per section",
+        ge=1,
+        le=50,
+    )
+    include_profile: bool = Field(
+        False, description="Also retrieve full-profile context for the job description"
+    )
+
+
+class FusedRetrieveRequest(BaseModel):
+    """
+    Request model for retrieval fused across several index namespaces.
+    """
+    user_id: str = Field(..., description="User identifier for profile lookup", min_length=1)
+    job_description: str = Field(..., description="Job posting text for relevance matching", min_length=1)
+    top_k: int = Field(
+        default_factory=lambda: int(os.getenv("DEFAULT_TOP_K", "5")),
+        description="Number of chunks to return after merging",
+        ge=1,
+        le=50,
+    )
+    namespaces: List[Namespace] = Field(
+        default_factory=lambda: ["profile", "resume_sections"],
+        description="Index namespaces to search concurrently",
+        min_length=1,
+    )
+    quotas: Dict[Namespace, int] = Field(
+        default_factory=dict,
+        description="Maximum number of merged results from each namespace (default: no limit)",
+    )
+
+    @field_validator("namespaces")
+    @classmethod
+    def dedupe_namespaces(cls, value: List[str]) -> List[str]:
+        return list(dict.fromkeys(value))
+
+    @field_validator("quotas")
+    @classmethod
+    def check_quotas(cls, value: Dict[str, int]) -> Dict[str, int]:
+        if any(quota < 0 for quota in value.values()):
+            raise ValueError("quotas must not be negative")
+        return value
+
+
 class ChunkItem(BaseModel):
     """
     Model representing a retrieved chunk item from the Embedding Service.
@@ -65,9 +122,31 @@ class RetrieveResponse(BaseModel):
     results: List[ChunkItem] = Field(
         ..., description="List of retrieved chunks ordered by relevance score (descending)"
     )
+    index_version: Optional[str] = Field(
+        None, description="Version of the searched index in the Embedding Service; changes whenever the index does"
+    )
+
+
+class SectionsRetrieveResponse(BaseModel):
+    """
+    Response model for multi-section retrieval, grouped by section.
+    """
+    sections: Dict[str, RetrieveResponse] = Field(
+        ..., description="Retrieval results keyed by section_id, in request order"
+    )
+    profile: Optional[RetrieveResponse] = Field(
+        None, description="Full-profile results, when include_profile was set"
+    )
 
 
 class HealthResponse(BaseModel):
     """Response model for health check endpoint."""
     status: str = Field(..., description="Service health status")
-    service: str = Field(default="retrieval", description="Service name")
\ No newline at end of file
+    service: str = Field(default="retrieval", description="Service name")
+    circuit_breakers: Dict[str, str] = Field(
+        default_factory=dict,
+        description="State of each downstream operation's circuit breaker ('closed', 'half_open' or 'open')",
+    )
+    retry_budget: float = Field(
+        default=0.0, description="Retry tokens currently available to downstream calls"
+    )
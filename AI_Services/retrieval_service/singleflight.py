@@ -0,0 +1,64 @@
+# singleflight.py
+
+"""
+CVisionary Retrieval Service - Request Coalescing
+
+Agent loops often send the same retrieval from several places at once (the
+orchestrator's tool call and the generator's `/generate/*` call for the same
+user and job description). `SingleFlight` lets concurrent identical calls share
+one in-flight downstream call: the first caller for a key starts it, later
+callers await the same task, and the key is released as soon as it finishes,
+so nothing is cached beyond the flight itself.
+
+The shared call runs as its own task, so a caller that disconnects (and is
+cancelled) does not cancel the call for everyone else waiting on it.
+"""
+
+import asyncio
+from typing import Awaitable, Callable, Dict, Hashable, TypeVar
+
+from .metrics import SINGLE_FLIGHT_IN_FLIGHT, SINGLE_FLIGHT_REQUESTS
+from .timing import stage
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one."""
+
+    def __init__(self, operation: str):
+        self.operation = operation
+        self._flights: Dict[Hashable, "asyncio.Task"] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Await `fn()`, or the already running call for `key` if there is one.
+        Every caller gets the same result or the same exception.
+        """
+        task = self._flights.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._flights[key] = task
+            task.add_done_callback(lambda t, key=key: self._land(key, t))
+            self.leaders += 1
+            SINGLE_FLIGHT_REQUESTS.labels(operation=self.operation, role="leader").inc()
+            SINGLE_FLIGHT_IN_FLIGHT.labels(operation=self.operation).inc()
+            return await asyncio.shield(task)
+        self.shared += 1
+        SINGLE_FLIGHT_REQUESTS.labels(operation=self.operation, role="shared").inc()
+        # The leader's request is charged for the call's stages; joiners just wait
+        with stage("coalesced"):
+            return await asyncio.shield(task)
+
+    def _land(self, key: Hashable, task: "asyncio.Task") -> None:
+        if self._flights.get(key) is task:
+            del self._flights[key]
+        SINGLE_FLIGHT_IN_FLIGHT.labels(operation=self.operation).dec()
+        # Mark the exception as retrieved even if every waiter was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def __len__(self) -> int:
+        return len(self._flights)
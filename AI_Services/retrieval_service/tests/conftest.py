@@ -17,6 +17,7 @@ os.environ["DEFAULT_TOP_K"] = "5"
 
 # Now import the app and its dependencies
 from app import app, get_http_client
+import resilience
 
 # --- Sample Data for Mocks ---
 
@@ -53,7 +54,15 @@ MOCK_EMBEDDING_SERVICE_RESPONSE = {
 }
 
 # A sample response from the embedding service's /embed endpoint
-MOCK_EMBED_RESPONSE = {"embedding": SAMPLE_EMBEDDING}
+MOCK_EMBED_RESPONSE = {"embedding": SAMPLE_EMBEDDING, "model": "all-MiniLM-L6-v2"}
+
+
+@pytest.fixture(autouse=True)
+def reset_resilience():
+    """Start every test with closed circuit breakers and a full retry budget."""
+    resilience.reset()
+    yield
+    resilience.reset()
 
 
 @pytest.fixture(scope="function")
@@ -1,10 +1,15 @@
 # AI_Services/retrieval_service/tests/test_app.py
 
+import asyncio
+import json
+
 import pytest
 from unittest.mock import AsyncMock, MagicMock
 import httpx
 from fastapi import status
 
+from app import app
+
 from conftest import (
     USER_ID,
     SECTION_ID,
@@ -19,7 +24,10 @@ async def test_health_check(test_client_and_mock):
     client, _ = test_client_and_mock
     response = client.get("/health")
     assert response.status_code == status.HTTP_200_OK
-    assert response.json() == {"status": "ok", "service": "retrieval"}
+    data = response.json()
+    assert (data["status"], data["service"]) == ("ok", "retrieval")
+    assert data["circuit_breakers"] == {}
+    assert data["retry_budget"] == 10
 
 
 @pytest.mark.asyncio
@@ -161,6 +169,305 @@ async def test_retrieve_full_context_embedding_service_fails(test_client_and_moc
 
     # Assert
     assert response.status_code == status.HTTP_502_BAD_GATEWAY
-    assert "Failed to generate embedding" in response.json()["error"]
+    assert "Network error connecting to embedding service" in response.json()["error"]
     # We expect MAX_RETRIES + 1 calls (initial call + retries)
-    assert mock_http_client.request.call_count == 2  # 1 initial + 1 retry
\ No newline at end of file
+    assert mock_http_client.request.call_count == 2  # 1 initial + 1 retry
+
+@pytest.mark.asyncio
+async def test_retrieve_full_context_server_side_embedding(test_client_and_mock, monkeypatch):
+    """Test that EMBED_QUERY_SERVER_SIDE sends query_text and skips the /embed hop."""
+    client, mock_http_client = test_client_and_mock
+    monkeypatch.setenv("EMBED_QUERY_SERVER_SIDE", "true")
+
+    mock_http_client.request.side_effect = [
+        httpx.Response(200, json=MOCK_EMBEDDING_SERVICE_RESPONSE, request=httpx.Request("POST", f"http://test/retrieve/{USER_ID}")),
+    ]
+
+    response = client.post(
+        "/retrieve/full",
+        json={"user_id": USER_ID, "job_description": "A great job.", "top_k": 2},
+    )
+
+    assert response.status_code == 200
+    assert len(response.json()["results"]) == 2
+    assert mock_http_client.request.call_count == 1
+    retrieve_call_args = mock_http_client.request.call_args_list[0]
+    assert str(retrieve_call_args[0][1]).endswith(f"/retrieve/{USER_ID}")
+    assert retrieve_call_args[1]["json"] == {
+        "query_text": "A great job.",
+        "top_k": 2,
+        "index_namespace": "profile",
+    }
+
+
+@pytest.mark.asyncio
+async def test_repeated_job_description_is_embedded_once(test_client_and_mock):
+    """Test that a second retrieval with the same job description skips /embed."""
+    client, mock_http_client = test_client_and_mock
+
+    def respond(method, url, **kwargs):
+        body = MOCK_EMBED_RESPONSE if str(url).endswith("/embed") else MOCK_EMBEDDING_SERVICE_RESPONSE
+        return httpx.Response(200, json=body, request=httpx.Request(method, url))
+
+    mock_http_client.request.side_effect = respond
+
+    client.post("/retrieve/full", json={"user_id": USER_ID, "job_description": "A great job."})
+    response = client.post(
+        "/retrieve/section",
+        json={"user_id": USER_ID, "section_id": SECTION_ID, "job_description": "A great job."},
+    )
+
+    assert response.status_code == 200
+    urls = [str(call[0][1]) for call in mock_http_client.request.call_args_list]
+    assert [url.endswith("/embed") for url in urls] == [True, False, False]
+    # The cached vector is sent as floats in JSON mode
+    assert mock_http_client.request.call_args_list[2][1]["json"]["query_embedding"] == pytest.approx(SAMPLE_EMBEDDING)
+    assert "retrieval_jd_embed_cache_requests_total" in client.get("/metrics").text
+
+
+@pytest.mark.asyncio
+async def test_result_cache_is_validated_by_index_version(test_client_and_mock):
+    """Test that a repeated retrieval is served from cache until the index version changes."""
+    client, mock_http_client = test_client_and_mock
+    version = {"current": "epoch.1"}
+
+    def respond(method, url, **kwargs):
+        url = str(url)
+        if url.endswith("/embed"):
+            body = MOCK_EMBED_RESPONSE
+        elif url.endswith("/version"):
+            body = {"user_id": USER_ID, "index_namespace": "profile", "index_version": version["current"]}
+        else:
+            body = {**MOCK_EMBEDDING_SERVICE_RESPONSE, "index_version": version["current"]}
+        return httpx.Response(200, json=body, request=httpx.Request(method, url))
+
+    mock_http_client.request.side_effect = respond
+    request = {"user_id": USER_ID, "job_description": "A great job.", "top_k": 2}
+
+    first = client.post("/retrieve/full", json=request).json()
+    assert first["index_version"] == "epoch.1"
+    assert client.post("/retrieve/full", json=request).json() == first
+    paths = [str(call[0][1]).rsplit("/", 1)[-1] for call in mock_http_client.request.call_args_list]
+    assert paths == ["embed", USER_ID, "version"]
+
+    # A write to the index makes the cached response stale
+    version["current"] = "epoch.2"
+    mock_http_client.request.reset_mock()
+    assert client.post("/retrieve/full", json=request).json()["index_version"] == "epoch.2"
+    paths = [str(call[0][1]).rsplit("/", 1)[-1] for call in mock_http_client.request.call_args_list]
+    assert paths == ["version", USER_ID]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_retrievals_are_coalesced(test_client_and_mock):
+    """Test that a burst of identical requests makes one embed and one search call."""
+    _, mock_http_client = test_client_and_mock
+
+    async def respond(method, url, **kwargs):
+        await asyncio.sleep(0.02)
+        body = MOCK_EMBED_RESPONSE if str(url).endswith("/embed") else MOCK_EMBEDDING_SERVICE_RESPONSE
+        return httpx.Response(200, json=body, request=httpx.Request(method, url))
+
+    mock_http_client.request.side_effect = respond
+    request = {"user_id": USER_ID, "job_description": "A great job.", "top_k": 2}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = await asyncio.gather(
+            *(client.post("/retrieve/full", json=request) for _ in range(5))
+        )
+
+    assert all(r.status_code == 200 for r in responses)
+    assert len({r.text for r in responses}) == 1
+    assert mock_http_client.request.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_retrieve_sections_embeds_once_and_groups_by_section(test_client_and_mock):
+    """Test that /retrieve/sections embeds the job description once and fans out the searches."""
+    client, mock_http_client = test_client_and_mock
+
+    def respond(method, url, **kwargs):
+        if str(url).endswith("/embed"):
+            return httpx.Response(200, json=MOCK_EMBED_RESPONSE, request=httpx.Request(method, url))
+        payload = kwargs["json"]
+        section_ids = payload.get("filter_by_section_ids") or [None]
+        results = [
+            {**MOCK_EMBEDDING_SERVICE_RESPONSE["results"][0], "index_namespace": payload["index_namespace"], "section_id": section_ids[0]}
+        ]
+        return httpx.Response(200, json={"results": results}, request=httpx.Request(method, url))
+
+    mock_http_client.request.side_effect = respond
+
+    response = client.post(
+        "/retrieve/sections",
+        json={
+            "user_id": USER_ID,
+            "section_ids": ["exp-1", "proj-2", "exp-1"],
+            "job_description": "A great job.",
+            "top_k": 3,
+            "include_profile": True,
+        },
+    )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert list(data["sections"]) == ["exp-1", "proj-2"]
+    assert data["sections"]["proj-2"]["results"][0]["section_id"] == "proj-2"
+    assert data["profile"]["results"][0]["index_namespace"] == "profile"
+    urls = [str(call[0][1]) for call in mock_http_client.request.call_args_list]
+    assert sum(url.endswith("/embed") for url in urls) == 1
+    assert len(urls) == 4
+
+    response = client.post(
+        "/retrieve/sections",
+        json={"user_id": USER_ID, "section_ids": [], "job_description": "A great job."},
+    )
+    assert response.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_retrieve_fused_queries_namespaces_concurrently(test_client_and_mock):
+    """Test that /retrieve/fused searches each namespace and merges the results."""
+    client, mock_http_client = test_client_and_mock
+    section_chunk = {
+        **MOCK_EMBEDDING_SERVICE_RESPONSE["results"][0],
+        "chunk_id": "section-1",
+        "index_namespace": "resume_sections",
+        "section_id": SECTION_ID,
+        "text": "Led a team of engineers!",
+        "score": 0.99,
+    }
+
+    def respond(method, url, **kwargs):
+        if str(url).endswith("/embed"):
+            body = MOCK_EMBED_RESPONSE
+        elif kwargs["json"]["index_namespace"] == "resume_sections":
+            body = {"results": [section_chunk]}
+        else:
+            body = MOCK_EMBEDDING_SERVICE_RESPONSE
+        return httpx.Response(200, json=body, request=httpx.Request(method, url))
+
+    mock_http_client.request.side_effect = respond
+
+    response = client.post(
+        "/retrieve/fused",
+        json={"user_id": USER_ID, "job_description": "A great job.", "top_k": 3},
+    )
+
+    assert response.status_code == 200
+    # chunk-1 is a near-duplicate of the higher-scoring section chunk
+    assert [r["chunk_id"] for r in response.json()["results"]] == ["section-1", "chunk-2"]
+    retrieve_calls = [c for c in mock_http_client.request.call_args_list if "json" in c[1] and "top_k" in c[1]["json"]]
+    assert sorted(c[1]["json"]["index_namespace"] for c in retrieve_calls) == ["profile", "resume_sections"]
+    assert all(c[1]["json"]["top_k"] == 6 for c in retrieve_calls)
+
+    # A zero quota skips the namespace entirely
+    mock_http_client.request.reset_mock()
+    response = client.post(
+        "/retrieve/fused",
+        json={"user_id": USER_ID, "job_description": "A great job.", "quotas": {"resume_sections": 0}},
+    )
+    assert [r["index_namespace"] for r in response.json()["results"]] == ["profile", "profile"]
+
+
+@pytest.mark.asyncio
+async def test_retrieval_responses_carry_server_timing(test_client_and_mock):
+    """Test that retrieval responses break their latency down by stage."""
+    client, mock_http_client = test_client_and_mock
+
+    def respond(method, url, **kwargs):
+        body = MOCK_EMBED_RESPONSE if str(url).endswith("/embed") else MOCK_EMBEDDING_SERVICE_RESPONSE
+        return httpx.Response(200, json=body, request=httpx.Request(method, url))
+
+    mock_http_client.request.side_effect = respond
+
+    response = client.post("/retrieve/full", json={"user_id": USER_ID, "job_description": "A great job."})
+
+    assert response.status_code == 200
+    stages = dict(part.split(";dur=") for part in response.headers["Server-Timing"].split(", "))
+    assert set(stages) == {"parse", "cache", "embed", "search", "decode", "total"}
+    assert all(float(ms) >= 0 for ms in stages.values())
+    assert float(stages["total"]) >= float(stages["embed"]) + float(stages["search"])
+
+    assert "Server-Timing" not in client.get("/health").headers
+    metrics = client.get("/metrics").text
+    assert 'retrieval_stage_duration_seconds_count{endpoint="/retrieve/full",stage="embed"}' in metrics
+
+
+def _ndjson_downstream(mock_http_client, *responses):
+    """Answer streamed /retrieve calls with `responses`, in order."""
+    mock_http_client.build_request.side_effect = lambda method, url, **kwargs: httpx.Request(method, url, **kwargs)
+    mock_http_client.send = AsyncMock(side_effect=list(responses))
+
+
+def _ndjson_body(results, index_version="v1"):
+    content = b"".join(json.dumps(chunk).encode() + b"\n" for chunk in results)
+    return httpx.Response(
+        200, content=content,
+        headers={"Content-Type": "application/x-ndjson", "X-Index-Version": index_version},
+        request=httpx.Request("POST", f"http://test/retrieve/{USER_ID}"),
+    )
+
+
+@pytest.mark.asyncio
+async def test_retrieve_full_context_streams_ndjson(test_client_and_mock):
+    """Test that retrieval streams one chunk per line when NDJSON is accepted."""
+    client, mock_http_client = test_client_and_mock
+
+    def respond(method, url, **kwargs):
+        if str(url).endswith("/embed"):
+            body = MOCK_EMBED_RESPONSE
+        elif "/version" in str(url):
+            body = {"index_version": "v1"}
+        else:
+            body = {**MOCK_EMBEDDING_SERVICE_RESPONSE, "index_version": "v1"}
+        return httpx.Response(200, json=body, request=httpx.Request(method, url))
+
+    mock_http_client.request.side_effect = respond
+    results = MOCK_EMBEDDING_SERVICE_RESPONSE["results"]
+    _ndjson_downstream(mock_http_client, _ndjson_body(results), _ndjson_body(results))
+    request = {"user_id": USER_ID, "job_description": "A great job.", "top_k": 2}
+    headers = {"Accept": "application/x-ndjson"}
+
+    response = client.post("/retrieve/full", json=request, headers=headers)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert response.headers["x-index-version"] == "v1"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["chunk_id"] for line in lines] == ["chunk-1", "chunk-2"]
+    downstream = mock_http_client.send.call_args[0][0]
+    assert downstream.headers["accept"] == "application/x-ndjson"
+    assert mock_http_client.send.call_args[1] == {"stream": True}
+
+    # Streams do not fill the result cache...
+    assert client.post("/retrieve/full", json=request, headers=headers).text == response.text
+    assert mock_http_client.send.call_count == 2
+
+    # ...but are served from it once a JSON retrieval has
+    assert client.post("/retrieve/full", json=request).json()["results"] == lines
+    cached = client.post("/retrieve/full", json=request, headers=headers)
+    assert cached.text == response.text
+    assert mock_http_client.send.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_streamed_retrieval_errors_are_plain_json(test_client_and_mock):
+    """Test that a downstream failure before streaming gets the usual error response."""
+    client, mock_http_client = test_client_and_mock
+    mock_http_client.request.side_effect = [
+        httpx.Response(200, json=MOCK_EMBED_RESPONSE, request=httpx.Request("POST", "http://test/embed")),
+    ]
+    _ndjson_downstream(
+        mock_http_client, httpx.Response(404, request=httpx.Request("POST", f"http://test/retrieve/{USER_ID}"))
+    )
+
+    response = client.post(
+        "/retrieve/section",
+        json={"user_id": USER_ID, "section_id": SECTION_ID, "job_description": "A great job."},
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert response.status_code == 404
+    assert response.json()["status_code"] == 404
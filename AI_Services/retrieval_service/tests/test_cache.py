@@ -0,0 +1,118 @@
+# AI_Services/retrieval_service/tests/test_cache.py
+
+import struct
+
+import pytest
+
+import cache as cache_module
+from cache import EmbeddingCache, ResultCache, pack_embedding
+from schemas import RetrieveResponse
+
+
+class FakeSharedStore:
+    """Stands in for the async Redis client."""
+
+    def __init__(self, fail=False):
+        self.data = {}
+        self.fail = fail
+
+    async def get(self, key):
+        if self.fail:
+            raise ConnectionError("redis down")
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None):
+        if self.fail:
+            raise ConnectionError("redis down")
+        self.data[key] = value
+
+
+@pytest.mark.asyncio
+async def test_cache_hit_returns_packed_vector():
+    """Test that a stored float list comes back as packed float32 bytes."""
+    cache = EmbeddingCache(max_entries=4)
+    assert await cache.get("jd") is None
+    await cache.put("jd", [0.5, -0.25])
+    assert await cache.get("jd") == struct.pack("<2f", 0.5, -0.25)
+    assert pack_embedding(b"\x00" * 8) == b"\x00" * 8
+
+
+@pytest.mark.asyncio
+async def test_cache_evicts_least_recently_used_and_expired():
+    """Test the LRU bound and the TTL."""
+    cache = EmbeddingCache(max_entries=2)
+    await cache.put("a", [1.0])
+    await cache.put("b", [2.0])
+    await cache.get("a")
+    await cache.put("c", [3.0])
+    assert await cache.get("b") is None
+    assert await cache.get("a") is not None and len(cache) == 2
+
+    expired = EmbeddingCache(ttl_s=0)
+    await expired.put("a", [1.0])
+    assert await expired.get("a") is None
+
+
+@pytest.mark.asyncio
+async def test_shared_tier_is_shared_between_replicas():
+    """Test that one replica's entry is a hit for another, and outages are misses."""
+    store = FakeSharedStore()
+    await EmbeddingCache(shared=store).put("jd", [1.0, 2.0])
+    other = EmbeddingCache(shared=store)
+    assert await other.get("jd") == struct.pack("<2f", 1.0, 2.0)
+    assert len(other) == 1
+
+    broken = EmbeddingCache(shared=FakeSharedStore(fail=True))
+    await broken.put("jd", [1.0])
+    assert await EmbeddingCache(shared=broken.shared).get("jd") is None
+
+
+def test_cache_from_env(monkeypatch):
+    """Test that a zero size disables the cache."""
+    monkeypatch.setenv("JD_EMBED_CACHE_SIZE", "0")
+    assert cache_module.cache_from_env() is None
+    monkeypatch.setenv("JD_EMBED_CACHE_SIZE", "8")
+    cache = cache_module.cache_from_env()
+    assert cache.max_entries == 8
+    assert cache.model is None
+
+
+@pytest.mark.asyncio
+async def test_model_change_drops_cached_vectors():
+    """Test that entries are keyed by the model /embed reports and dropped when it changes."""
+    store = FakeSharedStore()
+    cache = EmbeddingCache(shared=store)
+    await cache.put("jd", [1.0], "model-a")
+    assert cache.model == "model-a"
+    assert await cache.get("jd") == struct.pack("<f", 1.0)
+
+    await cache.put("other", [2.0], "model-b")
+    assert len(cache) == 1
+    # Neither the local entry nor the shared one from model-a is served
+    assert await cache.get("jd") is None
+
+    # Another replica that has only seen model-b does not read model-a entries
+    fresh = EmbeddingCache(shared=store, model="model-b")
+    assert await fresh.get("jd") is None
+    assert await fresh.get("other") == struct.pack("<f", 2.0)
+
+
+def test_result_cache_serves_only_the_current_version():
+    """Test hits, stale drops, LRU eviction and uncacheable responses."""
+    cache = ResultCache(max_entries=2)
+    key = ResultCache.key("u1", "profile", None, "jd", 5)
+    assert key != ResultCache.key("u1", "resume_sections", "s1", "jd", 5)
+
+    cache.put(key, RetrieveResponse(results=[]))
+    assert cache.peek(key) is None
+
+    response = RetrieveResponse(results=[], index_version="e.1")
+    cache.put(key, response)
+    assert cache.hit(key, "e.1") is response
+    assert cache.hit(key, "e.2") is None
+    assert cache.peek(key) is None
+
+    for i in range(3):
+        cache.put(ResultCache.key("u1", "profile", None, f"jd{i}", 5), response)
+    assert len(cache) == 2
+    assert cache.peek(ResultCache.key("u1", "profile", None, "jd0", 5)) is None
@@ -0,0 +1,123 @@
+# AI_Services/retrieval_service/tests/test_replicas.py
+
+import asyncio
+import time
+
+import httpx
+import pytest
+from unittest.mock import AsyncMock
+from fastapi import HTTPException
+
+import replicas
+from replicas import ReplicaError, ReplicaPool
+from utils import embed_text, fetch_index_version, retrieve_profile_chunks
+from conftest import USER_ID, SAMPLE_EMBEDDING, MOCK_EMBED_RESPONSE, MOCK_EMBEDDING_SERVICE_RESPONSE
+
+pytestmark = pytest.mark.asyncio
+
+
+@pytest.fixture(autouse=True)
+def fresh_pools():
+    replicas._pools.clear()
+    yield
+    replicas._pools.clear()
+
+
+async def test_pick_prefers_least_outstanding_and_skips_ejected():
+    """Test least-outstanding balancing and passive ejection."""
+    pool = ReplicaPool(["http://a", "http://b"], eject_after=2, hedging=False)
+    a, b = pool.replicas
+    a.outstanding = 3
+    assert pool.pick() is b
+    assert pool.pick(exclude=[b]) is a
+
+    async def fail(url):
+        raise ReplicaError(HTTPException(status_code=502, detail="down"))
+
+    for _ in range(2):
+        with pytest.raises(ReplicaError):
+            await pool._attempt("retrieve", b, fail)
+    assert b.consecutive_failures == 2 and pool.snapshot()[1]["ejected"]
+    assert pool.pick() is a
+    # With every other replica excluded, an ejected one is still used
+    assert pool.pick(exclude=[a]) is b
+
+
+async def test_slow_replica_is_hedged():
+    """Test that a second replica answers when the first is slower than the hedge delay."""
+    pool = ReplicaPool(["http://a", "http://b"], hedge_default_delay_s=0.01)
+    calls = []
+
+    async def call(url):
+        calls.append(url)
+        if len(calls) == 1:
+            await asyncio.sleep(1)
+        return url
+
+    start = time.monotonic()
+    result = await pool.call("retrieve", call)
+
+    assert time.monotonic() - start < 0.5
+    assert result == calls[1] and calls[0] != calls[1]
+    await asyncio.sleep(0)  # Let the cancelled primary unwind
+    assert all(r.outstanding == 0 for r in pool.replicas)
+
+
+async def test_hedge_delay_follows_observed_latency():
+    """Test that the hedge delay is the configured percentile once enough samples exist."""
+    pool = ReplicaPool(["http://a", "http://b"], hedge_default_delay_s=0.3, hedge_min_delay_s=0.0)
+    assert pool.hedge_delay("embed") == 0.3
+    pool._latencies["embed"] = replicas.deque([i / 100 for i in range(100)])
+    assert pool.hedge_delay("embed") == 0.95
+
+
+async def test_failed_replica_is_retried_elsewhere_without_delay(monkeypatch):
+    """Test that a 5xx from one replica is retried on another right away, and 4xx is not retried."""
+    monkeypatch.setenv("EMBEDDING_SERVICE_URLS", "http://replica-1,http://replica-2")
+    monkeypatch.setenv("EMBEDDING_HEDGING", "false")
+    failing = {}
+
+    async def respond(method, url, **kwargs):
+        host = httpx.URL(url).host
+        failing.setdefault("host", host)
+        if host == failing["host"]:
+            return httpx.Response(503, request=httpx.Request(method, url))
+        return httpx.Response(200, json=MOCK_EMBED_RESPONSE, request=httpx.Request(method, url))
+
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_client.request = AsyncMock(side_effect=respond)
+
+    start = time.monotonic()
+    embedding, _ = await embed_text(mock_client, "A great job.")
+
+    assert embedding == SAMPLE_EMBEDDING
+    assert mock_client.request.call_count == 2
+    assert time.monotonic() - start < 0.5
+
+    mock_client.request = AsyncMock(
+        return_value=httpx.Response(400, text="bad", request=httpx.Request("POST", "http://replica-1"))
+    )
+    with pytest.raises(HTTPException):
+        await embed_text(mock_client, "A great job.")
+    assert mock_client.request.call_count == 1
+
+
+async def test_user_scoped_calls_stay_on_the_first_replica(monkeypatch):
+    """Test that retrieve and version calls are neither balanced nor hedged across replicas."""
+    monkeypatch.setenv("EMBEDDING_SERVICE_URLS", "http://replica-1,http://replica-2")
+    monkeypatch.setenv("HEDGE_DEFAULT_DELAY_S", "0")
+    hosts = []
+
+    async def respond(method, url, **kwargs):
+        hosts.append(httpx.URL(url).host)
+        body = {"index_version": "v1"} if url.endswith("/version") else MOCK_EMBEDDING_SERVICE_RESPONSE
+        return httpx.Response(200, json=body, request=httpx.Request(method, url))
+
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_client.request = AsyncMock(side_effect=respond)
+    for _ in range(5):
+        await retrieve_profile_chunks(mock_client, USER_ID, SAMPLE_EMBEDDING, 5)
+        assert await fetch_index_version(mock_client, USER_ID, "profile") == "v1"
+
+    assert set(hosts) == {"replica-1"}
+    assert len(hosts) == 10
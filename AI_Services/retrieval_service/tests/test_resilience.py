@@ -0,0 +1,76 @@
+# AI_Services/retrieval_service/tests/test_resilience.py
+
+import httpx
+import pytest
+
+import resilience
+import utils
+from resilience import CircuitBreaker, RetryBudget, backoff_delay
+from conftest import USER_ID
+
+
+def test_circuit_breaker_opens_probes_and_closes(monkeypatch):
+    """Test closed -> open -> half-open -> closed/open transitions."""
+    clock = {"now": 100.0}
+    monkeypatch.setattr(resilience.time, "monotonic", lambda: clock["now"])
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout_s=5)
+
+    breaker.record_failure()
+    assert breaker.allow() and breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock["now"] += 5
+    assert breaker.allow() and breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+    clock["now"] += 5
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_retry_budget_limits_retries_to_a_ratio_of_requests():
+    """Test that the reserve is spent first, then retries follow the ratio."""
+    budget = RetryBudget(ratio=0.5, reserve=2)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert not budget.try_spend()
+    budget.record_request()
+    assert budget.try_spend()
+    for _ in range(100):
+        budget.record_request()
+    assert budget.tokens == 2
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    """Test full-jitter exponential backoff bounds."""
+    delays = [backoff_delay(3, 0.1, 10) for _ in range(200)]
+    assert all(0 <= d <= 0.4 for d in delays) and len(set(delays)) > 1
+    assert all(backoff_delay(20, 0.1, 1.5) <= 1.5 for _ in range(50))
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_fails_fast_and_shows_in_health(test_client_and_mock, monkeypatch):
+    """Test that consecutive downstream failures open the breaker and stop downstream calls."""
+    client, mock_http_client = test_client_and_mock
+    monkeypatch.setattr(utils, "RETRY_DELAY", 0)
+    mock_http_client.request.side_effect = httpx.ConnectError("Connection failed")
+
+    for _ in range(5):
+        response = client.post("/retrieve/full", json={"user_id": USER_ID, "job_description": "A great job."})
+        assert response.status_code == 502
+    calls = mock_http_client.request.call_count
+
+    response = client.post("/retrieve/full", json={"user_id": USER_ID, "job_description": "A great job."})
+    assert response.status_code == 503
+    assert "circuit open" in response.json()["error"]
+    assert mock_http_client.request.call_count == calls
+
+    health = client.get("/health").json()
+    assert health["status"] == "degraded"
+    assert health["circuit_breakers"]["embed"] == "open"
@@ -7,6 +7,7 @@ from datetime import datetime
 from schemas import (
     FullRetrieveRequest,
     SectionRetrieveRequest,
+    SectionsRetrieveRequest,
     ChunkItem,
     RetrieveResponse,
 )
@@ -36,6 +37,18 @@ def test_section_retrieve_request_validation():
         SectionRetrieveRequest(user_id="u1", section_id="", job_description="jd1")
 
 
+def test_sections_retrieve_request_validation():
+    """Test validation for SectionsRetrieveRequest."""
+    req = SectionsRetrieveRequest(user_id="u1", section_ids=["s1", "s2"], job_description="jd1")
+    assert req.include_profile is False
+
+    with pytest.raises(ValidationError):
+        SectionsRetrieveRequest(user_id="u1", section_ids=[], job_description="jd1")
+
+    with pytest.raises(ValidationError):
+        SectionsRetrieveRequest(user_id="u1", section_ids=["s"] * 51, job_description="jd1")
+
+
 def test_chunk_item_parsing():
     """Test that ChunkItem can parse a valid dictionary."""
     data = {
@@ -0,0 +1,67 @@
+# AI_Services/retrieval_service/tests/test_singleflight.py
+
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+pytestmark = pytest.mark.asyncio
+
+
+async def test_concurrent_identical_calls_share_one_flight():
+    """Test that concurrent calls with one key run the function once."""
+    flights = SingleFlight("test")
+    calls = []
+
+    async def work(key):
+        calls.append(key)
+        await asyncio.sleep(0.01)
+        return key.upper()
+
+    results = await asyncio.gather(
+        *(flights.do("a", lambda: work("a")) for _ in range(5)),
+        flights.do("b", lambda: work("b")),
+    )
+
+    assert results == ["A"] * 5 + ["B"]
+    assert calls == ["a", "b"]
+    assert (flights.leaders, flights.shared) == (2, 4)
+    assert len(flights) == 0
+
+    # A finished flight is not reused
+    assert await flights.do("a", lambda: work("a")) == "A"
+    assert calls == ["a", "b", "a"]
+
+
+async def test_errors_reach_every_waiter():
+    """Test that a failing flight raises the same error in all callers."""
+    flights = SingleFlight("test")
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("downstream failed")
+
+    results = await asyncio.gather(
+        flights.do("k", fail), flights.do("k", fail), return_exceptions=True
+    )
+    assert all(isinstance(r, ValueError) for r in results)
+    assert len(flights) == 0
+
+
+async def test_cancelled_caller_does_not_cancel_the_flight():
+    """Test that other waiters still get the result when the first caller goes away."""
+    flights = SingleFlight("test")
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return 42
+
+    first = asyncio.ensure_future(flights.do("k", work))
+    second = asyncio.ensure_future(flights.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == 42
+    with pytest.raises(asyncio.CancelledError):
+        await first
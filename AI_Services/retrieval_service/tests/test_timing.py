@@ -0,0 +1,63 @@
+# AI_Services/retrieval_service/tests/test_timing.py
+
+import asyncio
+
+import pytest
+
+import timing
+from singleflight import SingleFlight
+
+
+def test_stages_accumulate_and_format_as_server_timing():
+    """Test that repeated stages add up and render as a Server-Timing header."""
+    timer, token = timing.start_request()
+    try:
+        timer.add("embed", 0.010)
+        timer.add("search", 0.020)
+        timer.add("search", 0.005)
+        timing.mark("parse")
+    finally:
+        timing.end_request(token)
+
+    fields = timer.fields()
+    assert list(fields)[-1] == "total"
+    assert (fields["embed"], fields["search"]) == (10.0, 25.0)
+    assert timer.server_timing().startswith("embed;dur=10.0, search;dur=25.0, parse;dur=")
+    assert timing.current() is None
+
+
+def test_stage_outside_a_request_is_a_no_op():
+    """Test that timed code paths work when no request is being timed."""
+    with timing.stage("embed"):
+        pass
+    timing.mark("parse")
+    assert timing.current() is None
+
+
+@pytest.mark.asyncio
+async def test_coalesced_callers_are_charged_for_waiting():
+    """Test that a caller joining an in-flight call records a 'coalesced' stage."""
+    flights = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def work():
+        with timing.stage("search"):
+            await release.wait()
+        return "done"
+
+    async def request():
+        timer, token = timing.start_request()
+        try:
+            return await flights.do("key", work), timer
+        finally:
+            timing.end_request(token)
+
+    leader = asyncio.create_task(request())
+    await asyncio.sleep(0)
+    joiner = asyncio.create_task(request())
+    await asyncio.sleep(0)
+    release.set()
+    (_, leader_timer), (_, joiner_timer) = await asyncio.gather(leader, joiner)
+
+    assert set(leader_timer.stages) == {"search"}
+    assert set(joiner_timer.stages) == {"coalesced"}
@@ -1,15 +1,27 @@
 # AI_Services/retrieval_service/tests/test_utils.py
 
+import json
+import struct
+
+import msgpack
 import pytest
 import httpx
-from unittest.mock import AsyncMock
+from datetime import datetime
+from unittest.mock import AsyncMock, MagicMock
 from fastapi import HTTPException
 
+import resilience
+from replicas import ReplicaError
+
 from utils import (
     embed_text,
     retrieve_profile_chunks,
     retrieve_section_chunks,
-    _make_request_with_retry,
+    fuse_chunks,
+    aiter_streamed_chunks,
+    open_chunk_stream,
+    _call_embedding_service,
+    _retry_loop,
 )
 from schemas import ChunkItem
 from conftest import (
@@ -32,9 +44,10 @@ async def test_embed_text_success(monkeypatch):
     )
     monkeypatch.setenv("EMBEDDING_SERVICE_URL", "http://fake-url")
 
-    embedding = await embed_text(mock_client, "some text")
+    embedding, model = await embed_text(mock_client, "some text")
 
     assert embedding == SAMPLE_EMBEDDING
+    assert model == "all-MiniLM-L6-v2"
     mock_client.request.assert_called_once()
 
 
@@ -53,6 +66,26 @@ async def test_retrieve_profile_chunks_success(monkeypatch):
     assert chunks[0].chunk_id == "chunk-1"
 
 
+async def test_trusted_internal_hops_skip_chunk_validation(monkeypatch):
+    """Test that trusted chunks are constructed unvalidated but still filtered by user."""
+    foreign = {**MOCK_EMBEDDING_SERVICE_RESPONSE["results"][0], "chunk_id": "other", "user_id": "someone-else"}
+    body = {"results": MOCK_EMBEDDING_SERVICE_RESPONSE["results"] + [foreign]}
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_client.request = AsyncMock(
+        return_value=httpx.Response(200, json=body, request=httpx.Request("POST", ""))
+    )
+    monkeypatch.setenv("EMBEDDING_SERVICE_URL", "http://fake-url")
+    monkeypatch.setenv("TRUSTED_INTERNAL_HOPS", "true")
+    validate = MagicMock(side_effect=AssertionError("chunks were re-validated"))
+    monkeypatch.setattr(ChunkItem, "model_validate", validate)
+
+    chunks = await retrieve_profile_chunks(mock_client, USER_ID, SAMPLE_EMBEDDING, 5)
+
+    assert [c.chunk_id for c in chunks] == ["chunk-1", "chunk-2"]
+    assert isinstance(chunks[0].created_at, datetime)
+    assert chunks[0].model_dump_json()  # serializes without re-validation
+
+
 async def test_retrieve_section_chunks_success(monkeypatch):
     """Test successful retrieval of section-specific chunks."""
     mock_client = AsyncMock(spec=httpx.AsyncClient)
@@ -72,7 +105,33 @@ async def test_retrieve_section_chunks_success(monkeypatch):
     assert call_args.kwargs["json"]["filter_by_section_ids"] == [SECTION_ID]
 
 
-async def test_make_request_with_retry_logic():
+async def test_retrieve_section_chunks_msgpack(monkeypatch):
+    """Test that msgpack mode packs the query vector and decodes a msgpack reply."""
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    mock_client.request = AsyncMock(
+        return_value=httpx.Response(
+            200,
+            content=msgpack.packb(MOCK_EMBEDDING_SERVICE_RESPONSE, use_bin_type=True),
+            headers={"Content-Type": "application/msgpack"},
+            request=httpx.Request("POST", ""),
+        )
+    )
+    monkeypatch.setenv("EMBEDDING_SERVICE_URL", "http://fake-url")
+    monkeypatch.setenv("EMBEDDING_WIRE_FORMAT", "msgpack")
+
+    chunks = await retrieve_section_chunks(
+        mock_client, USER_ID, SECTION_ID, SAMPLE_EMBEDDING, 5
+    )
+
+    assert len(chunks) == 2
+    call_args = mock_client.request.call_args
+    assert call_args.kwargs["headers"]["Content-Type"] == "application/msgpack"
+    sent = msgpack.unpackb(call_args.kwargs["content"], raw=False)
+    assert sent["filter_by_section_ids"] == [SECTION_ID]
+    assert sent["query_embedding"] == struct.pack(f"<{len(SAMPLE_EMBEDDING)}f", *SAMPLE_EMBEDDING)
+
+
+async def test_retry_loop_retries_5xx():
     """Test the retry mechanism for 5xx errors."""
     mock_client = AsyncMock(spec=httpx.AsyncClient)
     # Simulate a server error on the first call, then success
@@ -81,39 +140,145 @@ async def test_make_request_with_retry_logic():
         httpx.Response(200, json={"status": "ok"}, request=httpx.Request("POST", "")),
     ]
 
-    response = await _make_request_with_retry(mock_client, "POST", "http://fake-url")
+    response = await _retry_loop(mock_client, "POST", "http://fake-url")
 
     assert response == {"status": "ok"}
     assert mock_client.request.call_count == 2
 
 
-async def test_make_request_fails_after_retries():
-    """Test that the request fails after all retries are exhausted."""
+async def test_retry_loop_fails_after_retries():
+    """Test that the loop gives up with the last transient error once retries are exhausted."""
     mock_client = AsyncMock(spec=httpx.AsyncClient)
     # Simulate persistent server errors
     mock_client.request.side_effect = httpx.HTTPStatusError(
         "Server Error", request=httpx.Request("POST", ""), response=httpx.Response(503)
     )
 
-    with pytest.raises(HTTPException) as exc_info:
-        await _make_request_with_retry(mock_client, "POST", "http://fake-url")
+    with pytest.raises(ReplicaError) as exc_info:
+        await _retry_loop(mock_client, "POST", "http://fake-url")
 
     # MAX_RETRIES is 1, so 1 initial call + 1 retry = 2 calls
     assert mock_client.request.call_count == 2
-    assert exc_info.value.status_code == 502
-    assert "Embedding service server error: 503" in str(exc_info.value.detail)
+    assert exc_info.value.error.status_code == 502
+    assert "Embedding service server error: 503" in str(exc_info.value.error.detail)
 
 
-async def test_make_request_no_retry_on_4xx():
+async def test_call_embedding_service_no_retry_on_4xx(monkeypatch):
     """Test that client errors (4xx) are not retried."""
     mock_client = AsyncMock(spec=httpx.AsyncClient)
     mock_client.request.side_effect = httpx.HTTPStatusError(
         "Not Found", request=httpx.Request("POST", ""), response=httpx.Response(404)
     )
+    monkeypatch.setenv("EMBEDDING_SERVICE_URL", "http://fake-url")
 
     with pytest.raises(HTTPException) as exc_info:
-        await _make_request_with_retry(mock_client, "POST", "http://fake-url")
+        await _call_embedding_service(mock_client, "retrieve", "POST", "/retrieve/u1")
 
     assert exc_info.value.status_code == 404
     assert "User not found or no chunks available" in str(exc_info.value.detail)
-    assert mock_client.request.call_count == 1
\ No newline at end of file
+    assert mock_client.request.call_count == 1
+
+
+async def test_embed_text_passes_open_breaker_through(monkeypatch):
+    """Test that an open circuit surfaces as 503, not as a generic 502."""
+    mock_client = AsyncMock(spec=httpx.AsyncClient)
+    monkeypatch.setenv("EMBEDDING_SERVICE_URL", "http://fake-url")
+    circuit = resilience.breaker("embed")
+    for _ in range(circuit.failure_threshold):
+        circuit.record_failure()
+
+    with pytest.raises(HTTPException) as exc_info:
+        await embed_text(mock_client, "some text")
+
+    assert exc_info.value.status_code == 503
+    assert "circuit open" in exc_info.value.detail
+    mock_client.request.assert_not_called()
+
+
+class _LineStream(httpx.AsyncByteStream):
+    """A downstream body that records how many lines have been read from it."""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.sent = 0
+
+    async def __aiter__(self):
+        for line in self.lines:
+            self.sent += 1
+            yield line
+
+    async def aclose(self):
+        self.closed = True
+
+
+async def test_streamed_chunks_are_validated_as_lines_arrive(monkeypatch):
+    """Test that each chunk is yielded before the next line is read, and bad lines are skipped."""
+    good, other = MOCK_EMBEDDING_SERVICE_RESPONSE["results"]
+    foreign = {**good, "chunk_id": "foreign", "user_id": "someone-else"}
+    stream = _LineStream([json.dumps(good).encode() + b"\n", b"not json\n", json.dumps(foreign).encode() + b"\n",
+                          json.dumps(other).encode() + b"\n"])
+    mock_client = MagicMock(spec=httpx.AsyncClient)
+    mock_client.build_request.side_effect = lambda method, url, **kwargs: httpx.Request(method, url, **kwargs)
+    mock_client.send = AsyncMock(return_value=httpx.Response(
+        200, stream=stream, headers={"Content-Type": "application/x-ndjson", "X-Index-Version": "v7"},
+        request=httpx.Request("POST", ""),
+    ))
+    monkeypatch.setenv("EMBEDDING_SERVICE_URL", "http://fake-url")
+
+    response, index_version = await open_chunk_stream(mock_client, USER_ID, "profile", SAMPLE_EMBEDDING, 5)
+    assert index_version == "v7"
+    assert stream.sent == 0
+
+    chunk_ids = []
+    async for chunk in aiter_streamed_chunks(response, USER_ID):
+        chunk_ids.append((chunk.chunk_id, stream.sent))
+
+    assert chunk_ids == [("chunk-1", 1), ("chunk-2", 4)]
+    assert stream.closed
+
+
+async def test_chunk_stream_falls_back_to_whole_json_body(monkeypatch):
+    """Test that an Embedding Service without NDJSON support still streams."""
+    mock_client = MagicMock(spec=httpx.AsyncClient)
+    mock_client.build_request.side_effect = lambda method, url, **kwargs: httpx.Request(method, url, **kwargs)
+    mock_client.send = AsyncMock(return_value=httpx.Response(
+        200, json={**MOCK_EMBEDDING_SERVICE_RESPONSE, "index_version": "v2"}, request=httpx.Request("POST", ""),
+    ))
+    monkeypatch.setenv("EMBEDDING_SERVICE_URL", "http://fake-url")
+
+    response, index_version = await open_chunk_stream(mock_client, USER_ID, "profile", SAMPLE_EMBEDDING, 5)
+    chunks = [chunk async for chunk in aiter_streamed_chunks(response, USER_ID)]
+
+    assert index_version == "v2"
+    assert [chunk.chunk_id for chunk in chunks] == ["chunk-1", "chunk-2"]
+
+
+def _chunk(chunk_id, namespace, text, score):
+    return ChunkItem(
+        chunk_id=chunk_id, user_id=USER_ID, index_namespace=namespace, section_id=None,
+        source_type="experience", source_id="0", text=text, score=score,
+        created_at="2024-01-01T00:00:00",
+    )
+
+
+async def test_fuse_chunks_merges_by_score_with_quotas_and_dedupe():
+    """Test the score merge, per-namespace quotas and near-duplicate removal."""
+    results = {
+        "profile": [
+            _chunk("p1", "profile", "Led a team of five engineers.", 0.9),
+            _chunk("p2", "profile", "Built a Kafka pipeline.", 0.7),
+            _chunk("p3", "profile", "Wrote Go services.", 0.5),
+        ],
+        "resume_sections": [
+            _chunk("s1", "resume_sections", "Led a team of five engineers", 0.95),
+            _chunk("s2", "resume_sections", "Mentored interns.", 0.6),
+        ],
+    }
+
+    fused = fuse_chunks(results, top_k=4)
+    # p1 duplicates the higher-scoring s1
+    assert [c.chunk_id for c in fused] == ["s1", "p2", "s2", "p3"]
+
+    fused = fuse_chunks(results, top_k=4, quotas={"resume_sections": 1})
+    assert [c.chunk_id for c in fused] == ["s1", "p2", "p3"]
+
@@ -0,0 +1,103 @@
+# timing.py
+
+"""
+CVisionary Retrieval Service - Per-Stage Request Timing
+
+When the generator reports a slow context fetch, the total request time alone
+does not say which hop was slow. Each retrieval request gets a `RequestTimer`
+held in a context variable, and code on the request path wraps its work in
+`stage(name)`:
+
+- `parse`: reading and validating the request body, up to the handler
+- `cache`: embedding and result cache lookups and writes
+- `version`: index version checks for cached results
+- `embed`: the Embedding Service /embed call
+- `search`: the Embedding Service /retrieve call
+- `decode`: turning Embedding Service results into chunks
+- `coalesced`: waiting on an identical retrieval already in flight
+
+Concurrent work (e.g. the per-section searches of /retrieve/sections) adds to
+the same stage, so a stage can exceed the request's wall time. The
+`log_requests` middleware turns the timer into a `Server-Timing` header, log
+fields and the `retrieval_stage_duration_seconds` histogram.
+
+Tasks inherit the timer of the request that created them, so the stages of a
+coalesced call are charged to the request that started it.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Dict, Iterator, Optional, Tuple
+
+from .metrics import STAGE_DURATION
+
+TOTAL = "total"
+
+
+class RequestTimer:
+    """Accumulated time per stage for one request."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def fields(self) -> Dict[str, float]:
+        """Stage durations in milliseconds, with the request's total last."""
+        timings = {name: round(seconds * 1000, 1) for name, seconds in self.stages.items()}
+        timings[TOTAL] = round(self.elapsed() * 1000, 1)
+        return timings
+
+    def server_timing(self) -> str:
+        """The `Server-Timing` header value for the stages recorded so far."""
+        return ", ".join(f"{name};dur={ms}" for name, ms in self.fields().items())
+
+    def observe(self, endpoint: str) -> None:
+        """Record every stage, and the total, in the stage duration histogram."""
+        for name, seconds in self.stages.items():
+            STAGE_DURATION.labels(endpoint=endpoint, stage=name).observe(seconds)
+        STAGE_DURATION.labels(endpoint=endpoint, stage=TOTAL).observe(self.elapsed())
+
+
+_current: ContextVar[Optional[RequestTimer]] = ContextVar("request_timer", default=None)
+
+
+def start_request() -> Tuple[RequestTimer, Token]:
+    """Start timing a request; pass the token to `end_request`."""
+    timer = RequestTimer()
+    return timer, _current.set(timer)
+
+
+def end_request(token: Token) -> None:
+    _current.reset(token)
+
+
+def current() -> Optional[RequestTimer]:
+    return _current.get()
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Charge the time spent in the block to stage `name` of the current request."""
+    timer = _current.get()
+    if timer is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timer.add(name, time.perf_counter() - start)
+
+
+def mark(name: str) -> None:
+    """Charge the time since the request started to stage `name`."""
+    timer = _current.get()
+    if timer is not None:
+        timer.add(name, timer.elapsed())
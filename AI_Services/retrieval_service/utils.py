@@ -9,145 +9,514 @@ with comprehensive error handling and retry logic.
 """
 
 import asyncio
+import json
 import logging
 import os
+import re
+import struct
 import time
-from typing import List, Dict, Any, Optional
+from datetime import datetime
+from typing import List, Dict, Any, AsyncIterator, Callable, Iterator, Optional, Tuple, Union
 
 import httpx
+import msgpack
 from fastapi import HTTPException
 
-from .schemas import ChunkItem
+from .replicas import STATELESS_OPERATIONS, ReplicaError, replica_pool, replica_urls
+from .resilience import backoff_delay, breaker, retry_budget
+from .schemas import ChunkItem, RetrieveResponse
+from .timing import stage
 
 # Configure logger
 logger = logging.getLogger(__name__)
 
-# Retry configuration
-RETRY_DELAY = 1.0  # seconds
+# Retry configuration: exponential backoff with full jitter between attempts,
+# limited by the process-wide retry budget (see resilience.py)
+RETRY_DELAY = 0.2  # base delay, seconds
+RETRY_MAX_DELAY = 2.0  # seconds
 MAX_RETRIES = 1
 
+MSGPACK = "application/msgpack"
+NDJSON = "application/x-ndjson"
 
-async def embed_text(client: httpx.AsyncClient, job_description: str) -> List[float]:
+# Chunks whose word sets overlap at least this much (Jaccard) are treated as
+# duplicates when fusing namespaces; profile chunks and the resume sections
+# written from them are often near-identical.
+FUSED_DEDUPE_THRESHOLD = float(os.getenv("FUSED_DEDUPE_THRESHOLD", "0.85"))
+_WORD = re.compile(r"\w+")
+
+# A query embedding is either a JSON float list or, in msgpack mode, the
+# packed little-endian float32 bytes returned by the Embedding Service.
+Embedding = Union[List[float], bytes]
+
+
+def _use_msgpack() -> bool:
+    """Whether EMBEDDING_WIRE_FORMAT selects msgpack for vector-carrying calls."""
+    return os.getenv("EMBEDDING_WIRE_FORMAT", "json").lower() == "msgpack"
+
+
+async def embed_text(
+    client: httpx.AsyncClient, job_description: str
+) -> Tuple[Embedding, Optional[str]]:
     """
-    Generate embedding vector for job description text via Embedding Service.
+    Generate embedding vector for job description text via Embedding Service,
+    returned with the name of the model that produced it (None from services
+    that do not report it). In msgpack mode the vector is returned packed and
+    passed through to /retrieve without ever being decoded into floats.
     """
-    embedding_service_url = os.getenv("EMBEDDING_SERVICE_URL")
-    if not embedding_service_url:
-        raise HTTPException(status_code=500, detail="Embedding service URL not configured")
-
-    url = f"{embedding_service_url.rstrip('/')}/embed"
+    _require_embedding_service()
     payload = {"text": job_description}
-    logger.debug(f"[RETRIEVAL] embed_text: POST {url}")
+    logger.debug("[RETRIEVAL] embed_text: POST /embed")
 
     try:
-        response = await _make_request_with_retry(client, "POST", url, json=payload)
+        headers = {"Accept": MSGPACK} if _use_msgpack() else None
+        with stage("embed"):
+            response = await _call_embedding_service(
+                client, "embed", "POST", "/embed", json=payload, headers=headers
+            )
         if "embedding" not in response:
             raise HTTPException(status_code=502, detail="Invalid response format from embedding service")
-        return response["embedding"]
+        return response["embedding"], response.get("model")
+    except HTTPException:
+        # Already carries the right status, e.g. 503 while the breaker is open
+        raise
     except Exception as e:
         logger.error(f"[RETRIEVAL] embed_text failed: {str(e)}")
         raise HTTPException(status_code=502, detail=f"Failed to generate embedding: {e}")
 
 
 async def retrieve_profile_chunks(
-    client: httpx.AsyncClient, user_id: str, embedding: List[float], top_k: int
+    client: httpx.AsyncClient,
+    user_id: str,
+    embedding: Optional[Embedding],
+    top_k: int,
+    query_text: Optional[str] = None,
 ) -> List[ChunkItem]:
     """
     Retrieve relevant profile chunks for full resume context.
+    Pass `query_text` instead of `embedding` to have the Embedding Service
+    embed the query in the same request.
     """
-    embedding_service_url = os.getenv("EMBEDDING_SERVICE_URL")
-    if not embedding_service_url:
-        raise HTTPException(status_code=500, detail="Embedding service URL not configured")
+    response = await retrieve_chunks(
+        client, user_id, "profile", embedding, top_k, query_text=query_text
+    )
+    return response.results
+
+
+async def retrieve_section_chunks(
+    client: httpx.AsyncClient,
+    user_id: str,
+    section_id: str,
+    embedding: Optional[Embedding],
+    top_k: int,
+    query_text: Optional[str] = None,
+) -> List[ChunkItem]:
+    """
+    Retrieve relevant chunks for specific resume section editing.
+    Pass `query_text` instead of `embedding` to have the Embedding Service
+    embed the query in the same request.
+    """
+    response = await retrieve_chunks(
+        client, user_id, "resume_sections", embedding, top_k,
+        query_text=query_text, section_id=section_id,
+    )
+    return response.results
+
+
+async def retrieve_chunks(
+    client: httpx.AsyncClient,
+    user_id: str,
+    namespace: str,
+    embedding: Optional[Embedding],
+    top_k: int,
+    query_text: Optional[str] = None,
+    section_id: Optional[str] = None,
+) -> RetrieveResponse:
+    """
+    Search one of a user's namespaced indices, optionally filtered to a
+    section. The response carries the `index_version` the Embedding Service
+    searched, for caching.
+    """
+    response = await fetch_chunks(
+        client, user_id, namespace, embedding, top_k, query_text=query_text, section_id=section_id
+    )
+    with stage("decode"):
+        return RetrieveResponse(
+            results=_parse_chunks_response(response, user_id, section_id),
+            index_version=response.get("index_version"),
+        )
 
-    url = f"{embedding_service_url.rstrip('/')}/retrieve/{user_id}"
-    # FIX: Be explicit about the namespace for robustness
-    payload = {
-        "query_embedding": embedding,
-        "top_k": top_k,
-        "index_namespace": "profile",
-    }
-    logger.debug(f"[RETRIEVAL] retrieve_profile_chunks: POST {url}")
+
+async def fetch_chunks(
+    client: httpx.AsyncClient,
+    user_id: str,
+    namespace: str,
+    embedding: Optional[Embedding],
+    top_k: int,
+    query_text: Optional[str] = None,
+    section_id: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Like `retrieve_chunks`, but return the Embedding Service's response
+    undecoded, so the chunks can be validated one at a time with
+    `iter_chunks`.
+    """
+    _require_embedding_service()
+    path = f"/retrieve/{user_id}"
+    payload = _search_payload(namespace, embedding, top_k, query_text, section_id)
+    label = "section" if section_id is not None else namespace
+    logger.debug(f"[RETRIEVAL] retrieve_chunks ({label}): POST {path}")
 
     try:
-        response = await _make_request_with_retry(client, "POST", url, json=payload)
-        return _parse_chunks_response(response, user_id)
+        with stage("search"):
+            response = await _call_embedding_service(
+                client, "retrieve", "POST", path, **_retrieve_body(payload)
+            )
+        if "results" not in response or not isinstance(response["results"], list):
+            raise HTTPException(status_code=502, detail="Invalid response format from embedding service: missing 'results' list")
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
-        logger.error(f"[RETRIEVAL] retrieve_profile_chunks failed: {str(e)}")
-        raise HTTPException(status_code=502, detail=f"Failed to retrieve profile chunks: {e}")
+        logger.error(f"[RETRIEVAL] retrieve_chunks ({label}) failed: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Failed to retrieve {label} chunks: {e}")
 
 
-async def retrieve_section_chunks(
+async def open_chunk_stream(
     client: httpx.AsyncClient,
     user_id: str,
-    section_id: str,
-    embedding: List[float],
+    namespace: str,
+    embedding: Optional[Embedding],
     top_k: int,
+    query_text: Optional[str] = None,
+    section_id: Optional[str] = None,
+) -> Tuple[httpx.Response, Optional[str]]:
+    """
+    Like `fetch_chunks`, but ask the Embedding Service for NDJSON and return
+    the open response, with the index version, as soon as its status is
+    known; read the chunks with `aiter_streamed_chunks`, which closes it.
+
+    The call goes to the first URL like every user-scoped call, counts
+    against the `retrieve` circuit breaker, and is not retried. Embedding
+    Services that answer with a whole JSON or msgpack body still work: the
+    body is read here and parsed in one go.
+    """
+    _require_embedding_service()
+    path = f"/retrieve/{user_id}"
+    payload = _search_payload(namespace, embedding, top_k, query_text, section_id)
+    body = _retrieve_body(payload)
+    body["headers"] = {**body.get("headers", {}), "Accept": NDJSON}
+    label = "section" if section_id is not None else namespace
+    logger.debug(f"[RETRIEVAL] open_chunk_stream ({label}): POST {path}")
+
+    circuit = breaker("retrieve")
+    if not circuit.allow():
+        raise HTTPException(status_code=503, detail="Embedding service circuit open for retrieve")
+    retry_budget.record_request()
+    request = client.build_request("POST", f"{replica_urls()[0]}{path}", **body)
+    try:
+        with stage("search"):
+            response = await client.send(request, stream=True)
+    except (httpx.TimeoutException, httpx.ConnectError) as e:
+        circuit.record_failure()
+        error_msg = f"Network error connecting to embedding service: {type(e).__name__}"
+        raise HTTPException(status_code=502, detail=error_msg) from e
+    except BaseException:
+        circuit.release()
+        raise
+
+    try:
+        if response.is_error or not _is_ndjson(response):
+            await response.aread()
+        response.raise_for_status()
+        if _is_ndjson(response):
+            circuit.record_success()
+            return response, response.headers.get("x-index-version")
+        data = _decode(response)
+        if not isinstance(data.get("results"), list):
+            raise HTTPException(status_code=502, detail="Invalid response format from embedding service: missing 'results' list")
+    except httpx.HTTPStatusError as e:
+        await response.aclose()
+        error = _status_error(e)
+        if isinstance(error, ReplicaError):
+            circuit.record_failure()
+            raise error.error from e
+        circuit.record_success()
+        raise error from e
+    except HTTPException:
+        await response.aclose()
+        circuit.record_success()
+        raise
+    except Exception as e:
+        await response.aclose()
+        circuit.release()
+        logger.error(f"[RETRIEVAL] open_chunk_stream ({label}) failed: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Failed to retrieve {label} chunks: {e}")
+    except BaseException:
+        await response.aclose()
+        circuit.release()
+        raise
+    circuit.record_success()
+    return response, data.get("index_version")
+
+
+async def aiter_streamed_chunks(response: httpx.Response, user_id: str) -> AsyncIterator[ChunkItem]:
+    """
+    Validate the chunks of an `open_chunk_stream` response as their lines
+    arrive, with the same checks as `iter_chunks`, and close the response.
+    """
+    try:
+        if not _is_ndjson(response):
+            for chunk in iter_chunks(_decode(response), user_id):
+                yield chunk
+            return
+        build = _chunk_builder()
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            try:
+                chunk_data = json.loads(line)
+            except ValueError as e:
+                logger.warning(f"[RETRIEVAL] Failed to parse chunk line: {e}. Data: {line}")
+                continue
+            chunk = _checked_chunk(build, chunk_data, user_id)
+            if chunk is not None:
+                yield chunk
+    finally:
+        await response.aclose()
+
+
+async def fetch_index_version(
+    client: httpx.AsyncClient, user_id: str, namespace: str
+) -> Optional[str]:
+    """
+    Current version of a user's namespaced index, or None if the Embedding
+    Service cannot say (e.g. an older deployment without the endpoint).
+    """
+    _require_embedding_service()
+    try:
+        with stage("version"):
+            response = await _call_embedding_service(
+                client, "version", "GET", f"/index/{user_id}/version",
+                params={"index_namespace": namespace},
+            )
+        return response.get("index_version")
+    except (HTTPException, httpx.HTTPError, ValueError) as e:
+        logger.debug(f"[RETRIEVAL] fetch_index_version failed: {e}")
+        return None
+
+
+def fuse_chunks(
+    results_by_namespace: Dict[str, List[ChunkItem]],
+    top_k: int,
+    quotas: Optional[Dict[str, int]] = None,
+    dedupe_threshold: float = FUSED_DEDUPE_THRESHOLD,
 ) -> List[ChunkItem]:
     """
-    Retrieve relevant chunks for specific resume section editing.
+    Merge per-namespace results by descending score, keeping at most
+    `quotas[namespace]` chunks from each namespace and dropping any chunk that
+    is a near-duplicate of a higher-scoring one already kept.
     """
-    embedding_service_url = os.getenv("EMBEDDING_SERVICE_URL")
-    if not embedding_service_url:
-        raise HTTPException(status_code=500, detail="Embedding service URL not configured")
+    quotas = quotas or {}
+    candidates = sorted(
+        (chunk for chunks in results_by_namespace.values() for chunk in chunks),
+        key=lambda chunk: chunk.score,
+        reverse=True,
+    )
+    kept: List[ChunkItem] = []
+    kept_words: List[set] = []
+    taken: Dict[str, int] = {}
+    for chunk in candidates:
+        namespace = chunk.index_namespace
+        if namespace in quotas and taken.get(namespace, 0) >= quotas[namespace]:
+            continue
+        words = set(_WORD.findall(chunk.text.lower()))
+        if any(_jaccard(words, other) >= dedupe_threshold for other in kept_words):
+            continue
+        kept.append(chunk)
+        kept_words.append(words)
+        taken[namespace] = taken.get(namespace, 0) + 1
+        if len(kept) == top_k:
+            break
+    return kept
+
+
+def _jaccard(a: set, b: set) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
 
-    url = f"{embedding_service_url.rstrip('/')}/retrieve/{user_id}"
-    # FIX: Use the correct payload structure for section filtering
+
+def _search_payload(
+    namespace: str,
+    embedding: Optional[Embedding],
+    top_k: int,
+    query_text: Optional[str],
+    section_id: Optional[str],
+) -> Dict[str, Any]:
+    """
+    Build an Embedding Service /retrieve payload for one namespace, optionally
+    filtered to a section.
+    """
+    # FIX: Be explicit about the namespace for robustness
     payload = {
-        "query_embedding": embedding,
+        **_query_payload(embedding, query_text),
         "top_k": top_k,
-        "index_namespace": "resume_sections",
-        "filter_by_section_ids": [section_id],
+        "index_namespace": namespace,
     }
-    logger.debug(f"[RETRIEVAL] retrieve_section_chunks: POST {url}")
+    if section_id is not None:
+        payload["filter_by_section_ids"] = [section_id]
+    return payload
+
+
+def _query_payload(
+    embedding: Optional[Embedding], query_text: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Build the query part of an Embedding Service /retrieve payload.
+    """
+    if query_text is not None:
+        return {"query_text": query_text}
+    if embedding is None:
+        raise ValueError("Either embedding or query_text is required")
+    return {"query_embedding": embedding}
+
 
+def _retrieve_body(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Request kwargs for a /retrieve call: JSON by default, or msgpack with the
+    query vector packed as float32 bytes when EMBEDDING_WIRE_FORMAT=msgpack.
+    """
+    embedding = payload.get("query_embedding")
+    if not _use_msgpack():
+        if isinstance(embedding, bytes):
+            floats = struct.unpack(f"<{len(embedding) // 4}f", embedding)
+            payload = {**payload, "query_embedding": list(floats)}
+        return {"json": payload}
+
+    if embedding is not None and not isinstance(embedding, bytes):
+        payload = {**payload, "query_embedding": struct.pack(f"<{len(embedding)}f", *embedding)}
+    return {
+        "content": msgpack.packb(payload, use_bin_type=True),
+        "headers": {"Content-Type": MSGPACK, "Accept": MSGPACK},
+    }
+
+
+def _require_embedding_service() -> None:
+    if not replica_urls():
+        raise HTTPException(status_code=500, detail="Embedding service URL not configured")
+
+
+async def _call_embedding_service(
+    client: httpx.AsyncClient, operation: str, method: str, path: str, **kwargs
+) -> Dict[str, Any]:
+    """
+    Call `path` on the Embedding Service. Stateless operations with several
+    replicas go through the load-balanced, hedged replica pool, which retries
+    on another replica without sleeping. Everything else keeps the plain retry
+    loop against the first URL, since a user's indices live on one instance
+    (see replicas.py).
+
+    The call fails fast with 503 while the operation's circuit breaker is
+    open. Only server and network errors count against the breaker; a 4xx
+    means the service answered.
+    """
+    pool = replica_pool(max_attempts=MAX_RETRIES + 1)
+    if pool is None:
+        raise HTTPException(status_code=500, detail="Embedding service URL not configured")
+    circuit = breaker(operation)
+    if not circuit.allow():
+        raise HTTPException(status_code=503, detail=f"Embedding service circuit open for {operation}")
+    retry_budget.record_request()
     try:
-        response = await _make_request_with_retry(client, "POST", url, json=payload)
-        return _parse_chunks_response(response, user_id, section_id)
-    except Exception as e:
-        logger.error(f"[RETRIEVAL] retrieve_section_chunks failed: {str(e)}")
-        raise HTTPException(status_code=502, detail=f"Failed to retrieve section chunks: {e}")
+        if len(pool) == 1 or operation not in STATELESS_OPERATIONS:
+            result = await _retry_loop(client, method, f"{pool.replicas[0].url}{path}", **kwargs)
+        else:
+            result = await pool.call(
+                operation, lambda base_url: _request_once(client, method, f"{base_url}{path}", **kwargs)
+            )
+    except ReplicaError as e:
+        circuit.record_failure()
+        raise e.error from e
+    except HTTPException:
+        circuit.record_success()
+        raise
+    except BaseException:
+        circuit.release()
+        raise
+    circuit.record_success()
+    return result
 
 
-async def _make_request_with_retry(
+async def _retry_loop(
     client: httpx.AsyncClient, method: str, url: str, **kwargs
 ) -> Dict[str, Any]:
     """
-    Make HTTP request with retry logic for transient failures.
+    Retry transient failures with jittered exponential backoff while the retry
+    budget allows. Raises the last `ReplicaError` once attempts run out.
     """
     last_exception = None
     for attempt in range(MAX_RETRIES + 1):
+        if attempt > 0:
+            if not retry_budget.try_spend():
+                logger.warning(f"[RETRIEVAL] Retry budget exhausted; not retrying {method} {url}")
+                break
+            logger.debug(f"[RETRIEVAL] Retry attempt {attempt} for {method} {url}")
+            await asyncio.sleep(backoff_delay(attempt, RETRY_DELAY, RETRY_MAX_DELAY))
         try:
-            if attempt > 0:
-                logger.debug(f"[RETRIEVAL] Retry attempt {attempt} for {method} {url}")
-                await asyncio.sleep(RETRY_DELAY)
-
-            response = await client.request(method, url, **kwargs)
-            response.raise_for_status()  # Raises HTTPStatusError for 4xx/5xx responses
-            return response.json()
-
-        except httpx.HTTPStatusError as e:
-            # Handle specific status codes
-            if e.response.status_code == 404:
-                error_detail = "User not found or no chunks available"
-                raise HTTPException(status_code=404, detail=error_detail) from e
-            elif e.response.status_code >= 500:
-                # Server errors are retry-eligible
-                error_msg = f"Embedding service server error: {e.response.status_code}"
-                logger.warning(f"[RETRIEVAL] Server error (attempt {attempt + 1}): {error_msg}")
-                last_exception = HTTPException(status_code=502, detail=error_msg)
-                continue
-            else:
-                # Other client errors (4xx) are not retried
-                error_msg = f"Embedding service client error: {e.response.text}"
-                raise HTTPException(status_code=502, detail=error_msg) from e
-
-        except (httpx.TimeoutException, httpx.ConnectError) as e:
-            error_msg = f"Network error connecting to embedding service: {type(e).__name__}"
-            logger.warning(f"[RETRIEVAL] Network error (attempt {attempt + 1}): {error_msg}")
-            last_exception = HTTPException(status_code=502, detail=error_msg)
-            continue
+            return await _request_once(client, method, url, **kwargs)
+        except ReplicaError as e:
+            logger.warning(f"[RETRIEVAL] Transient error (attempt {attempt + 1}): {e.error.detail}")
+            last_exception = e
+
+    raise last_exception
+
+
+async def _request_once(
+    client: httpx.AsyncClient, method: str, url: str, **kwargs
+) -> Dict[str, Any]:
+    """
+    Make one HTTP request. Server and network errors, which a retry (possibly
+    on another replica) may fix, are raised as `ReplicaError`; client errors
+    as `HTTPException`.
+    """
+    try:
+        response = await client.request(method, url, **kwargs)
+        response.raise_for_status()  # Raises HTTPStatusError for 4xx/5xx responses
+        return _decode(response)
 
-    raise last_exception or HTTPException(status_code=502, detail="Failed to connect to embedding service after retries")
+    except httpx.HTTPStatusError as e:
+        raise _status_error(e) from e
+
+    except (httpx.TimeoutException, httpx.ConnectError) as e:
+        error_msg = f"Network error connecting to embedding service: {type(e).__name__}"
+        raise ReplicaError(HTTPException(status_code=502, detail=error_msg)) from e
+
+
+def _status_error(e: httpx.HTTPStatusError) -> Exception:
+    """The exception to raise for an error status from the Embedding Service."""
+    # Handle specific status codes
+    if e.response.status_code == 404:
+        error_detail = "User not found or no chunks available"
+        return HTTPException(status_code=404, detail=error_detail)
+    elif e.response.status_code >= 500:
+        # Server errors are retry-eligible
+        error_msg = f"Embedding service server error: {e.response.status_code}"
+        return ReplicaError(HTTPException(status_code=502, detail=error_msg))
+    else:
+        # Other client errors (4xx) are not retried
+        error_msg = f"Embedding service client error: {e.response.text}"
+        return HTTPException(status_code=502, detail=error_msg)
+
+
+def _decode(response: httpx.Response) -> Dict[str, Any]:
+    if response.headers.get("content-type", "").startswith(MSGPACK):
+        return msgpack.unpackb(response.content, raw=False)
+    return response.json()
+
+
+def _is_ndjson(response: httpx.Response) -> bool:
+    return response.headers.get("content-type", "").startswith(NDJSON)
 
 
 def _parse_chunks_response(
@@ -159,17 +528,49 @@ def _parse_chunks_response(
     if "results" not in response or not isinstance(response["results"], list):
         raise HTTPException(status_code=502, detail="Invalid response format from embedding service: missing 'results' list")
 
-    chunks = []
+    chunks = list(iter_chunks(response, user_id))
+    logger.debug(f"[RETRIEVAL] Parsed {len(chunks)} valid chunks from {len(response['results'])} total")
+    return chunks
+
+
+def iter_chunks(response: Dict[str, Any], user_id: str) -> Iterator[ChunkItem]:
+    """
+    Validate the chunks of an Embedding Service /retrieve response one at a
+    time, skipping malformed chunks and chunks of another user.
+
+    With TRUSTED_INTERNAL_HOPS=true the Embedding Service is trusted: chunks
+    are built without validation, converting only `created_at`, and the user
+    check is kept. Nothing later in this service validates them.
+    """
+    build = _chunk_builder()
     for chunk_data in response["results"]:
-        try:
-            chunk = ChunkItem(**chunk_data)
-            if chunk.user_id != user_id:
-                logger.warning(f"[RETRIEVAL] User ID mismatch: expected {user_id}, got {chunk.user_id}")
-                continue
-            chunks.append(chunk)
-        except Exception as e:
-            logger.warning(f"[RETRIEVAL] Failed to parse chunk: {e}. Data: {chunk_data}")
-            continue
+        chunk = _checked_chunk(build, chunk_data, user_id)
+        if chunk is not None:
+            yield chunk
 
-    logger.debug(f"[RETRIEVAL] Parsed {len(chunks)} valid chunks from {len(response['results'])} total")
-    return chunks
\ No newline at end of file
+
+def _chunk_builder() -> Callable[[Dict[str, Any]], ChunkItem]:
+    trusted = os.getenv("TRUSTED_INTERNAL_HOPS", "false").lower() == "true"
+    return _construct_chunk if trusted else ChunkItem.model_validate
+
+
+def _checked_chunk(
+    build: Callable[[Dict[str, Any]], ChunkItem], chunk_data: Dict[str, Any], user_id: str
+) -> Optional[ChunkItem]:
+    """The chunk built from `chunk_data`, or None if it is malformed or another user's."""
+    try:
+        chunk = build(chunk_data)
+    except Exception as e:
+        logger.warning(f"[RETRIEVAL] Failed to parse chunk: {e}. Data: {chunk_data}")
+        return None
+    if chunk.user_id != user_id:
+        logger.warning(f"[RETRIEVAL] User ID mismatch: expected {user_id}, got {chunk.user_id}")
+        return None
+    return chunk
+
+
+def _construct_chunk(chunk_data: Dict[str, Any]) -> ChunkItem:
+    created_at = chunk_data["created_at"]
+    if isinstance(created_at, str):
+        created_at = datetime.fromisoformat(created_at)
+    return ChunkItem.model_construct(**{**chunk_data, "created_at": created_at})